@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MushroomImage, UnknownMushroom
+from .models import AnalysisJob, MushroomImage, SpeciesSummary, UnknownMushroom
 
 @admin.register(MushroomImage)
 class MushroomImageAdmin(admin.ModelAdmin):
@@ -30,3 +30,26 @@ class UnknownMushroomAdmin(admin.ModelAdmin):
             return obj.origin[:50] + '...' if len(obj.origin) > 50 else obj.origin
         return '-'
     origin_short.short_description = 'Origin'
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'user', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    exclude = ('image_data',)
+    ordering = ('-created_at',)
+
+
+@admin.register(SpeciesSummary)
+class SpeciesSummaryAdmin(admin.ModelAdmin):
+    list_display = ('name', 'public_count', 'edible_count', 'poisonous_count', 'unknown_count', 'pending_count', 'latest_at')
+    search_fields = ('key', 'name')
+    ordering = ('-latest_at',)
+
+    # Maintained by core.species; edit the reports instead
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
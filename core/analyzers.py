@@ -0,0 +1,284 @@
+"""
+Registry of mushroom analysis backends.
+
+Each backend wraps one analysis engine behind the same interface, declares a
+relative ``cost`` and probes whether it can run in this environment.
+``get_analyzer()`` walks the ``ANALYZER_BACKENDS`` setting in order and
+returns the first available backend, so production can use TFLite when the
+model files are deployed and fall back to the OpenCV heuristics otherwise.
+"""
+
+import hashlib
+import importlib.util
+import io
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from PIL import Image
+
+from .batching import get_prediction_batcher
+from .persistence import record_analysis
+from .result_cache import get_analysis_cache, image_digest
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyzerBackend:
+    """Base class for analysis backends.
+
+    Subclasses set ``name`` and ``cost`` and implement ``probe()`` and
+    ``analyze()``. Results use the ``model_utils.analyze_mushroom`` dict shape.
+    """
+
+    name = None
+    # Rough relative CPU cost of one analysis; lets callers pick a cheaper backend
+    cost = 1
+
+    def __init__(self):
+        self._available = None
+
+    def probe(self) -> bool:
+        """Return True if this backend can run here. Called once."""
+        return True
+
+    def is_available(self) -> bool:
+        if self._available is None:
+            try:
+                self._available = bool(self.probe())
+            except Exception as e:
+                logger.error(f"Error probing analyzer backend {self.name}: {str(e)}")
+                self._available = False
+        return self._available
+
+    @property
+    def version(self) -> str:
+        """Identifies the code/model producing results; used in cache keys."""
+        return self.name
+
+    def preload(self):
+        """Load shared read-only data; called once in the gunicorn master."""
+
+    def analyze(self, image: Image.Image) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def analyze_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        return [self.analyze(image) for image in images]
+
+
+class HeuristicAnalyzer(AnalyzerBackend):
+    """OpenCV feature heuristics from ``model_utils``; always available."""
+
+    name = 'heuristic'
+    cost = 1
+
+    @property
+    def version(self) -> str:
+        from .model_utils import ANALYZER_VERSION
+        return f"{self.name}-{ANALYZER_VERSION}"
+
+    def preload(self):
+        from . import model_utils  # noqa: F401
+
+    def analyze(self, image: Image.Image) -> Dict[str, Any]:
+        from .model_utils import analyze_mushroom
+        return analyze_mushroom(image)
+
+    def analyze_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        from .model_utils import analyze_mushroom_batch
+        return analyze_mushroom_batch(images)
+
+
+def _files_version(paths) -> str:
+    """Short fingerprint of model files from their size and mtime."""
+    digest = hashlib.blake2b(digest_size=6)
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+class TFLiteAnalyzer(AnalyzerBackend):
+    """Pooled TensorFlow Lite interpreters from ``models.tensorflow_classifier``."""
+
+    name = 'tflite'
+    cost = 10
+
+    def model_paths(self):
+        model_dir = settings.TFLITE_MODEL_DIR
+        return [model_dir / 'edibility_model.tflite', model_dir / 'species_model.tflite']
+
+    def probe(self) -> bool:
+        return (
+            all(path.exists() for path in self.model_paths())
+            and importlib.util.find_spec('tensorflow') is not None
+        )
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}-{_files_version(self.model_paths())}"
+
+    def preload(self):
+        from .models.tensorflow_classifier import preload_model_buffers
+        preload_model_buffers()
+
+    def analyze(self, image: Image.Image) -> Dict[str, Any]:
+        from .models.tensorflow_classifier import get_mushroom_classifier
+        return get_mushroom_classifier().analyze_mushroom(image)
+
+    def analyze_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        from .models.tensorflow_classifier import get_mushroom_classifier
+        return get_mushroom_classifier().analyze_batch(images)
+
+
+class KerasAnalyzer(AnalyzerBackend):
+    """Full Keras models from ``models.mushroom_classifier``; slowest backend."""
+
+    name = 'keras'
+    cost = 100
+
+    def __init__(self):
+        super().__init__()
+        self._classifier = None
+        self._lock = threading.Lock()
+
+    def model_paths(self):
+        model_dir = settings.TFLITE_MODEL_DIR
+        return [model_dir / 'edibility_model.keras', model_dir / 'species_model.keras']
+
+    def probe(self) -> bool:
+        return (
+            all(path.exists() for path in self.model_paths())
+            and importlib.util.find_spec('tensorflow') is not None
+        )
+
+    @property
+    def version(self) -> str:
+        return f"{self.name}-{_files_version(self.model_paths())}"
+
+    def _get_classifier(self):
+        if self._classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    from .models.mushroom_classifier import MushroomClassifier
+                    self._classifier = MushroomClassifier()
+        return self._classifier
+
+    def analyze(self, image: Image.Image) -> Dict[str, Any]:
+        try:
+            # MushroomClassifier opens its input itself, so hand it an in-memory file
+            buffer = io.BytesIO()
+            image.convert('RGB').save(buffer, format='PNG')
+            buffer.seek(0)
+            raw = self._get_classifier().analyze_image(buffer)
+        except Exception as e:
+            logger.error(f"Error in Keras analysis: {str(e)}")
+            return {'error': str(e)}
+
+        from .model_utils import original_size
+        from .models.tensorflow_classifier import SPECIES_INFO
+        edibility = raw['edibility']
+        top_species = raw['species'][0]
+        info = SPECIES_INFO.get(top_species['class'], {})
+        result = {
+            'preliminary_passed': True,
+            'is_edible': edibility['is_edible'],
+            'edibility_confidence': edibility['score'],
+            'edibility_probability': edibility['score'] / 100,
+            'species': info.get('name', f"Unknown Species {top_species['class']}"),
+            'species_confidence': top_species['confidence'],
+            'species_probability': top_species['confidence'] / 100,
+            'lifespan': info.get('lifespan', 'Unknown'),
+            'preservation': top_species['preservation'],
+            'analysis_method': 'Keras Models',
+            'image_info': {
+                'size': original_size(image),
+                'mode': image.mode,
+                'format': image.format
+            },
+        }
+        if not edibility['is_edible']:
+            result.update({
+                'warning': 'This mushroom appears to be poisonous or inedible. Do not consume!',
+                'safety_note': 'Always consult with expert mycologists before consuming wild mushrooms.'
+            })
+        return result
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(backend_class):
+    """Register an ``AnalyzerBackend`` subclass under its ``name``."""
+    with _backends_lock:
+        _backends[backend_class.name] = backend_class()
+    return backend_class
+
+
+for _backend_class in (TFLiteAnalyzer, KerasAnalyzer, HeuristicAnalyzer):
+    register_backend(_backend_class)
+
+
+def get_backend(name: str) -> Optional[AnalyzerBackend]:
+    """Return the registered backend called ``name``, or None."""
+    return _backends.get(name)
+
+
+def available_backends() -> List[AnalyzerBackend]:
+    """Configured backends that are available here, in fallback order."""
+    chain = []
+    for name in settings.ANALYZER_BACKENDS:
+        backend = _backends.get(name)
+        if backend is None:
+            logger.warning(f"Unknown analyzer backend in ANALYZER_BACKENDS: {name}")
+        elif backend.is_available():
+            chain.append(backend)
+    return chain
+
+
+def get_analyzer(max_cost: Optional[int] = None) -> AnalyzerBackend:
+    """Return the first available configured backend costing at most ``max_cost``.
+
+    Falls back to the heuristic backend if nothing else qualifies.
+    """
+    for backend in available_backends():
+        if max_cost is None or backend.cost <= max_cost:
+            return backend
+    return _backends[HeuristicAnalyzer.name]
+
+
+def backend_status() -> List[Dict[str, Any]]:
+    """Availability and cost of every registered backend, for diagnostics."""
+    configured = list(settings.ANALYZER_BACKENDS)
+    return [
+        {
+            'name': name,
+            'cost': backend.cost,
+            'configured': name in configured,
+            'available': backend.is_available(),
+        }
+        for name, backend in _backends.items()
+    ]
+
+
+def run_analysis(image: Image.Image, max_cost: Optional[int] = None) -> Dict[str, Any]:
+    """Analyze an image through the result cache and, if enabled, the micro-batcher.
+
+    The backend is picked by ``get_analyzer``; pass ``max_cost`` to keep a
+    request on cheaper backends.
+    """
+    analyzer = get_analyzer(max_cost)
+    # Hashed once here for both the result cache and the stored row
+    digest = image_digest(image)
+
+    def compute(img):
+        if settings.PREDICT_BATCHING_ENABLED:
+            result = get_prediction_batcher(analyzer).submit(img)
+        else:
+            result = analyzer.analyze(img)
+        # Only fresh results are stored; cache hits were stored the first time
+        record_analysis(img, result, digest)
+        return result
+    return get_analysis_cache().get_or_compute(image, compute, analyzer.version, digest)
@@ -0,0 +1,178 @@
+"""
+In-process micro-batching for mushroom predictions.
+
+Concurrent requests hand their image to a shared ``MicroBatcher``; a single
+dispatcher thread holds them for at most a few milliseconds, runs the whole
+group through the classifier's batch function, and fans the results back out.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into batched calls of ``batch_fn``.
+
+    ``batch_fn`` receives a list of items and must return a list of results
+    of the same length and order. A caller waits at most ``timeout`` seconds
+    for its batch; after that the item is run through ``fallback_fn`` on the
+    caller's thread (or ``TimeoutError`` is raised when there is none).
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 8, max_wait_ms: float = 5,
+                 timeout: float = 30, fallback_fn: Optional[Callable[[Any], Any]] = None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = timeout
+        self.fallback_fn = fallback_fn
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._timeouts = 0
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Queue one item and block until its result is ready.
+
+        ``timeout`` defaults to the batcher's own.
+        """
+        future = Future()
+        work_queue = self._ensure_started()
+        work_queue.put((item, future))
+
+        depth = work_queue.qsize()
+        with self._lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            # Still queued: make sure the dispatcher skips it
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            if self.fallback_fn is None:
+                raise
+            logger.warning(f"Batched prediction timed out after {timeout}s; analyzing the item on its own")
+            return self.fallback_fn(item)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and batch-size histogram counters."""
+        with self._lock:
+            histogram = dict(sorted(self._batch_sizes.items()))
+            max_queue_depth = self._max_queue_depth
+            timeouts = self._timeouts
+        batches = sum(histogram.values())
+        items = sum(size * count for size, count in histogram.items())
+        return {
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue_depth': max_queue_depth,
+            'timeouts': timeouts,
+            'batches': batches,
+            'items': items,
+            'mean_batch_size': items / batches if batches else 0,
+            'batch_size_histogram': histogram,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'timeout': self.timeout,
+        }
+
+    def _ensure_started(self) -> queue.Queue:
+        # A forked gunicorn worker inherits the object but not the thread,
+        # so start a fresh dispatcher the first time each process submits.
+        if self._pid == os.getpid():
+            return self._queue
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='prediction-batcher', daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, work_queue: queue.Queue):
+        while True:
+            batch = [work_queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(work_queue.get(timeout=remaining))
+                    else:
+                        # Wait is over, but still take anything already queued
+                        batch.append(work_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        # Callers that gave up waiting have cancelled their futures
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [item for item, _ in batch]
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"Error in batched prediction: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+# One batcher per analyzer backend
+_prediction_batchers = {}
+_prediction_batchers_lock = threading.Lock()
+
+
+def get_prediction_batcher(analyzer=None) -> MicroBatcher:
+    """Get or create the batcher that fronts /predict/ for ``analyzer``."""
+    if analyzer is None:
+        from .analyzers import get_analyzer
+        analyzer = get_analyzer()
+    batcher = _prediction_batchers.get(analyzer.name)
+    if batcher is None:
+        with _prediction_batchers_lock:
+            batcher = _prediction_batchers.get(analyzer.name)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    analyzer.analyze_batch,
+                    max_batch_size=settings.PREDICT_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.PREDICT_BATCH_MAX_WAIT_MS,
+                    timeout=settings.PREDICT_BATCH_TIMEOUT_SECONDS,
+                    fallback_fn=analyzer.analyze,
+                )
+                _prediction_batchers[analyzer.name] = batcher
+    return batcher
+
+
+def batcher_stats() -> Dict[str, Any]:
+    """Stats for every batcher created in this process, keyed by backend."""
+    return {name: batcher.stats() for name, batcher in _prediction_batchers.items()}
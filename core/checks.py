@@ -0,0 +1,73 @@
+"""
+System checks for the project's templates.
+
+Static files are served under content-hashed names (see
+``core.storage.StaticManifestStorage``), so a template must reach them through
+``{% static %}``: a hard-coded ``/static/...`` URL bypasses the manifest and
+gets the short-lived, unhashed copy, and a ``{% static %}`` name that the
+manifest does not know falls back to an uncached, probably broken URL.
+"""
+
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.checks import Error, Tags, Warning, register
+from django.template import engines
+
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+(['"])(?P<name>[^'"]+)\1""")
+
+
+def project_templates():
+    """Template files of this project, skipping installed packages."""
+    base_dir = Path(settings.BASE_DIR).resolve()
+    seen = set()
+    for engine in engines.all():
+        for directory in getattr(engine, 'template_dirs', ()):
+            directory = Path(directory).resolve()
+            if not directory.is_relative_to(base_dir) or 'site-packages' in directory.parts:
+                continue
+            for path in sorted(directory.rglob('*.html')):
+                if path not in seen:
+                    seen.add(path)
+                    yield path
+
+
+@register(Tags.templates)
+def check_static_references(app_configs, **kwargs):
+    messages = []
+    hardcoded = re.compile(r"""["'(=]\s*""" + re.escape(settings.STATIC_URL))
+    # After collectstatic the manifest decides what {% static %} can resolve;
+    # before it, only the finders can tell, and a missing file may simply not
+    # have been fetched yet (e.g. Git LFS assets)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+    for path in project_templates():
+        for number, line in enumerate(path.read_text(encoding='utf-8').splitlines(), start=1):
+            location = f"{path}:{number}"
+            if hardcoded.search(line):
+                messages.append(Error(
+                    "Hard-coded static URL.",
+                    hint="Use {% static '...' %} so the URL resolves to the hashed file.",
+                    obj=location,
+                    id='core.E001',
+                ))
+            for match in STATIC_TAG_RE.finditer(line):
+                name = match.group('name')
+                if hashed_files:
+                    if staticfiles_storage.hash_key(name) not in hashed_files:
+                        messages.append(Warning(
+                            f"{{% static '{name}' %}} is missing from the staticfiles manifest.",
+                            hint='It will link the plain name; fix the path or re-run collectstatic.',
+                            obj=location,
+                            id='core.W002',
+                        ))
+                elif finders.find(name) is None:
+                    messages.append(Warning(
+                        f"{{% static '{name}' %}} is not a known static file.",
+                        hint='Fix the path, or add the file before running collectstatic.',
+                        obj=location,
+                        id='core.W001',
+                    ))
+    return messages
@@ -0,0 +1,166 @@
+"""
+Server-side map clustering over a Web Mercator grid.
+
+At each zoom level the world is cut into square cells a quarter of a map tile
+wide (64px at 256px tiles). ``MarkerCluster`` keeps, per zoom, cell and
+status, how many public reports fall in the cell and the sum of their
+coordinates, so a viewport at any zoom is answered from a handful of small
+rows and the centroid stays exact. Rows are adjusted incrementally from model
+signals; ``rebuild_clusters`` recomputes them from scratch.
+"""
+
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import APPROVED_UNKNOWN_COLOR, MarkerCluster, UnknownMushroom
+
+logger = logging.getLogger(__name__)
+
+# Cells are 2**CELL_ZOOM_OFFSET times smaller than a tile on each side
+CELL_ZOOM_OFFSET = 2
+MAX_MERCATOR_LAT = 85.05112878
+
+# (status, latitude, longitude) of a public report
+Contribution = Tuple[str, float, float]
+
+
+def cluster_max_zoom() -> int:
+    return settings.MAP_CLUSTER_MAX_ZOOM
+
+
+def cell_for(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """Grid cell containing (lat, lon) at ``zoom``."""
+    n = 2 ** (zoom + CELL_ZOOM_OFFSET)
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def contribution(status: str, pin_color: str, latitude, longitude) -> Optional[Contribution]:
+    """What a report adds to the clusters, or None if it is not on the public map."""
+    if latitude is None or longitude is None:
+        return None
+    if status == 'unknown' and pin_color != APPROVED_UNKNOWN_COLOR:
+        return None
+    return status, float(latitude), float(longitude)
+
+
+def report_contribution(report: UnknownMushroom) -> Optional[Contribution]:
+    return contribution(report.status, report.pin_color, report.latitude, report.longitude)
+
+
+def _apply_delta(zoom: int, cell_x: int, cell_y: int, status: str, count: int, lat: float, lon: float):
+    cell = MarkerCluster.objects.filter(zoom=zoom, cell_x=cell_x, cell_y=cell_y, status=status)
+    if count < 0:
+        cell = cell.filter(count__gte=-count)
+    changes = dict(count=F('count') + count, lat_sum=F('lat_sum') + lat, lon_sum=F('lon_sum') + lon)
+    if cell.update(**changes) or count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            MarkerCluster.objects.create(
+                zoom=zoom, cell_x=cell_x, cell_y=cell_y, status=status, count=count, lat_sum=lat, lon_sum=lon
+            )
+    except IntegrityError:
+        # Created concurrently by another request; add to it instead
+        cell.update(**changes)
+
+
+def apply_changes(changes: Iterable[Tuple[Optional[Contribution], Optional[Contribution]]]):
+    """Apply (before, after) contributions of changed reports to every zoom level.
+
+    Deltas are summed per cell first, so a batch of changes costs one UPDATE
+    per touched cell rather than one per report and zoom.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    max_zoom = cluster_max_zoom()
+    for before, after in changes:
+        if before == after:
+            continue
+        for item, sign in ((before, -1), (after, 1)):
+            if item is None:
+                continue
+            status, lat, lon = item
+            for zoom in range(max_zoom + 1):
+                delta = deltas[(zoom, *cell_for(lat, lon, zoom), status)]
+                delta[0] += sign
+                delta[1] += sign * lat
+                delta[2] += sign * lon
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1] or delta[2]}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for (zoom, cell_x, cell_y, status), (count, lat, lon) in deltas.items():
+            _apply_delta(zoom, cell_x, cell_y, status, count, lat, lon)
+        MarkerCluster.objects.filter(count=0).delete()
+
+
+def rebuild_clusters() -> int:
+    """Recompute every cluster row from the reports table; returns rows written."""
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    rows = UnknownMushroom.objects.values_list('status', 'pin_color', 'latitude', 'longitude')
+    max_zoom = cluster_max_zoom()
+    for status, pin_color, latitude, longitude in rows.iterator(chunk_size=2000):
+        item = contribution(status, pin_color, latitude, longitude)
+        if item is None:
+            continue
+        _, lat, lon = item
+        for zoom in range(max_zoom + 1):
+            total = totals[(zoom, *cell_for(lat, lon, zoom), status)]
+            total[0] += 1
+            total[1] += lat
+            total[2] += lon
+
+    with transaction.atomic():
+        MarkerCluster.objects.all().delete()
+        MarkerCluster.objects.bulk_create(
+            (
+                MarkerCluster(zoom=zoom, cell_x=x, cell_y=y, status=status, count=count, lat_sum=lat_sum, lon_sum=lon_sum)
+                for (zoom, x, y, status), (count, lat_sum, lon_sum) in totals.items()
+            ),
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def clusters_in_bbox(zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None,
+                     statuses: Optional[List[str]] = None) -> List[Dict]:
+    """Clusters for a viewport: centroid, total count and per-status counts per cell."""
+    zoom = max(0, min(int(zoom), cluster_max_zoom()))
+    rows = MarkerCluster.objects.filter(zoom=zoom)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        min_x, min_y = cell_for(max_lat, min_lon, zoom)
+        max_x, max_y = cell_for(min_lat, max_lon, zoom)
+        rows = rows.filter(cell_x__gte=min_x, cell_x__lte=max_x, cell_y__gte=min_y, cell_y__lte=max_y)
+    if statuses:
+        rows = rows.filter(status__in=statuses)
+
+    cells = {}
+    for cell_x, cell_y, status, count, lat_sum, lon_sum in rows.values_list(
+        'cell_x', 'cell_y', 'status', 'count', 'lat_sum', 'lon_sum'
+    ):
+        cell = cells.setdefault((cell_x, cell_y), {'count': 0, 'lat_sum': 0.0, 'lon_sum': 0.0, 'counts': {}})
+        cell['count'] += count
+        cell['lat_sum'] += lat_sum
+        cell['lon_sum'] += lon_sum
+        cell['counts'][status] = count
+
+    return [
+        {
+            'cell': [cell_x, cell_y],
+            'lat': cell['lat_sum'] / cell['count'],
+            'lon': cell['lon_sum'] / cell['count'],
+            'count': cell['count'],
+            'counts': cell['counts'],
+        }
+        for (cell_x, cell_y), cell in cells.items()
+        if cell['count'] > 0
+    ]
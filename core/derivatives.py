@@ -0,0 +1,273 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+For an original ``unknown_mushrooms/abc.jpg`` each width in
+``IMAGE_DERIVATIVE_WIDTHS`` that is smaller than the original gets
+``unknown_mushrooms/abc.320w.webp`` and ``unknown_mushrooms/abc.320w.jpg``
+next to it. Generation runs on a small per-process thread pool after the
+saving transaction commits; templates pick the files up through the
+``media_url``/``responsive_image`` tags once they exist and fall back to the
+original until then.
+"""
+
+import io
+import logging
+import os
+import posixpath
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Named display sizes used by templates, as target widths in pixels
+IMAGE_SIZES = {
+    'thumb': 160,
+    'card': 320,
+    'detail': 640,
+    'large': 1280,
+}
+DERIVATIVE_FORMATS = {
+    # extension: (Pillow format, save options)
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVE_NAME_RE = re.compile(r'\.\d+w\.(?:webp|jpg)$')
+
+
+def derivative_widths() -> List[int]:
+    return sorted(settings.IMAGE_DERIVATIVE_WIDTHS)
+
+
+def derivative_name(name: str, width: int, ext: str) -> str:
+    """Storage name of the ``width``-pixel ``ext`` derivative of ``name``."""
+    stem, _ = posixpath.splitext(name)
+    return f"{stem}.{width}w.{ext}"
+
+
+def is_derivative(name: str) -> bool:
+    return DERIVATIVE_NAME_RE.search(name) is not None
+
+
+def derivative_stem(name: str) -> str:
+    """Extension-less name of the original a derivative was made from."""
+    return DERIVATIVE_NAME_RE.sub('', name)
+
+
+def _draft_for_derivatives(original: Image.Image):
+    # JPEG only: decode at a reduced scale that still covers the widest derivative
+    widest = max(derivative_widths())
+    original.draft('RGB', (widest, widest))
+
+
+def widths_for(display_width: int) -> Tuple[int, ...]:
+    """Derivative widths made for an original ``display_width`` pixels wide; never upscaled."""
+    return tuple(width for width in derivative_widths() if width < display_width)
+
+
+def expected_widths(name: str, storage=None) -> Optional[Tuple[int, ...]]:
+    """Widths ``generate_derivatives`` writes for ``name``, from its header alone.
+
+    Returns None if the original cannot be read.
+    """
+    storage = storage or default_storage
+    try:
+        with storage.open(name, 'rb') as original_file:
+            with Image.open(original_file) as original:
+                _draft_for_derivatives(original)
+                width, height = original.size
+                # Orientations 5-8 swap the axes, as exif_transpose will
+                if original.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                    width = height
+    except Exception:
+        return None
+    return widths_for(width)
+
+
+def generate_derivatives(name: str, storage=None, force: bool = False) -> int:
+    """Write the derivatives of one stored image; returns how many were written.
+
+    Existing files are left alone unless ``force``. WebP is written before JPEG,
+    so an existing JPEG derivative implies its WebP sibling exists too.
+    """
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as original_file:
+        with Image.open(original_file) as original:
+            _draft_for_derivatives(original)
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.load()
+
+    written = 0
+    for width in widths_for(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        for ext, (fmt, options) in DERIVATIVE_FORMATS.items():
+            target = derivative_name(name, width, ext)
+            if storage.exists(target):
+                if not force:
+                    continue
+                storage.delete(target)
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt, **options)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    _available.pop(name, None)
+    return written
+
+
+def delete_derivatives(name: str, storage=None):
+    storage = storage or default_storage
+    for width in derivative_widths():
+        for ext in DERIVATIVE_FORMATS:
+            target = derivative_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+    _available.pop(name, None)
+
+
+# Widths whose derivatives exist, per original, with the monotonic time the
+# entry expires at: never for a complete set, soon for one that is not
+_available: Dict[str, Tuple[Tuple[int, ...], Optional[float]]] = {}
+_AVAILABLE_MAX_ENTRIES = 4096
+INCOMPLETE_RECHECK_SECONDS = 30
+
+
+def available_widths(name: str, storage=None) -> Tuple[int, ...]:
+    """Widths for which the derivatives of ``name`` have been generated.
+
+    A complete set, including none at all for images narrower than the
+    smallest width, is remembered for good. A set still being generated, or
+    one whose original cannot be read, is looked up again after
+    ``INCOMPLETE_RECHECK_SECONDS``. With derivatives disabled nothing is
+    looked up and the original is always used.
+    """
+    if not settings.IMAGE_DERIVATIVES_ENABLED:
+        return ()
+    now = time.monotonic()
+    cached = _available.get(name)
+    if cached is not None and (cached[1] is None or now < cached[1]):
+        return cached[0]
+    storage = storage or default_storage
+    widths = tuple(
+        width for width in derivative_widths()
+        if storage.exists(derivative_name(name, width, 'jpg'))
+    )
+    complete = widths == expected_widths(name, storage)
+    if len(_available) >= _AVAILABLE_MAX_ENTRIES:
+        _available.clear()
+    _available[name] = (widths, None if complete else now + INCOMPLETE_RECHECK_SECONDS)
+    return widths
+
+
+def pick_width(name: str, size) -> Optional[int]:
+    """Smallest available derivative width at least as wide as ``size``."""
+    target = IMAGE_SIZES.get(size, size)
+    try:
+        target = int(target)
+    except (TypeError, ValueError):
+        return None
+    widths = available_widths(name)
+    for width in widths:
+        if width >= target:
+            return width
+    return None
+
+
+def image_url(name, size=None, storage=None) -> str:
+    """URL of a stored image, or of its JPEG derivative best suited to ``size``.
+
+    ``size`` is a name from ``IMAGE_SIZES`` or a width in pixels. Falls back to
+    the original until the derivatives have been generated.
+    """
+    if not name:
+        return ''
+    storage = storage or default_storage
+    if size is not None:
+        width = pick_width(name, size)
+        if width:
+            return storage.url(derivative_name(name, width, 'jpg'))
+    return storage.url(name)
+
+
+def image_srcset(name, ext: str = 'jpg', storage=None) -> str:
+    """``srcset`` value listing the generated ``ext`` derivatives of ``name``."""
+    if not name:
+        return ''
+    storage = storage or default_storage
+    return ', '.join(
+        f"{storage.url(derivative_name(name, width, ext))} {width}w"
+        for width in available_widths(name, storage)
+    )
+
+
+class DerivativeGenerator:
+    """Per-process thread pool that generates derivatives in the background."""
+
+    def __init__(self, workers: int = 2):
+        self.workers = max(1, int(workers))
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.failed = 0
+
+    def submit(self, name: str, force: bool = False) -> Future:
+        return self._get_executor().submit(self._generate, name, force)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork, so each gunicorn worker makes its own pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='image-derivatives')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _generate(self, name: str, force: bool) -> int:
+        try:
+            written = generate_derivatives(name, force=force)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Error generating derivatives for {name}: {str(e)}")
+            return 0
+        with self._lock:
+            self.generated += written
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'generated': self.generated, 'failed': self.failed}
+
+
+# Global generator instance
+_derivative_generator = None
+_derivative_generator_lock = threading.Lock()
+
+
+def get_derivative_generator() -> DerivativeGenerator:
+    """Get or create the process-wide derivative generator."""
+    global _derivative_generator
+    if _derivative_generator is None:
+        with _derivative_generator_lock:
+            if _derivative_generator is None:
+                _derivative_generator = DerivativeGenerator(workers=settings.IMAGE_DERIVATIVE_WORKERS)
+    return _derivative_generator
+
+
+def schedule_derivatives(name: str):
+    """Generate derivatives for ``name`` in the background once the transaction commits."""
+    if not settings.IMAGE_DERIVATIVES_ENABLED or not name:
+        return
+    transaction.on_commit(lambda: get_derivative_generator().submit(name))
@@ -0,0 +1,278 @@
+"""
+Background analysis jobs backed by the ``AnalysisJob`` table.
+
+Uploads are stored as queued rows and a small pool of worker threads in each
+process claims them with a conditional ``UPDATE``, so no external broker is
+needed and any web process can finish a job another one accepted. Each
+gunicorn worker starts its runner at startup (``start_job_runner``), so jobs
+left behind by a restart are picked up without waiting for a new upload.
+Workers wake immediately when a job is enqueued locally and otherwise poll
+the table, backing off while it stays empty. Finished rows are purged after
+``ANALYSIS_JOB_RETENTION_SECONDS``.
+"""
+
+import io
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, PngImagePlugin
+
+from .analyzers import run_analysis
+from .models import AnalysisJob
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting."""
+
+
+def encode_job_image(image: Image.Image) -> bytes:
+    """Losslessly encode a decoded upload for storage on the job row."""
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGB')
+    metadata = PngImagePlugin.PngInfo()
+    if 'original_size' in image.info:
+        metadata.add_text('original_size', '{}x{}'.format(*image.info['original_size']))
+    buffer = io.BytesIO()
+    # Lossless, so the worker sees the same pixels (and cache key) as a sync request
+    image.save(buffer, format='PNG', compress_level=1, pnginfo=metadata)
+    return buffer.getvalue()
+
+
+def decode_job_image(data: bytes) -> Image.Image:
+    """Inverse of ``encode_job_image``."""
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if 'original_size' in image.info:
+        image.info['original_size'] = tuple(int(side) for side in image.info['original_size'].split('x'))
+    return image
+
+
+def claim_next_job() -> Optional[AnalysisJob]:
+    """Atomically move the oldest queued job to running and return it.
+
+    Jobs left running longer than ``ANALYSIS_JOB_STALE_SECONDS`` (e.g. by a
+    worker that was killed) are claimed again, up to
+    ``ANALYSIS_JOB_MAX_ATTEMPTS`` claims in all; after that they are failed,
+    so an image that kills its worker cannot do so forever.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.ANALYSIS_JOB_STALE_SECONDS)
+    max_attempts = settings.ANALYSIS_JOB_MAX_ATTEMPTS
+    AnalysisJob.objects.filter(
+        status=AnalysisJob.STATUS_RUNNING, started_at__lt=stale_before, attempts__gte=max_attempts,
+    ).update(
+        status=AnalysisJob.STATUS_FAILED,
+        error=f'Analysis abandoned after {max_attempts} attempts',
+        image_data=b'',
+        finished_at=now,
+    )
+    for _ in range(5):
+        candidate = (
+            AnalysisJob.objects
+            .filter(status=AnalysisJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        stale = False
+        if candidate is None:
+            candidate = (
+                AnalysisJob.objects
+                .filter(status=AnalysisJob.STATUS_RUNNING, started_at__lt=stale_before, attempts__lt=max_attempts)
+                .order_by('started_at')
+                .values_list('id', flat=True)
+                .first()
+            )
+            stale = True
+        if candidate is None:
+            return None
+
+        claimable = AnalysisJob.objects.filter(id=candidate)
+        if stale:
+            claimable = claimable.filter(
+                status=AnalysisJob.STATUS_RUNNING, started_at__lt=stale_before, attempts__lt=max_attempts,
+            )
+        else:
+            claimable = claimable.filter(status=AnalysisJob.STATUS_QUEUED)
+        if claimable.update(status=AnalysisJob.STATUS_RUNNING, started_at=now, attempts=F('attempts') + 1):
+            return AnalysisJob.objects.get(id=candidate)
+        # Another worker won the race; try the next one
+    return None
+
+
+def process_job(job: AnalysisJob):
+    """Run the analysis for a claimed job and store the outcome."""
+    try:
+        image = decode_job_image(bytes(job.image_data))
+        try:
+            result = run_analysis(image)
+        finally:
+            image.close()
+    except Exception as e:
+        logger.error(f"Error in analysis job {job.id}: {str(e)}")
+        result = {'error': str(e)}
+
+    if 'error' in result:
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = str(result['error'])
+    else:
+        job.status = AnalysisJob.STATUS_DONE
+        job.result = result
+    job.image_data = b''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'image_data', 'finished_at'])
+
+
+def purge_finished_jobs() -> int:
+    """Delete done and failed jobs older than ``ANALYSIS_JOB_RETENTION_SECONDS``; return how many."""
+    finished_before = timezone.now() - timedelta(seconds=settings.ANALYSIS_JOB_RETENTION_SECONDS)
+    deleted, _ = AnalysisJob.objects.filter(
+        status__in=(AnalysisJob.STATUS_DONE, AnalysisJob.STATUS_FAILED),
+        finished_at__lt=finished_before,
+    ).delete()
+    if deleted:
+        logger.info(f"Purged {deleted} finished analysis jobs")
+    return deleted
+
+
+class JobRunner:
+    """Per-process pool of threads that drain the ``AnalysisJob`` queue.
+
+    An idle worker polls every ``poll_seconds``, doubling the interval up to
+    ``max_poll_seconds`` while the queue stays empty; a local enqueue or a
+    claimed job resets it. Idle workers also purge old finished jobs, at
+    most once per ``purge_seconds`` per process.
+    """
+
+    def __init__(self, workers: int = 2, poll_seconds: float = 2.0, max_poll_seconds: float = 30.0,
+                 purge_seconds: float = 3600.0):
+        self.workers = max(1, int(workers))
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max(poll_seconds, max_poll_seconds)
+        self.purge_seconds = purge_seconds
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._next_purge = 0.0
+
+    def ensure_started(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wakeup = threading.Event()
+                self._stopped = threading.Event()
+                self._threads = [
+                    threading.Thread(target=self._run, name=f'analysis-job-{i}', daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+                self._pid = os.getpid()
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = None):
+        """Stop the workers once their current job is done."""
+        with self._lock:
+            self._stopped.set()
+            self._wakeup.set()
+            threads, self._threads = self._threads, []
+            self._pid = None
+        for thread in threads:
+            thread.join(timeout)
+
+    def next_poll(self, wait: float, woken: bool) -> float:
+        """Idle wait to use after waiting ``wait`` seconds for a job."""
+        if woken:
+            return self.poll_seconds
+        return min(wait * 2, self.max_poll_seconds)
+
+    def _purge_due(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_purge:
+                return False
+            self._next_purge = now + self.purge_seconds
+            return True
+
+    def _run(self):
+        wait = self.poll_seconds
+        stopped = self._stopped
+        while not stopped.is_set():
+            job = None
+            try:
+                close_old_connections()
+                job = claim_next_job()
+                if job is not None:
+                    process_job(job)
+                elif self._purge_due():
+                    purge_finished_jobs()
+            except Exception as e:
+                logger.error(f"Error in analysis job worker: {str(e)}")
+            finally:
+                close_old_connections()
+            if job is None:
+                woken = self._wakeup.wait(wait)
+                self._wakeup.clear()
+                wait = self.next_poll(wait, woken)
+            else:
+                wait = self.poll_seconds
+
+
+# Global runner instance
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Get or create this process's job runner, starting its threads."""
+    global _job_runner
+    if _job_runner is None:
+        with _job_runner_lock:
+            if _job_runner is None:
+                _job_runner = JobRunner(
+                    workers=settings.ANALYSIS_JOB_WORKERS,
+                    poll_seconds=settings.ANALYSIS_JOB_POLL_SECONDS,
+                    max_poll_seconds=settings.ANALYSIS_JOB_MAX_POLL_SECONDS,
+                )
+    _job_runner.ensure_started()
+    return _job_runner
+
+
+def start_job_runner():
+    """Start this process's job runner if ``ANALYSIS_JOB_AUTOSTART``."""
+    if settings.ANALYSIS_JOB_AUTOSTART:
+        get_job_runner()
+
+
+def enqueue_analysis(image: Image.Image, user=None) -> AnalysisJob:
+    """Store ``image`` as a queued job and wake a worker.
+
+    Raises ``QueueFull`` when ``ANALYSIS_JOB_MAX_PENDING`` jobs are already waiting.
+    """
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).count()
+    if pending >= settings.ANALYSIS_JOB_MAX_PENDING:
+        raise QueueFull(f"{pending} analysis jobs already queued")
+
+    job = AnalysisJob.objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        image_data=encode_job_image(image),
+    )
+    get_job_runner().notify()
+    return job
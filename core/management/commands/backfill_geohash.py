@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.models import UnknownMushroom
+from core.spatial import backfill_geohashes
+
+
+class Command(BaseCommand):
+    help = 'Store the geohash of every report that does not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute geohashes for every report')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = backfill_geohashes(
+            UnknownMushroom, batch_size=options['batch_size'], only_missing=not options['all']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} report geohashes'))
@@ -0,0 +1,154 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import APPROVED_UNKNOWN_COLOR, PENDING_REPORT_Q, PUBLIC_REPORT_Q, UnknownMushroom
+from core.spatial import encode_geohash
+from core.species import reports_for_species
+
+LISTING_INDEXES = [
+    'unknownmushroom_status_pin',
+    'unknownmushroom_user_created',
+    'unknownmushroom_created',
+    'unknownmushroom_name_lower',
+    'unknownmushroom_public',
+    'unknownmushroom_pending',
+]
+
+# (status, pin colour, weight) of synthetic reports
+STATUS_MIX = [
+    ('edible', '#28a745', 35),
+    ('poisonous', '#dc3545', 25),
+    ('mapped', '#0d6efd', 10),
+    ('unknown', APPROVED_UNKNOWN_COLOR, 10),
+    ('unknown', '#0d6efd', 20),  # pending moderation
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the report listing queries and print their EXPLAIN plans against a '
+        'synthetic dataset. Everything runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--species', type=int, default=1_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--compare', action='store_true',
+                            help='Also run without the listing indexes to show the difference')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = self.populate(options)
+            queries = self.hot_queries(users[0], f"species {options['species'] // 2}")
+
+            results = {'indexed': self.run(queries, options['repeat'])}
+            if options['compare']:
+                self.drop_listing_indexes()
+                results['no index'] = self.run(queries, options['repeat'])
+
+            self.stdout.write('')
+            self.stdout.write(f"{'query':<22}" + ''.join(f'{label:>14}' for label in results))
+            for name in queries:
+                row = ''.join(f"{results[label][name]:>11.2f} ms" for label in results)
+                self.stdout.write(f'{name:<22}{row}')
+            transaction.set_rollback(True)
+
+    def populate(self, options):
+        rng = random.Random(options['seed'])
+        stamp = int(time.time())
+        users = User.objects.bulk_create(
+            User(username=f'bench-{stamp}-{i}') for i in range(options['users'])
+        )
+        if users[0].pk is None:  # backends without RETURNING on bulk insert
+            users = list(User.objects.filter(username__startswith=f'bench-{stamp}-'))
+
+        statuses = [(status, color) for status, color, _ in STATUS_MIX]
+        weights = [weight for *_, weight in STATUS_MIX]
+        now = timezone.now()
+        started = time.perf_counter()
+        # created_at is auto_now_add; switch that off so rows get spread-out timestamps
+        created_at = UnknownMushroom._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            batch = []
+            for i in range(options['rows']):
+                status, pin_color = rng.choices(statuses, weights)[0]
+                latitude = round(rng.uniform(11.40, 11.75), 6)
+                longitude = round(rng.uniform(124.30, 124.70), 6)
+                batch.append(UnknownMushroom(
+                    user=rng.choice(users),
+                    name=f'Species {rng.randrange(options["species"])}',
+                    image='unknown_mushrooms/benchmark.jpg',
+                    latitude=latitude,
+                    longitude=longitude,
+                    geohash=encode_geohash(latitude, longitude),
+                    status=status,
+                    pin_color=pin_color,
+                    is_pending=status == 'unknown' and pin_color != APPROVED_UNKNOWN_COLOR,
+                    created_at=now - timedelta(minutes=i),
+                ))
+                if len(batch) == 5_000:
+                    UnknownMushroom.objects.bulk_create(batch)
+                    batch = []
+            UnknownMushroom.objects.bulk_create(batch)
+        finally:
+            created_at.auto_now_add = True
+
+        self.analyze()
+        self.stdout.write(
+            f"Inserted {options['rows']} synthetic reports in {time.perf_counter() - started:.1f}s "
+            f"({connection.vendor})"
+        )
+        return users
+
+    def hot_queries(self, user, species_name):
+        return {
+            'public_latest': lambda: UnknownMushroom.objects.filter(PUBLIC_REPORT_Q).order_by('-created_at')[:50],
+            'public_status_counts': lambda: (
+                UnknownMushroom.objects.filter(PUBLIC_REPORT_Q)
+                .values('status').annotate(n=Count('id')).order_by()
+            ),
+            'admin_pending': lambda: UnknownMushroom.objects.filter(PENDING_REPORT_Q).order_by('-created_at')[:50],
+            'status_pin_latest': lambda: (
+                UnknownMushroom.objects.filter(status='edible', pin_color='#28a745').order_by('-created_at')[:50]
+            ),
+            'species_lookup': lambda: reports_for_species(species_name).order_by('-created_at'),
+            'user_history': lambda: UnknownMushroom.objects.filter(user=user).order_by('-created_at')[:50],
+        }
+
+    def run(self, queries, repeat):
+        timings = {}
+        for name, build in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {name}'))
+            self.stdout.write(build().explain())
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f'median {timings[name]:.2f} ms over {repeat} runs')
+        return timings
+
+    def drop_listing_indexes(self):
+        self.stdout.write(self.style.WARNING('\nDropping listing indexes (rolled back afterwards)'))
+        with connection.cursor() as cursor:
+            for name in LISTING_INDEXES:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+        self.analyze()
+
+    def analyze(self):
+        # Fresh statistics so the planner sees the synthetic data
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
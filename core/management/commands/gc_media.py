@@ -0,0 +1,32 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.media_refs import find_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored images and derivatives that no report, analysis image or '
+        'species summary refers to, e.g. those of rejected or removed reports'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List orphans without deleting them')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Keep files younger than this; they may belong to an upload in progress')
+
+    def handle(self, *args, **options):
+        deleted = freed = 0
+        for name in find_orphans(min_age_seconds=options['min_age_hours'] * 3600):
+            size = default_storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} orphaned files ({freed / (1024 * 1024):.1f} MB)'
+        ))
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.derivatives import generate_derivatives
+from core.models import MushroomImage, UnknownMushroom
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for every stored report and analysis image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (UnknownMushroom, MushroomImage):
+            names.update(model.objects.exclude(image='').values_list('image', flat=True).distinct())
+
+        written = failed = 0
+
+        def generate(name):
+            try:
+                return generate_derivatives(name, force=options['force']), None
+            except Exception as e:
+                return 0, f'{name}: {e}'
+
+        with ThreadPoolExecutor(max(1, options['workers'])) as pool:
+            for count, error in pool.map(generate, sorted(names)):
+                written += count
+                if error:
+                    failed += 1
+                    self.stderr.write(error)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} derivative files for {len(names)} images ({failed} failed)'
+        ))
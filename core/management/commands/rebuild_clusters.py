@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.clustering import cluster_max_zoom, rebuild_clusters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the map cluster table from all reports'
+
+    def handle(self, *args, **options):
+        rows = rebuild_clusters()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} cluster rows for zoom 0-{cluster_max_zoom()}'))
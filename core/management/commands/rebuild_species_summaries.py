@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.species import rebuild_species_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the species summary table from all reports'
+
+    def handle(self, *args, **options):
+        rows = rebuild_species_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} species summaries'))
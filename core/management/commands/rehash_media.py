@@ -0,0 +1,57 @@
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.derivatives import generate_derivatives
+from core.media_refs import MEDIA_PREFIX, REFERENCING_FIELDS, release_files
+from core.page_cache import bump_homepage_version
+from core.storage import get_content_storage, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        'Move images stored under upload names to content-addressed names, so '
+        'their URLs can be cached forever, and point every row at the new name'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the images that would move')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in REFERENCING_FIELDS:
+            names.update(
+                model.objects.filter(**{f'{field}__startswith': MEDIA_PREFIX})
+                .values_list(field, flat=True).distinct()
+            )
+        names = sorted(name for name in names if not is_content_addressed(name))
+
+        moved = missing = 0
+        for name in names:
+            if not default_storage.exists(name):
+                missing += 1
+                self.stderr.write(f'{name}: file missing')
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+                continue
+            with default_storage.open(name, 'rb') as original:
+                new_name = get_content_storage().save(name, File(original, name))
+            with transaction.atomic():
+                # Plain updates: the image name is not part of any rollup
+                for model, field in REFERENCING_FIELDS:
+                    model.objects.filter(**{field: name}).update(**{field: new_name})
+            try:
+                generate_derivatives(new_name)
+            except Exception as e:
+                self.stderr.write(f'{new_name}: {e}')
+            # Saves never reuse a legacy name, so it needs no age guard
+            release_files([name], min_age_seconds=0)
+            moved += 1
+
+        if moved:
+            bump_homepage_version()
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        count = len(names) - missing if options['dry_run'] else moved
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} images ({missing} missing)'))
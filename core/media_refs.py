@@ -0,0 +1,134 @@
+"""
+Reference counting for stored images.
+
+With content-addressed storage one file can back several reports and analysis
+images, so a file may only go once no row refers to it any more. References
+are counted from the rows themselves (the image columns are indexed) rather
+than kept in a counter, so writes that bypass signals, such as
+``bulk_create``, cannot make the count drift.
+
+A count of zero does not yet mean a file can go: an upload is written before
+the row referring to it is committed, and saving bytes that are already
+stored reuses the file (renewing its modification time, see
+``core.storage``). Both ``release_files`` and ``find_orphans`` therefore keep
+recently modified files; ``gc_media`` collects them once they are old enough.
+"""
+
+import logging
+import posixpath
+import time
+from typing import Dict, Iterable, Iterator, List, Set
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .derivatives import delete_derivatives, derivative_stem, is_derivative
+from .models import MushroomImage, SpeciesSummary, UnknownMushroom
+
+logger = logging.getLogger(__name__)
+
+# Only files under this directory are ever deleted
+MEDIA_PREFIX = 'unknown_mushrooms/'
+# Every (model, field) that stores a name of a file under MEDIA_PREFIX
+REFERENCING_FIELDS = [
+    (UnknownMushroom, 'image'),
+    (MushroomImage, 'image'),
+    (SpeciesSummary, 'image'),
+]
+
+
+def reference_counts(names: Iterable[str]) -> Dict[str, int]:
+    """Number of rows referring to each of ``names``."""
+    names = set(names)
+    counts = dict.fromkeys(names, 0)
+    for model, field in REFERENCING_FIELDS:
+        for name in model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True):
+            counts[name] += 1
+    return counts
+
+
+def is_recent(name: str, min_age_seconds: float, storage) -> bool:
+    """Whether ``name`` was modified less than ``min_age_seconds`` ago."""
+    if not min_age_seconds:
+        return False
+    return storage.get_modified_time(name).timestamp() > time.time() - min_age_seconds
+
+
+def release_files(names: Iterable[str], storage=None, min_age_seconds: float = None) -> List[str]:
+    """Delete the files in ``names`` that nothing refers to, with their derivatives.
+
+    Files modified within ``min_age_seconds`` (default
+    ``MEDIA_RELEASE_MIN_AGE_SECONDS``) are kept for ``gc_media``. Returns the
+    names deleted.
+    """
+    storage = storage or default_storage
+    if min_age_seconds is None:
+        min_age_seconds = settings.MEDIA_RELEASE_MIN_AGE_SECONDS
+    names = [name for name in set(names) if name and name.startswith(MEDIA_PREFIX)]
+    if not names:
+        return []
+    deleted = []
+    for name, count in reference_counts(names).items():
+        if count or (storage.exists(name) and is_recent(name, min_age_seconds, storage)):
+            continue
+        delete_derivatives(name, storage)
+        if storage.exists(name):
+            storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+def release_after_commit(name: str):
+    """Release ``name`` once the current transaction has committed."""
+    def release():
+        try:
+            release_files([name])
+        except Exception as e:
+            logger.error(f"Error releasing stored image {name}: {str(e)}")
+    if name:
+        transaction.on_commit(release)
+
+
+def referenced_names() -> Set[str]:
+    names = set()
+    for model, field in REFERENCING_FIELDS:
+        names.update(
+            model.objects
+            .filter(**{f'{field}__startswith': MEDIA_PREFIX})
+            .values_list(field, flat=True)
+            .iterator(chunk_size=5000)
+        )
+    return names
+
+
+def stored_files(storage=None, directory: str = MEDIA_PREFIX.rstrip('/')) -> Iterator[str]:
+    """Names of all files below ``directory``."""
+    storage = storage or default_storage
+    if not storage.exists(directory):
+        return
+    subdirectories, files = storage.listdir(directory)
+    for filename in files:
+        yield posixpath.join(directory, filename)
+    for subdirectory in subdirectories:
+        yield from stored_files(storage, posixpath.join(directory, subdirectory))
+
+
+def find_orphans(min_age_seconds: float = 0, storage=None) -> Iterator[str]:
+    """Stored originals and derivatives no row refers to.
+
+    Files modified within ``min_age_seconds`` are skipped; see the module
+    docstring.
+    """
+    storage = storage or default_storage
+    referenced = referenced_names()
+    referenced_stems = {posixpath.splitext(name)[0] for name in referenced}
+    for name in stored_files(storage):
+        if is_derivative(name):
+            if derivative_stem(name) in referenced_stems:
+                continue
+        elif name in referenced:
+            continue
+        if is_recent(name, min_age_seconds, storage):
+            continue
+        yield name
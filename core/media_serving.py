@@ -0,0 +1,120 @@
+"""
+Serving of uploaded media through WhiteNoise.
+
+WhiteNoise indexes its directories once at startup, which misses every file
+uploaded afterwards. ``MediaFilesMiddleware`` serves ``MEDIA_ROOT`` at
+``MEDIA_URL`` instead and indexes files on first request, so new uploads are
+served without a restart and each later hit skips the header work.
+
+- Content-addressed files (see ``core.storage``) and their derivatives get
+  ``Cache-Control: max-age=<10 years>, public, immutable``; older names get
+  ``MEDIA_MAX_AGE``.
+- A JPEG derivative is answered with its WebP sibling when the client
+  accepts ``image/webp`` (``Vary: Accept``).
+- Range requests, conditional requests and precompressed ``.gz``/``.br``
+  siblings are handled by WhiteNoise itself.
+"""
+
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import NotARegularFileError, StaticFile
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+from .derivatives import is_derivative
+from .storage import is_content_addressed
+
+# Index size bound; the index is cleared when full and refills on demand
+MEDIA_INDEX_MAX_ENTRIES = 10_000
+
+
+class MediaEntry(NamedTuple):
+    file: StaticFile
+    webp: Optional[StaticFile]
+    stamp: Tuple[int, int]  # (mtime_ns, size) the entry was built from
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _webp_sibling(path: str) -> Optional[str]:
+    # Derivatives come in pairs: abc.320w.jpg and abc.320w.webp
+    if path.endswith('.jpg') and is_derivative(path):
+        return path[:-len('.jpg')] + '.webp'
+    return None
+
+
+def accepts_webp(request) -> bool:
+    return 'image/webp' in request.headers.get('Accept', '')
+
+
+class MediaFilesMiddleware(WhiteNoise):
+    """Serve uploaded media with WhiteNoise; see the module docstring."""
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        prefix = urlparse(settings.MEDIA_URL or '').path
+        if not settings.MEDIA_SERVE or not settings.MEDIA_ROOT or not prefix or urlparse(settings.MEDIA_URL).netloc:
+            # Media is served elsewhere (a CDN, nginx)
+            raise MiddlewareNotUsed
+        super().__init__(application=None, max_age=settings.MEDIA_MAX_AGE, add_headers_function=self.add_vary_header)
+        self.prefix = ensure_leading_trailing_slash(prefix)
+        self.root = os.path.abspath(settings.MEDIA_ROOT).rstrip(os.sep) + os.sep
+        self.index: Dict[str, MediaEntry] = {}
+
+    def __call__(self, request):
+        url = request.path_info
+        if not url.startswith(self.prefix):
+            return self.get_response(request)
+        entry = self.lookup(url)
+        if entry is None:
+            return self.get_response(request)
+        static_file = entry.webp if entry.webp is not None and accepts_webp(request) else entry.file
+        return WhiteNoiseMiddleware.serve(static_file, request)
+
+    def lookup(self, url: str) -> Optional[MediaEntry]:
+        """Index entry for ``url``, (re)built when the file is new or has changed."""
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(self.root, url[len(self.prefix):])
+        if os.path.commonprefix((self.root, path)) != self.root or self.is_compressed_variant(path):
+            return None
+        try:
+            # One stat per hit keeps regenerated derivatives and deleted files honest
+            stamp = _stamp(path)
+        except OSError:
+            self.index.pop(url, None)
+            return None
+        entry = self.index.get(url)
+        if entry is not None and entry.stamp == stamp:
+            return entry
+        try:
+            entry = self.build_entry(path, url, stamp)
+        except (NotARegularFileError, OSError):
+            return None
+        if len(self.index) >= MEDIA_INDEX_MAX_ENTRIES:
+            self.index.clear()
+        self.index[url] = entry
+        return entry
+
+    def build_entry(self, path: str, url: str, stamp: Tuple[int, int]) -> MediaEntry:
+        webp_path = _webp_sibling(path)
+        if webp_path is not None and not os.path.isfile(webp_path):
+            webp_path = None
+        webp = self.get_static_file(webp_path, url) if webp_path else None
+        return MediaEntry(self.get_static_file(path, url), webp, stamp)
+
+    def immutable_file_test(self, path, url):
+        return is_content_addressed(url)
+
+    def add_vary_header(self, headers, path, url):
+        # Either file of a JPEG/WebP pair may answer for the JPEG's URL
+        if url.endswith('.jpg') and (path.endswith('.webp') or os.path.isfile(_webp_sibling(path) or '')):
+            headers['Vary'] = 'Accept'
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mushroomimage',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='content hash'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:24
+
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of core.clustering as of this migration, so later changes there
+# cannot change what it does
+CELL_ZOOM_OFFSET = 2
+MAX_MERCATOR_LAT = 85.05112878
+APPROVED_UNKNOWN_COLOR = '#ffc107'
+
+
+def cell_for(lat, lon, zoom):
+    n = 2 ** (zoom + CELL_ZOOM_OFFSET)
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def fill_clusters(apps, schema_editor):
+    UnknownMushroom = apps.get_model('core', 'UnknownMushroom')
+    MarkerCluster = apps.get_model('core', 'MarkerCluster')
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    rows = UnknownMushroom.objects.values_list('status', 'pin_color', 'latitude', 'longitude')
+    for status, pin_color, latitude, longitude in rows.iterator(chunk_size=2000):
+        if latitude is None or longitude is None:
+            continue
+        if status == 'unknown' and pin_color != APPROVED_UNKNOWN_COLOR:
+            continue
+        lat, lon = float(latitude), float(longitude)
+        for zoom in range(settings.MAP_CLUSTER_MAX_ZOOM + 1):
+            total = totals[(zoom, *cell_for(lat, lon, zoom), status)]
+            total[0] += 1
+            total[1] += lat
+            total[2] += lon
+
+    MarkerCluster.objects.bulk_create(
+        (
+            MarkerCluster(zoom=zoom, cell_x=x, cell_y=y, status=status, count=count, lat_sum=lat_sum, lon_sum=lon_sum)
+            for (zoom, x, y, status), (count, lat_sum, lon_sum) in totals.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_mushroomimage_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarkerCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0)),
+                ('lon_sum', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='markercluster',
+            constraint=models.UniqueConstraint(fields=('zoom', 'cell_x', 'cell_y', 'status'), name='markercluster_unique_cell'),
+        ),
+        migrations.RunPython(fill_clusters, migrations.RunPython.noop),
+    ]
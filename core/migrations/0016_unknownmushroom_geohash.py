@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+# Frozen copy of core.spatial.encode_geohash as of this migration, so later
+# changes there cannot change what it does
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    lat, lon = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def fill_geohashes(apps, schema_editor):
+    UnknownMushroom = apps.get_model('core', 'UnknownMushroom')
+    batch = []
+    for row in UnknownMushroom.objects.only('id', 'latitude', 'longitude').order_by('id').iterator(chunk_size=1000):
+        row.geohash = encode_geohash(row.latitude, row.longitude)
+        batch.append(row)
+        if len(batch) >= 1000:
+            UnknownMushroom.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        UnknownMushroom.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_markercluster_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unknownmushroom',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(fields=['status', 'geohash'], name='unknownmushroom_status_geo'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:28
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_unknownmushroom_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(fields=['status', 'pin_color', '-created_at'], name='unknownmushroom_status_pin'),
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(fields=['user', '-created_at'], name='unknownmushroom_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(fields=['-created_at'], name='unknownmushroom_created'),
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(django.db.models.functions.text.Lower('name'), models.OrderBy(models.F('created_at'), descending=True), name='unknownmushroom_name_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(condition=models.Q(models.Q(('status', 'unknown'), _negated=True), models.Q(('pin_color', '#ffc107'), ('status', 'unknown')), _connector='OR'), fields=['-created_at'], name='unknownmushroom_public'),
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(condition=models.Q(('status', 'unknown'), models.Q(('pin_color', '#ffc107'), _negated=True)), fields=['-created_at'], name='unknownmushroom_pending'),
+        ),
+    ]
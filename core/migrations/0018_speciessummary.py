@@ -0,0 +1,108 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:31
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Lower, Trim
+
+# Frozen copy of core.species and the report predicates as of this migration,
+# so later changes there cannot change what it does
+APPROVED_UNKNOWN_COLOR = '#ffc107'
+PUBLIC_REPORT_Q = ~Q(status='unknown') | Q(status='unknown', pin_color=APPROVED_UNKNOWN_COLOR)
+PENDING_REPORT_Q = Q(status='unknown') & ~Q(pin_color=APPROVED_UNKNOWN_COLOR)
+STATUS_COUNT_FIELDS = {
+    'mapped': 'mapped_count',
+    'edible': 'edible_count',
+    'poisonous': 'poisonous_count',
+    'unknown': 'unknown_count',
+}
+
+
+def fill_species_summaries(apps, schema_editor):
+    UnknownMushroom = apps.get_model('core', 'UnknownMushroom')
+    SpeciesSummary = apps.get_model('core', 'SpeciesSummary')
+    keys = set(
+        UnknownMushroom.objects
+        .annotate(name_key=Lower(Trim('name')))
+        .values_list('name_key', flat=True)
+        .distinct()
+    ) - {''}
+    for key in sorted(keys):
+        reports = UnknownMushroom.objects.alias(name_key=Lower(Trim('name'))).filter(name_key=key)
+        stats = reports.aggregate(
+            public_count=Count('id', filter=PUBLIC_REPORT_Q),
+            pending_count=Count('id', filter=PENDING_REPORT_Q),
+            min_latitude=Min('latitude', filter=PUBLIC_REPORT_Q),
+            max_latitude=Max('latitude', filter=PUBLIC_REPORT_Q),
+            min_longitude=Min('longitude', filter=PUBLIC_REPORT_Q),
+            max_longitude=Max('longitude', filter=PUBLIC_REPORT_Q),
+            **{
+                field: Count('id', filter=PUBLIC_REPORT_Q & Q(status=status))
+                for status, field in STATUS_COUNT_FIELDS.items()
+            },
+        )
+        if not stats['public_count'] and not stats['pending_count']:
+            continue
+        candidates = reports.filter(PUBLIC_REPORT_Q) if stats['public_count'] else reports
+        latest = candidates.order_by('-created_at', '-id').first()
+        SpeciesSummary.objects.create(
+            key=key,
+            name=latest.name.strip(),
+            latest_report=latest,
+            latest_at=latest.created_at,
+            image=latest.image.name,
+            **stats,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_unknownmushroom_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpeciesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Lower-cased, trimmed species name', max_length=150, unique=True)),
+                ('name', models.CharField(help_text='Name as written on the latest report', max_length=150)),
+                ('public_count', models.PositiveIntegerField(default=0)),
+                ('mapped_count', models.PositiveIntegerField(default=0)),
+                ('edible_count', models.PositiveIntegerField(default=0)),
+                ('poisonous_count', models.PositiveIntegerField(default=0)),
+                ('unknown_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('latest_at', models.DateTimeField(blank=True, null=True)),
+                ('image', models.ImageField(blank=True, upload_to='unknown_mushrooms/')),
+                ('min_latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('max_latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('min_longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('max_longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'species summaries',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='unknownmushroom',
+            name='unknownmushroom_name_lower',
+        ),
+        migrations.AddIndex(
+            model_name='unknownmushroom',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('name')), models.OrderBy(models.F('created_at'), descending=True), name='unknownmushroom_name_lower'),
+        ),
+        migrations.AddField(
+            model_name='speciessummary',
+            name='latest_report',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.unknownmushroom'),
+        ),
+        migrations.AddIndex(
+            model_name='speciessummary',
+            index=models.Index(condition=models.Q(('public_count__gt', 0)), fields=['-latest_at'], name='speciessummary_public_latest'),
+        ),
+        migrations.RunPython(fill_species_summaries, migrations.RunPython.noop),
+    ]
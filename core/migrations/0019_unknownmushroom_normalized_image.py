@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:38
+
+import core.uploads
+import django.core.validators
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_speciessummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='unknownmushroom',
+            name='image',
+            field=core.uploads.NormalizedImageField(upload_to='unknown_mushrooms/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:40
+
+import core.storage
+import core.uploads
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_unknownmushroom_normalized_image'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mushroomimage',
+            name='image',
+            field=models.ImageField(db_index=True, help_text='Upload a clear image of the mushroom (JPG, JPEG, or PNG)', storage=core.storage.get_content_storage, upload_to='unknown_mushrooms/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])], verbose_name='mushroom image'),
+        ),
+        migrations.AlterField(
+            model_name='unknownmushroom',
+            name='image',
+            field=core.uploads.NormalizedImageField(db_index=True, storage=core.storage.get_content_storage, upload_to='unknown_mushrooms/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:02
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_hashes(apps, schema_editor):
+    """Keep the oldest row per content hash, so the constraint can be added."""
+    MushroomImage = apps.get_model('core', 'MushroomImage')
+    duplicated = (
+        MushroomImage.objects.exclude(content_hash='')
+        .values('content_hash')
+        .annotate(rows=Count('id'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicated:
+        MushroomImage.objects.filter(content_hash=group['content_hash']).exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_analysisjob_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mushroomimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('content_hash',), name='mushroomimage_unique_content_hash'),
+        ),
+    ]
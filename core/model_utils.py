@@ -1,7 +1,7 @@
 # Configure logger
 import logging
 from PIL import Image
-from typing import Dict, Any
+from typing import Dict, Any, List
 import random
 import numpy as np
 import cv2
@@ -12,51 +12,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bump whenever feature extraction or the heuristics change, so cached results
+# from an older analyzer are not served.
+ANALYZER_VERSION = 'cv-4'
+
+# Longest edge, in pixels, that every statistic is computed at. Edge density
+# and Laplacian variance depend on scale, so fixing it makes them (and the
+# heuristic thresholds applied to them) mean the same thing for any upload size.
+ANALYSIS_MAX_SIDE = 640
+
+
+def original_size(image: Image.Image):
+    """Size of the upload an analysis image was made from (see ``views.validate_image``)."""
+    return image.info.get('original_size') or image.size
+
+
+def downscale_for_analysis(image: Image.Image, max_side: int = ANALYSIS_MAX_SIDE) -> Image.Image:
+    """``image`` shrunk to fit ``max_side``, or ``image`` itself if it already fits."""
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGB')
+
+    width, height = image.size
+    scale = max_side / max(width, height)
+    if scale < 1:
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # BOX + reducing_gap lets Pillow shrink by an integer factor first,
+        # which is far cheaper than a full-resolution filter pass.
+        image = image.resize(target, Image.Resampling.BOX, reducing_gap=2.0)
+    return image
+
+
+def prepare_analysis_array(image: Image.Image, max_side: int = ANALYSIS_MAX_SIDE) -> np.ndarray:
+    """Downscale a PIL image to the analysis resolution and return it as an RGB array."""
+    image = downscale_for_analysis(image, max_side)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+
 def analyze_mushroom_features(image: Image.Image) -> Dict[str, Any]:
-    """Analyze mushroom image features using computer vision."""
+    """Analyze mushroom image features using computer vision.
+
+    Every statistic is taken from one copy downscaled to ``ANALYSIS_MAX_SIDE``,
+    so an upload that ``validate_image`` already decoded at that size gets the
+    same features as the full-resolution file. Each statistic is computed with
+    a single pass over its plane.
+    """
     try:
-        # Convert PIL to OpenCV format
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Convert to grayscale for analysis
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        
-        # Basic image analysis
-        height, width = gray.shape
-        total_pixels = height * width
-        
-        # Color analysis
-        hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
-        
-        # Extract features
+        width, height = original_size(image)
+        rgb = prepare_analysis_array(image)
+        # The conversions read the RGB array directly; no BGR round-trip.
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+        total_pixels = gray.shape[0] * gray.shape[1]
+
+        # Brightness: mean and std in one pass
+        gray_mean, gray_std = cv2.meanStdDev(gray)
+        mean_brightness = float(gray_mean[0, 0])
+        brightness_std = float(gray_std[0, 0])
+
         features = {
             'image_size': (width, height),
-            'total_pixels': total_pixels,
-            'mean_brightness': np.mean(gray),
-            'brightness_std': np.std(gray),
-            'contrast': np.std(gray) / np.mean(gray) if np.mean(gray) > 0 else 0,
+            'total_pixels': width * height,
+            'mean_brightness': mean_brightness,
+            'brightness_std': brightness_std,
+            'contrast': brightness_std / mean_brightness if mean_brightness > 0 else 0,
         }
-        
-        # Color distribution analysis
-        h, s, v = cv2.split(hsv)
+
+        # Colour distribution: per-channel mean/std in one pass. The variance
+        # of the whole HSV cube follows from the per-channel moments, so the
+        # planes never need to be split or squared separately.
+        hsv_mean, hsv_std = cv2.meanStdDev(hsv)
+        hsv_mean = hsv_mean.ravel()
+        hsv_var = hsv_std.ravel() ** 2
+        overall_mean = hsv_mean.mean()
         features.update({
-            'mean_hue': np.mean(h),
-            'mean_saturation': np.mean(s),
-            'mean_value': np.mean(v),
-            'color_variance': np.var(hsv),
+            'mean_hue': float(hsv_mean[0]),
+            'mean_saturation': float(hsv_mean[1]),
+            'mean_value': float(hsv_mean[2]),
+            'color_variance': float((hsv_var + hsv_mean ** 2).mean() - overall_mean ** 2),
         })
-        
+
         # Edge detection for shape analysis
         edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / total_pixels
-        features['edge_density'] = edge_density
-        
-        # Texture analysis using simple variance
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        features['texture_variance'] = laplacian_var
-        
+        features['edge_density'] = cv2.countNonZero(edges) / total_pixels
+
+        # Texture analysis: a 3x3 Laplacian of uint8 input fits in int16
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+        _, laplacian_std = cv2.meanStdDev(laplacian)
+        features['texture_variance'] = float(laplacian_std[0, 0] ** 2)
+
         return features
-        
+
     except Exception as e:
         logger.error(f"Error in image feature analysis: {str(e)}")
         return {}
@@ -178,7 +225,7 @@ def analyze_mushroom(image: Image.Image) -> Dict[str, Any]:
             'preliminary_passed': True,
             'confidence': result.get('edibility_confidence', 75),
             'image_info': {
-                'size': image.size,
+                'size': original_size(image),
                 'mode': image.mode,
                 'format': image.format
             },
@@ -191,4 +238,8 @@ def analyze_mushroom(image: Image.Image) -> Dict[str, Any]:
         
     except Exception as e:
         logger.error(f"Error in computer vision mushroom analysis: {str(e)}")
-        return {'error': str(e)}
\ No newline at end of file
+        return {'error': str(e)}
+
+def analyze_mushroom_batch(images: List[Image.Image]) -> List[Dict[str, Any]]:
+    """Analyze several images, returning one ``analyze_mushroom`` result per image."""
+    return [analyze_mushroom(image) for image in images]
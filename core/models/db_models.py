@@ -1,9 +1,30 @@
 """Models for the core app."""
 
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Lower, Trim
 from django.core.validators import FileExtensionValidator
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User
+import uuid
+
+from ..spatial import encode_geohash
+from ..storage import get_content_storage
+from ..uploads import NormalizedImageField
+
+# Map pin colour for each report status
+STATUS_COLOR_MAP = {
+    'mapped': '#0d6efd',     # bootstrap blue
+    'edible': '#28a745',     # legend green
+    'poisonous': '#dc3545',  # bootstrap red
+    'unknown': '#ffc107',    # bootstrap yellow
+}
+# Pin colour an admin gives a report approved as "unknown"; such reports are public
+APPROVED_UNKNOWN_COLOR = STATUS_COLOR_MAP['unknown']
+# Reports on the public map, and reports still waiting for moderation. Partial
+# indexes on UnknownMushroom use these exact predicates, so queries should too.
+PUBLIC_REPORT_Q = ~Q(status='unknown') | Q(status='unknown', pin_color=APPROVED_UNKNOWN_COLOR)
+PENDING_REPORT_Q = Q(status='unknown') & ~Q(pin_color=APPROVED_UNKNOWN_COLOR)
 
 class MushroomImage(models.Model):
     """Model for storing mushroom images and their analysis results."""
@@ -11,6 +32,8 @@ class MushroomImage(models.Model):
     image = models.ImageField(
         _("mushroom image"),
         upload_to='unknown_mushrooms/',
+        storage=get_content_storage,
+        db_index=True,
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])],
         help_text=_("Upload a clear image of the mushroom (JPG, JPEG, or PNG)")
     )
@@ -21,6 +44,7 @@ class MushroomImage(models.Model):
     species_confidence = models.FloatField(_("species confidence"), null=True)
     lifespan = models.TextField(_("lifespan"), blank=True)
     preservation = models.TextField(_("preservation"), blank=True)
+    content_hash = models.CharField(_("content hash"), max_length=64, blank=True, db_index=True)
     
     def __str__(self):
         return f"Mushroom Image {self.id} - {self.uploaded_at}"
@@ -29,6 +53,12 @@ class MushroomImage(models.Model):
         verbose_name = _("mushroom image")
         verbose_name_plural = _("mushroom images")
         ordering = ['-uploaded_at']
+        constraints = [
+            # Rows added by hand may have no hash; every analysed image has one
+            models.UniqueConstraint(
+                fields=['content_hash'], condition=~models.Q(content_hash=''), name='mushroomimage_unique_content_hash',
+            ),
+        ]
 
 class UnknownMushroom(models.Model):
     """User-reported mushroom not in dataset."""
@@ -37,12 +67,18 @@ class UnknownMushroom(models.Model):
     description = models.TextField(blank=True, help_text="Additional description or notes")
     scientific_name = models.CharField(max_length=150, blank=True)
     origin = models.TextField(blank=True)
-    image = models.ImageField(
+    # Re-encoded on upload (orientation, size cap, metadata), then stored under
+    # its content hash and shared with identical uploads; see core.uploads/core.storage
+    image = NormalizedImageField(
         upload_to='unknown_mushrooms/',
+        storage=get_content_storage,
+        db_index=True,
         validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]
     )
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    # Geohash of (latitude, longitude), kept in sync by save(); see core.spatial
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
     STATUS_CHOICES = (
         ('mapped', 'Mapped'),        # blue
         ('edible', 'Edible'),        # green
@@ -60,19 +96,143 @@ class UnknownMushroom(models.Model):
     def __str__(self):
         return f"{self.name} @ ({self.latitude}, {self.longitude})"
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+                kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     @classmethod
     def get_grouped_by_name(cls):
-        """Group mushrooms by name for card display."""
-        from django.db.models import Count
-        from collections import defaultdict
-        
-        grouped = defaultdict(list)
-        mushrooms = cls.objects.all().order_by('-created_at')
-        
-        for mushroom in mushrooms:
-            grouped[mushroom.name.lower().strip()].append(mushroom)
-        
-        return dict(grouped)
+        """Species summaries for card display, keyed by normalized name, newest first."""
+        summaries = (
+            SpeciesSummary.objects
+            .filter(public_count__gt=0)
+            .select_related('latest_report')
+            .order_by('-latest_at')
+        )
+        return {summary.key: summary for summary in summaries}
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'geohash'], name='unknownmushroom_status_geo'),
+            models.Index(fields=['status', 'pin_color', '-created_at'], name='unknownmushroom_status_pin'),
+            models.Index(fields=['user', '-created_at'], name='unknownmushroom_user_created'),
+            models.Index(fields=['-created_at'], name='unknownmushroom_created'),
+            # Species lookups filter on the normalized name, LOWER(TRIM(name))
+            models.Index(Lower(Trim('name')), F('created_at').desc(), name='unknownmushroom_name_lower'),
+            models.Index(fields=['-created_at'], condition=PUBLIC_REPORT_Q, name='unknownmushroom_public'),
+            models.Index(fields=['-created_at'], condition=PENDING_REPORT_Q, name='unknownmushroom_pending'),
+        ]
+
+
+class AnalysisJob(models.Model):
+    """Queued mushroom analysis, processed in the background by ``core.jobs``."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="analysis_jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    # Decoded upload re-encoded losslessly at analysis resolution; cleared when done
+    image_data = models.BinaryField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Times a worker has claimed the job; bounds re-claims of abandoned jobs
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"Analysis job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analysisjob_status_created'),
+        ]
+
+
+class MarkerCluster(models.Model):
+    """Precomputed map cluster: public reports of one status in one grid cell at one zoom.
+
+    Maintained incrementally by ``core.clustering`` when reports change.
+    """
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    status = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+    # Coordinate sums, so the centroid is sum / count and stays exact under updates
+    lat_sum = models.FloatField(default=0)
+    lon_sum = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"z{self.zoom} ({self.cell_x}, {self.cell_y}) {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'cell_x', 'cell_y', 'status'], name='markercluster_unique_cell'),
+        ]
+
+
+class SpeciesSummary(models.Model):
+    """Per-species rollup of reports, keyed by normalized name.
+
+    Kept current by ``core.species`` whenever a report is saved or deleted, so
+    species cards and pages read one row instead of regrouping every report.
+    Counts per status cover public reports; pending ones are counted apart.
+    """
+    key = models.CharField(max_length=150, unique=True, help_text="Lower-cased, trimmed species name")
+    name = models.CharField(max_length=150, help_text="Name as written on the latest report")
+    public_count = models.PositiveIntegerField(default=0)
+    mapped_count = models.PositiveIntegerField(default=0)
+    edible_count = models.PositiveIntegerField(default=0)
+    poisonous_count = models.PositiveIntegerField(default=0)
+    unknown_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    # Latest public report, or the latest pending one if none is public yet
+    latest_report = models.ForeignKey(
+        UnknownMushroom, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    latest_at = models.DateTimeField(null=True, blank=True)
+    image = models.ImageField(upload_to='unknown_mushrooms/', blank=True)
+    # Bounding box of public sightings
+    min_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    max_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    min_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    max_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.public_count} public, {self.pending_count} pending)"
+
+    @property
+    def total_count(self):
+        return self.public_count + self.pending_count
+
+    @property
+    def bbox(self):
+        """(min_lon, min_lat, max_lon, max_lat) of public sightings, or None."""
+        if self.min_latitude is None:
+            return None
+        return (float(self.min_longitude), float(self.min_latitude),
+                float(self.max_longitude), float(self.max_latitude))
+
+    class Meta:
+        verbose_name_plural = 'species summaries'
+        indexes = [
+            models.Index(fields=['-latest_at'], condition=Q(public_count__gt=0), name='speciessummary_public_latest'),
+        ]
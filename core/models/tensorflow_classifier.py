@@ -4,24 +4,96 @@ os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
 import logging
+import queue
+import threading
+from contextlib import contextmanager
 import numpy as np
 from PIL import Image
 import tensorflow as tf
 from pathlib import Path
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+
+from ..model_utils import original_size
 
 logger = logging.getLogger(__name__)
 
+# Species information mapping, indexed by species model class
+SPECIES_INFO = {
+    0: {
+        'name': 'Apioperdon_pyriforme',
+        'lifespan': 'Room temp. 12hours after harvest. The mushroom is edible when its interior is completely white.',
+        'preservation': 'refrigerated 3-5 days.'
+    },
+    1: {
+        'name': 'Cerioporus_squamosus',
+        'lifespan': '4hours room temp after harvest',
+        'preservation': '1 week refrigerated. Can be frozen after cooking.'
+    },
+    2: {
+        'name': 'Coprinellus_micaceus',
+        'lifespan': '1-2 days room temp after harvest',
+        'preservation': 'refrigerated 3-5 days.'
+    },
+    3: {
+        'name': 'Coprinus_comatus',
+        'lifespan': '24 hours (dissolves quickly)',
+        'preservation': '10 days refrigerated, 18 days with treatment.'
+    }
+}
+
+# Largest batch handed to an interpreter at once; bigger requests are chunked
+MAX_BATCH_SIZE = 32
+
+# Model bytes read once per process by preload_model_buffers(). When the
+# master preloads them before forking, every worker's interpreters are built
+# from the same copy-on-write pages instead of each reading the files. These
+# are bytes rather than an mmap because tf.lite.Interpreter(model_content=...)
+# only accepts a bytes object; without a preload, model_path lets TFLite
+# mmap the file itself.
+_model_buffers = {}
+_model_buffers_lock = threading.Lock()
+
+def get_model_paths() -> Tuple[Path, Path]:
+    """Return the (edibility, species) .tflite paths from settings."""
+    model_dir = Path(getattr(settings, 'TFLITE_MODEL_DIR', Path(__file__).resolve().parent / 'keras_models'))
+    return model_dir / 'edibility_model.tflite', model_dir / 'species_model.tflite'
+
+def preload_model_buffers() -> Dict[str, int]:
+    """Read both .tflite files into shared in-memory buffers.
+    
+    Returns the size in bytes of each buffer loaded, keyed by path.
+    """
+    with _model_buffers_lock:
+        for path in get_model_paths():
+            key = str(path)
+            if key not in _model_buffers:
+                _model_buffers[key] = path.read_bytes()
+                logger.info(f"Preloaded {path.name} ({len(_model_buffers[key])} bytes)")
+        return {key: len(buffer) for key, buffer in _model_buffers.items()}
+
+def _create_interpreter(model_path: Path, num_threads: Optional[int] = None):
+    """Create an interpreter from the preloaded buffer if there is one, else from disk."""
+    model_content = _model_buffers.get(str(model_path))
+    if model_content is not None:
+        return tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+    return tf.lite.Interpreter(model_path=str(model_path), num_threads=num_threads)
+
 class TensorFlowLiteMushroomClassifier:
     """TensorFlow Lite-based mushroom classifier for edibility and species detection."""
     
-    def __init__(self):
-        """Initialize the TensorFlow Lite classifier."""
+    def __init__(self, num_threads: Optional[int] = None):
+        """Initialize the TensorFlow Lite classifier.
+        
+        Args:
+            num_threads: CPU threads each interpreter may use (TFLite default if None)
+        
+        Raises whatever loading either model raised, so ``ClassifierPool``
+        never hands out a classifier without interpreters.
+        """
         try:
             # Get model paths
-            base_path = Path('core/models/keras_models')
-            edibility_model_path = base_path / 'edibility_model.tflite'
-            species_model_path = base_path / 'species_model.tflite'
+            edibility_model_path, species_model_path = get_model_paths()
             
             if not edibility_model_path.exists():
                 raise FileNotFoundError(f"Edibility model not found: {edibility_model_path}")
@@ -34,15 +106,11 @@ class TensorFlowLiteMushroomClassifier:
             logger.info("Loading TensorFlow Lite models...")
             
             # Load edibility model
-            self.edibility_interpreter = tf.lite.Interpreter(
-                model_path=str(edibility_model_path)
-            )
+            self.edibility_interpreter = _create_interpreter(edibility_model_path, num_threads)
             self.edibility_interpreter.allocate_tensors()
             
             # Load species model
-            self.species_interpreter = tf.lite.Interpreter(
-                model_path=str(species_model_path)
-            )
+            self.species_interpreter = _create_interpreter(species_model_path, num_threads)
             self.species_interpreter.allocate_tensors()
             
             # Get input/output details
@@ -56,8 +124,7 @@ class TensorFlowLiteMushroomClassifier:
             
         except Exception as e:
             logger.error(f"Error loading TensorFlow Lite models: {str(e)}")
-            self.edibility_interpreter = None
-            self.species_interpreter = None
+            raise
     
     def preprocess_image(self, image: Image.Image, target_size: Tuple[int, int] = (224, 224)) -> np.ndarray:
         """Preprocess PIL image for model input."""
@@ -77,33 +144,89 @@ class TensorFlowLiteMushroomClassifier:
             logger.error(f"Error preprocessing image: {str(e)}")
             raise
     
+    def preprocess_batch(self, images: List[Image.Image], target_size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+        """Preprocess PIL images into one contiguous float32 batch array."""
+        try:
+            width, height = target_size
+            batch = np.empty((len(images), height, width, 3), dtype=np.float32)
+            for i, image in enumerate(images):
+                img = image.resize(target_size)
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                batch[i] = np.asarray(img)
+            
+            # Normalize in place
+            batch /= 255.0
+            
+            return batch
+            
+        except Exception as e:
+            logger.error(f"Error preprocessing batch: {str(e)}")
+            raise
+    
+    def _run_interpreter(self, interpreter, input_details, output_details, batch: np.ndarray) -> np.ndarray:
+        """Run one interpreter over a batch, resizing its input tensor if needed."""
+        input_index = input_details[0]['index']
+        if tuple(interpreter.get_input_details()[0]['shape']) != batch.shape:
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+        
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_details[0]['index'])
+    
+    @staticmethod
+    def _edibility_from_prediction(edibility_pred: np.ndarray) -> Dict[str, Any]:
+        """Build the edibility result for one row of model output."""
+        # Determine edibility (assuming [poisonous, edible] classes)
+        is_edible = edibility_pred[1] > edibility_pred[0]
+        confidence = float(max(edibility_pred) * 100)
+        
+        return {
+            'is_edible': bool(is_edible),
+            'confidence': confidence,
+            'probabilities': {
+                'poisonous': float(edibility_pred[0] * 100),
+                'edible': float(edibility_pred[1] * 100)
+            }
+        }
+    
+    @staticmethod
+    def _species_from_prediction(species_pred: np.ndarray) -> Dict[str, Any]:
+        """Build the species result for one row of model output."""
+        # Get top prediction
+        top_idx = int(np.argmax(species_pred))
+        top_conf = float(species_pred[top_idx] * 100)
+        
+        info = SPECIES_INFO.get(top_idx, {
+            'name': f'Unknown Species {top_idx}',
+            'lifespan': 'Unknown',
+            'preservation': 'Unknown'
+        })
+        
+        return {
+            'species': info['name'],
+            'confidence': top_conf,
+            'class_index': top_idx,
+            'lifespan': info['lifespan'],
+            'preservation': info['preservation'],
+            'all_probabilities': [float(p * 100) for p in species_pred]
+        }
+    
     def predict_edibility(self, img_array: np.ndarray) -> Dict[str, Any]:
         """Predict edibility using TensorFlow Lite model."""
         try:
             if not self.edibility_interpreter:
                 raise Exception("Edibility model not loaded")
             
-            # Set input tensor
-            self.edibility_interpreter.set_tensor(self.edibility_input_details[0]['index'], img_array)
-            
-            # Run inference
-            self.edibility_interpreter.invoke()
+            edibility_pred = self._run_interpreter(
+                self.edibility_interpreter,
+                self.edibility_input_details,
+                self.edibility_output_details,
+                img_array
+            )[0]
             
-            # Get output
-            edibility_pred = self.edibility_interpreter.get_tensor(self.edibility_output_details[0]['index'])[0]
-            
-            # Determine edibility (assuming [poisonous, edible] classes)
-            is_edible = edibility_pred[1] > edibility_pred[0]
-            confidence = float(max(edibility_pred) * 100)
-            
-            return {
-                'is_edible': bool(is_edible),
-                'confidence': confidence,
-                'probabilities': {
-                    'poisonous': float(edibility_pred[0] * 100),
-                    'edible': float(edibility_pred[1] * 100)
-                }
-            }
+            return self._edibility_from_prediction(edibility_pred)
             
         except Exception as e:
             logger.error(f"Error in edibility prediction: {str(e)}")
@@ -115,57 +238,14 @@ class TensorFlowLiteMushroomClassifier:
             if not self.species_interpreter:
                 raise Exception("Species model not loaded")
             
-            # Set input tensor
-            self.species_interpreter.set_tensor(self.species_input_details[0]['index'], img_array)
-            
-            # Run inference
-            self.species_interpreter.invoke()
-            
-            # Get output
-            species_pred = self.species_interpreter.get_tensor(self.species_output_details[0]['index'])[0]
-            
-            # Get top prediction
-            top_idx = int(np.argmax(species_pred))
-            top_conf = float(species_pred[top_idx] * 100)
-            
-            # Species information mapping
-            species_info = {
-                0: {
-                    'name': 'Apioperdon_pyriforme',
-                    'lifespan': 'Room temp. 12hours after harvest. The mushroom is edible when its interior is completely white.',
-                    'preservation': 'refrigerated 3-5 days.'
-                },
-                1: {
-                    'name': 'Cerioporus_squamosus',
-                    'lifespan': '4hours room temp after harvest',
-                    'preservation': '1 week refrigerated. Can be frozen after cooking.'
-                },
-                2: {
-                    'name': 'Coprinellus_micaceus',
-                    'lifespan': '1-2 days room temp after harvest',
-                    'preservation': 'refrigerated 3-5 days.'
-                },
-                3: {
-                    'name': 'Coprinus_comatus',
-                    'lifespan': '24 hours (dissolves quickly)',
-                    'preservation': '10 days refrigerated, 18 days with treatment.'
-                }
-            }
+            species_pred = self._run_interpreter(
+                self.species_interpreter,
+                self.species_input_details,
+                self.species_output_details,
+                img_array
+            )[0]
             
-            info = species_info.get(top_idx, {
-                'name': f'Unknown Species {top_idx}',
-                'lifespan': 'Unknown',
-                'preservation': 'Unknown'
-            })
-            
-            return {
-                'species': info['name'],
-                'confidence': top_conf,
-                'class_index': top_idx,
-                'lifespan': info['lifespan'],
-                'preservation': info['preservation'],
-                'all_probabilities': [float(p * 100) for p in species_pred]
-            }
+            return self._species_from_prediction(species_pred)
             
         except Exception as e:
             logger.error(f"Error in species prediction: {str(e)}")
@@ -187,35 +267,7 @@ class TensorFlowLiteMushroomClassifier:
             if 'error' in edibility_result or 'error' in species_result:
                 return {'error': 'Model prediction failed'}
             
-            # Combine results
-            result = {
-                'preliminary_passed': True,
-                'is_edible': edibility_result['is_edible'],
-                'edibility_confidence': edibility_result['confidence'],
-                'edibility_probability': edibility_result['confidence'] / 100,
-                'species': species_result['species'],
-                'species_confidence': species_result['confidence'],
-                'species_probability': species_result['confidence'] / 100,
-                'lifespan': species_result['lifespan'],
-                'preservation': species_result['preservation'],
-                'analysis_method': 'TensorFlow Lite Models',
-                'image_info': {
-                    'size': image.size,
-                    'mode': image.mode,
-                    'format': image.format
-                },
-                'model_details': {
-                    'edibility_probabilities': edibility_result['probabilities'],
-                    'species_class_index': species_result['class_index']
-                }
-            }
-            
-            # Add safety warnings if not edible
-            if not edibility_result['is_edible']:
-                result.update({
-                    'warning': 'This mushroom appears to be poisonous or inedible. Do not consume!',
-                    'safety_note': 'Always consult with expert mycologists before consuming wild mushrooms.'
-                })
+            result = self._build_result(image, edibility_result, species_result)
             
             logger.info(f"TensorFlow Lite analysis completed: {'Edible' if result['is_edible'] else 'Not edible'}")
             return result
@@ -224,14 +276,171 @@ class TensorFlowLiteMushroomClassifier:
             logger.error(f"Error in TensorFlow Lite analysis: {str(e)}")
             return {'error': str(e)}
 
-# Global classifier instance
+    def _build_result(self, image: Image.Image, edibility_result: Dict[str, Any],
+                      species_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine edibility and species results into the analysis dict."""
+        # Combine results
+        result = {
+            'preliminary_passed': True,
+            'is_edible': edibility_result['is_edible'],
+            'edibility_confidence': edibility_result['confidence'],
+            'edibility_probability': edibility_result['confidence'] / 100,
+            'species': species_result['species'],
+            'species_confidence': species_result['confidence'],
+            'species_probability': species_result['confidence'] / 100,
+            'lifespan': species_result['lifespan'],
+            'preservation': species_result['preservation'],
+            'analysis_method': 'TensorFlow Lite Models',
+            'image_info': {
+                'size': original_size(image),
+                'mode': image.mode,
+                'format': image.format
+            },
+            'model_details': {
+                'edibility_probabilities': edibility_result['probabilities'],
+                'species_class_index': species_result['class_index']
+            }
+        }
+        
+        # Add safety warnings if not edible
+        if not edibility_result['is_edible']:
+            result.update({
+                'warning': 'This mushroom appears to be poisonous or inedible. Do not consume!',
+                'safety_note': 'Always consult with expert mycologists before consuming wild mushrooms.'
+            })
+        
+        return result
+    
+    def analyze_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        """Analyze many images with one interpreter call per model per batch.
+        
+        Returns one result per image, in order, in the same shape as
+        ``analyze_mushroom``.
+        """
+        try:
+            if not self.edibility_interpreter or not self.species_interpreter:
+                raise Exception("Models not loaded")
+            
+            results = []
+            for start in range(0, len(images), MAX_BATCH_SIZE):
+                chunk = images[start:start + MAX_BATCH_SIZE]
+                batch = self.preprocess_batch(chunk)
+                
+                edibility_preds = self._run_interpreter(
+                    self.edibility_interpreter,
+                    self.edibility_input_details,
+                    self.edibility_output_details,
+                    batch
+                )
+                species_preds = self._run_interpreter(
+                    self.species_interpreter,
+                    self.species_input_details,
+                    self.species_output_details,
+                    batch
+                )
+                
+                for image, edibility_pred, species_pred in zip(chunk, edibility_preds, species_preds):
+                    results.append(self._build_result(
+                        image,
+                        self._edibility_from_prediction(edibility_pred),
+                        self._species_from_prediction(species_pred)
+                    ))
+            
+            logger.info(f"TensorFlow Lite batch analysis completed for {len(results)} images")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in TensorFlow Lite batch analysis: {str(e)}")
+            return [{'error': str(e)} for _ in images]
+
+class ClassifierPool:
+    """Bounded pool of classifiers for safe concurrent inference.
+    
+    A ``tf.lite.Interpreter`` must not be used by two threads at once, so each
+    caller checks out a whole classifier (one edibility + one species
+    interpreter) and returns it when done. Classifiers are created lazily up
+    to ``size``; further callers wait for one to be returned.
+    """
+    
+    def __init__(self, size: int = 1, num_threads: Optional[int] = None, checkout_timeout: Optional[float] = None):
+        self.size = max(1, int(size))
+        self.num_threads = num_threads
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _acquire(self) -> TensorFlowLiteMushroomClassifier:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return TensorFlowLiteMushroomClassifier(num_threads=self.num_threads)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No classifier available after {self.checkout_timeout}s")
+    
+    @contextmanager
+    def checkout(self):
+        """Borrow a classifier for the duration of the ``with`` block."""
+        classifier = self._acquire()
+        try:
+            yield classifier
+        finally:
+            self._idle.put(classifier)
+    
+    def analyze_mushroom(self, image: Image.Image) -> Dict[str, Any]:
+        """Analyze one image on a pooled classifier."""
+        with self.checkout() as classifier:
+            return classifier.analyze_mushroom(image)
+    
+    def analyze_batch(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        """Analyze a batch of images on a pooled classifier."""
+        with self.checkout() as classifier:
+            return classifier.analyze_batch(images)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return pool size and occupancy."""
+        created = self._created
+        idle = self._idle.qsize()
+        return {
+            'size': self.size,
+            'created': created,
+            'idle': idle,
+            'in_use': created - idle,
+        }
+
+# Global classifier pool
 _mushroom_classifier = None
+_mushroom_classifier_lock = threading.Lock()
 
-def get_mushroom_classifier():
-    """Get or create the mushroom classifier instance."""
+def get_mushroom_classifier() -> ClassifierPool:
+    """Get or create the process-wide classifier pool.
+    
+    Sized by ``TFLITE_POOL_SIZE``; each interpreter uses ``TFLITE_NUM_THREADS``.
+    """
     global _mushroom_classifier
     if _mushroom_classifier is None:
-        _mushroom_classifier = TensorFlowLiteMushroomClassifier()
+        with _mushroom_classifier_lock:
+            if _mushroom_classifier is None:
+                _mushroom_classifier = ClassifierPool(
+                    size=getattr(settings, 'TFLITE_POOL_SIZE', 1),
+                    num_threads=getattr(settings, 'TFLITE_NUM_THREADS', None),
+                    checkout_timeout=getattr(settings, 'TFLITE_CHECKOUT_TIMEOUT', None),
+                )
     return _mushroom_classifier
 
 def analyze_mushroom_with_tensorflow(image: Image.Image) -> Dict[str, Any]:
@@ -242,3 +451,13 @@ def analyze_mushroom_with_tensorflow(image: Image.Image) -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error in TensorFlow Lite analysis: {str(e)}")
         return {'error': str(e)}
+
+
+def analyze_batch_with_tensorflow(images: List[Image.Image]) -> List[Dict[str, Any]]:
+    """Analyze a batch of mushroom images using TensorFlow Lite models."""
+    try:
+        classifier = get_mushroom_classifier()
+        return classifier.analyze_batch(images)
+    except Exception as e:
+        logger.error(f"Error in TensorFlow Lite batch analysis: {str(e)}")
+        return [{'error': str(e)} for _ in images]
@@ -0,0 +1,96 @@
+"""
+Set-based moderation of reports.
+
+``moderate_reports`` applies one action to many reports with a single
+``UPDATE`` or ``DELETE`` inside one transaction, then brings the derived data
+(map clusters, species summaries, homepage cache version) up to date once for
+the whole batch instead of once per report.
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+
+from .clustering import apply_changes, contribution
+from .models import STATUS_COLOR_MAP, UnknownMushroom
+from .page_cache import bump_homepage_version
+from .signals import rollups_deferred
+from .species import refresh_species
+
+logger = logging.getLogger(__name__)
+
+APPROVE = 'approve'
+REJECT = 'reject'
+REMOVE = 'remove'
+ACTION_OUTCOMES = {APPROVE: 'approved', REJECT: 'rejected', REMOVE: 'removed'}
+# Statuses a report can be approved as
+APPROVAL_STATUSES = tuple(status for status in STATUS_COLOR_MAP if status != 'unknown')
+
+NOT_FOUND = 'not_found'
+NOT_ALLOWED = 'not_allowed'
+
+
+def _allowed(action: str, status: str) -> bool:
+    if action == REJECT:
+        return status == 'unknown'
+    if action == REMOVE:
+        return status != 'unknown'
+    return True
+
+
+def moderate_reports(ids: Iterable, action: str, status: Optional[str] = None) -> Dict[int, str]:
+    """Approve (as ``status``), reject or remove the reports in ``ids``.
+
+    Reject only applies to reports still marked unknown and remove only to
+    confirmed ones, as in the single-report admin actions. Returns an outcome
+    per id: the action's past tense, ``not_found`` or ``not_allowed``. Raises
+    ``ValueError`` for an unknown action or approval status.
+    """
+    if action not in ACTION_OUTCOMES:
+        raise ValueError(f"Unknown moderation action: {action}")
+    if action == APPROVE and status not in APPROVAL_STATUSES:
+        raise ValueError(f"Cannot approve as status: {status}")
+
+    ids = list(dict.fromkeys(int(pk) for pk in ids))
+    outcomes = {pk: NOT_FOUND for pk in ids}
+    if not ids:
+        return outcomes
+
+    with transaction.atomic(), rollups_deferred():
+        rows = (
+            UnknownMushroom.objects
+            .select_for_update()
+            .filter(id__in=ids)
+            .values_list('id', 'name', 'status', 'pin_color', 'latitude', 'longitude')
+        )
+        targets = []
+        for pk, name, current_status, pin_color, latitude, longitude in rows:
+            if _allowed(action, current_status):
+                targets.append((pk, name, contribution(current_status, pin_color, latitude, longitude), latitude, longitude))
+                outcomes[pk] = ACTION_OUTCOMES[action]
+            else:
+                outcomes[pk] = NOT_ALLOWED
+        if not targets:
+            return outcomes
+
+        target_ids = [pk for pk, *_ in targets]
+        if action == APPROVE:
+            pin_color = STATUS_COLOR_MAP[status]
+            UnknownMushroom.objects.filter(id__in=target_ids).update(
+                status=status, pin_color=pin_color, is_pending=False
+            )
+            changes = [
+                (before, contribution(status, pin_color, latitude, longitude))
+                for _, _, before, latitude, longitude in targets
+            ]
+        else:
+            UnknownMushroom.objects.filter(id__in=target_ids).delete()
+            changes = [(before, None) for _, _, before, _, _ in targets]
+
+        apply_changes(changes)
+        refresh_species(name for _, name, *_ in targets)
+
+    bump_homepage_version()
+    logger.info(f"Moderation {action} applied to {len(targets)} of {len(ids)} reports")
+    return outcomes
@@ -0,0 +1,61 @@
+"""
+Versioned cache for public page fragments.
+
+The public map, stat cards and species cards only change when a report is
+saved or deleted. Fragments are cached under a key that embeds a version
+number, and ``core.signals`` bumps that version on every ``UnknownMushroom``
+change, so stale fragments are simply never looked up again. The cache alias
+is file-based by default so every gunicorn worker on the instance sees the
+same version.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.safestring import SafeString, mark_safe
+
+logger = logging.getLogger(__name__)
+
+HOMEPAGE_VERSION_KEY = 'homepage:version'
+
+
+def page_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def get_homepage_version() -> int:
+    """Return the current homepage fragment version, initializing it if needed."""
+    cache = page_cache()
+    version = cache.get(HOMEPAGE_VERSION_KEY)
+    if version is None:
+        cache.add(HOMEPAGE_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(HOMEPAGE_VERSION_KEY)
+    return version
+
+
+def homepage_last_modified() -> datetime:
+    """When public report data last changed (the version is a timestamp)."""
+    return datetime.fromtimestamp(get_homepage_version() / 1e9, tz=timezone.utc)
+
+
+def bump_homepage_version():
+    """Invalidate every cached homepage fragment."""
+    try:
+        page_cache().set(HOMEPAGE_VERSION_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.error(f"Error bumping homepage cache version: {str(e)}")
+
+
+def cached_fragment(name: str, render: Callable[[], str]) -> SafeString:
+    """Return the cached HTML for fragment ``name``, rendering it on a miss."""
+    cache = page_cache()
+    key = f"homepage:{get_homepage_version()}:{name}"
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, str(html), settings.PAGE_CACHE_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,189 @@
+"""
+Buffered persistence of analysis results into ``MushroomImage``.
+
+Requests hand finished analyses to a shared ``AnalysisWriter``; rows are
+written with one ``bulk_create`` every ``ANALYSIS_PERSIST_BATCH_SIZE`` results
+or ``ANALYSIS_PERSIST_FLUSH_SECONDS`` seconds, so a prediction never waits on
+its own INSERT. ``record`` keeps a copy of the (analysis-sized) image, since
+callers close theirs; the JPEG encoding happens on the writer thread, and the
+content hash is the one the result cache already computed. Images are
+deduplicated by content hash within a batch, against rows already stored,
+and by a unique constraint for writers in other processes.
+"""
+
+import atexit
+import io
+import logging
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image
+
+from .derivatives import schedule_derivatives
+from .models import MushroomImage
+from .result_cache import image_digest
+
+logger = logging.getLogger(__name__)
+
+# Decoded pixels held before the writer is woken early, whatever the batch size
+MAX_PENDING_PIXEL_BYTES = 64 * 1024 * 1024
+
+
+class PendingResult(NamedTuple):
+    image: Image.Image
+    result: Dict[str, Any]
+    digest: Optional[str]
+
+
+def mushroom_image_from_result(image: Image.Image, result: Dict[str, Any], digest: str = None) -> MushroomImage:
+    """Build an unsaved ``MushroomImage`` for an analysis result."""
+    digest = digest or image_digest(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+
+    instance = MushroomImage(
+        is_edible=result.get('is_edible'),
+        edibility_confidence=result.get('edibility_confidence'),
+        species=(result.get('species') or '')[:100],
+        species_confidence=result.get('species_confidence'),
+        lifespan=result.get('lifespan', ''),
+        preservation=result.get('preservation', ''),
+        content_hash=digest,
+    )
+    # Not saved to storage yet; bulk_create runs the field's pre_save
+    instance.image = ContentFile(buffer.getvalue(), name=f"{digest}.jpg")
+    return instance
+
+
+class AnalysisWriter:
+    """Collects analysis results and writes them to the database in bulk."""
+
+    def __init__(self, batch_size: int = 50, flush_seconds: float = 5.0):
+        self.batch_size = max(1, int(batch_size))
+        self.flush_seconds = flush_seconds
+        self._pending: List[PendingResult] = []
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self.written = 0
+        self.duplicates = 0
+
+    def record(self, image: Image.Image, result: Dict[str, Any], digest: Optional[str] = None):
+        """Queue one result for writing. Error results are ignored.
+
+        ``digest`` is ``image_digest(image)`` if the caller has it; otherwise
+        the writer computes it. The image is copied, so the caller may close it.
+        """
+        if not result or 'error' in result:
+            return
+
+        self._ensure_started()
+        image = image.copy()
+        size = image.size[0] * image.size[1] * len(image.getbands())
+        with self._lock:
+            self._pending.append(PendingResult(image, result, digest))
+            self._pending_bytes += size
+            full = len(self._pending) >= self.batch_size or self._pending_bytes >= MAX_PENDING_PIXEL_BYTES
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows created."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._pending_bytes = 0
+            if not batch:
+                return 0
+
+            unique = {}
+            for pending in batch:
+                unique.setdefault(pending.digest or image_digest(pending.image), pending)
+            existing = set(
+                MushroomImage.objects
+                .filter(content_hash__in=list(unique))
+                .values_list('content_hash', flat=True)
+            )
+            to_create = []
+            for digest, pending in unique.items():
+                if digest in existing:
+                    continue
+                try:
+                    to_create.append(mushroom_image_from_result(pending.image, pending.result, digest))
+                except Exception as e:
+                    logger.error(f"Error preparing analysis result for storage: {str(e)}")
+
+            # Another process may have stored the same image since the query above
+            MushroomImage.objects.bulk_create(to_create, ignore_conflicts=True)
+            # bulk_create sends no post_save, so queue derivatives here
+            for instance in to_create:
+                schedule_derivatives(instance.image.name)
+            self.written += len(to_create)
+            self.duplicates += len(batch) - len(to_create)
+            return len(to_create)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {'pending': pending, 'written': self.written, 'duplicates': self.duplicates}
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wakeup = threading.Event()
+                threading.Thread(target=self._run, name='analysis-writer', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing analysis results: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+# Global writer instance
+_analysis_writer = None
+_analysis_writer_lock = threading.Lock()
+
+
+def get_analysis_writer() -> AnalysisWriter:
+    """Get or create the process-wide analysis writer."""
+    global _analysis_writer
+    if _analysis_writer is None:
+        with _analysis_writer_lock:
+            if _analysis_writer is None:
+                _analysis_writer = AnalysisWriter(
+                    batch_size=settings.ANALYSIS_PERSIST_BATCH_SIZE,
+                    flush_seconds=settings.ANALYSIS_PERSIST_FLUSH_SECONDS,
+                )
+                atexit.register(_flush_at_exit)
+    return _analysis_writer
+
+
+def _flush_at_exit():
+    try:
+        _analysis_writer.flush()
+    except Exception as e:
+        logger.error(f"Error flushing analysis results at exit: {str(e)}")
+
+
+def record_analysis(image: Image.Image, result: Dict[str, Any], digest: Optional[str] = None):
+    """Queue an analysis for storage if ``ANALYSIS_PERSIST_ENABLED``."""
+    if settings.ANALYSIS_PERSIST_ENABLED:
+        get_analysis_writer().record(image, result, digest)
@@ -0,0 +1,147 @@
+"""
+Content-hash cache for mushroom analysis results.
+
+Results are keyed by a digest of the decoded pixels plus the analyzer
+version, so a retried or duplicate upload is answered without running
+OpenCV or TFLite again. Entries live in a per-process LRU and, optionally,
+in a shared Django cache as a second tier.
+"""
+
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(image: Image.Image) -> str:
+    """Hash the decoded pixel data (plus size and mode) of a PIL image."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class AnalysisResultCache:
+    """LRU cache of analysis results with an optional Django cache tier."""
+
+    def __init__(self, max_entries: int = 256, cache_alias: Optional[str] = None, timeout: Optional[int] = None):
+        self.max_entries = max(0, int(max_entries))
+        self.cache_alias = cache_alias or None
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result for ``key``, or None."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(result)
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                result = shared.get(key)
+            except Exception as e:
+                logger.error(f"Error reading shared analysis cache: {str(e)}")
+                result = None
+            if result is not None:
+                self._remember(key, result)
+                with self._lock:
+                    self.shared_hits += 1
+                return copy.deepcopy(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """Store ``result`` in both tiers."""
+        result = copy.deepcopy(result)
+        self._remember(key, result)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, result, self.timeout)
+            except Exception as e:
+                logger.error(f"Error writing shared analysis cache: {str(e)}")
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, image: Image.Image, compute: Callable[[Image.Image], Dict[str, Any]], version: str,
+                       digest: Optional[str] = None) -> Dict[str, Any]:
+        """Return the cached result for ``image`` or compute and cache it.
+
+        Pass ``digest`` if ``image_digest(image)`` is already known. Results
+        containing an ``error`` key are returned but never cached.
+        """
+        key = f"analysis:{version}:{digest or image_digest(image)}"
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        result = compute(image)
+        if result and 'error' not in result:
+            self.set(key, result)
+        return result
+
+    def clear(self):
+        """Drop all in-process entries (the shared tier is left alone)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            hits = self.memory_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'memory_hits': self.memory_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0,
+            }
+
+
+# Global cache instance
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisResultCache:
+    """Get or create the process-wide analysis result cache."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisResultCache(
+                    max_entries=settings.ANALYSIS_CACHE_SIZE,
+                    cache_alias=settings.ANALYSIS_CACHE_ALIAS,
+                    timeout=settings.ANALYSIS_CACHE_TIMEOUT,
+                )
+    return _analysis_cache
@@ -0,0 +1,105 @@
+"""Signal handlers for the core app."""
+
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .clustering import apply_changes, contribution, report_contribution
+from .derivatives import schedule_derivatives
+from .media_refs import release_after_commit
+from .models import MushroomImage, UnknownMushroom
+from .page_cache import bump_homepage_version
+from .species import refresh_species
+
+_deferred = threading.local()
+
+
+@contextmanager
+def rollups_deferred():
+    """Skip the per-report handlers below for the current thread.
+
+    For batch operations that update clusters, species summaries and the
+    homepage version once for the whole batch themselves.
+    """
+    previous = getattr(_deferred, 'active', False)
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = previous
+
+
+def _is_deferred():
+    return getattr(_deferred, 'active', False)
+
+
+@receiver(post_save, sender=UnknownMushroom)
+@receiver(post_delete, sender=UnknownMushroom)
+def invalidate_homepage(sender, **kwargs):
+    """Any report change can alter the public map, stats or species cards."""
+    if not _is_deferred():
+        bump_homepage_version()
+
+
+@receiver(pre_save, sender=UnknownMushroom)
+def remember_stored_report(sender, instance, raw=False, **kwargs):
+    """Record the stored row's species and cluster contribution before it changes."""
+    instance._cluster_before = None
+    instance._name_before = None
+    instance._image_before = None
+    if raw or instance.pk is None or _is_deferred():
+        return
+    stored = (
+        UnknownMushroom.objects
+        .filter(pk=instance.pk)
+        .values_list('image', 'name', 'status', 'pin_color', 'latitude', 'longitude')
+        .first()
+    )
+    if stored is not None:
+        instance._image_before = stored[0]
+        instance._name_before = stored[1]
+        instance._cluster_before = contribution(*stored[2:])
+
+
+@receiver(post_save, sender=UnknownMushroom)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    if raw or _is_deferred():
+        return
+    apply_changes([(getattr(instance, '_cluster_before', None), report_contribution(instance))])
+    refresh_species([getattr(instance, '_name_before', None), instance.name])
+
+
+@receiver(post_delete, sender=UnknownMushroom)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    if _is_deferred():
+        return
+    apply_changes([(report_contribution(instance), None)])
+    refresh_species([instance.name])
+
+
+@receiver(post_save, sender=UnknownMushroom)
+@receiver(post_save, sender=MushroomImage)
+def generate_image_derivatives(sender, instance, created=False, raw=False, **kwargs):
+    """Queue resized copies of a newly stored or replaced image."""
+    if raw or not instance.image:
+        return
+    if created or getattr(instance, '_image_before', instance.image.name) != instance.image.name:
+        schedule_derivatives(instance.image.name)
+
+
+@receiver(post_save, sender=UnknownMushroom)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    """Drop the previous image file once no other row shares it."""
+    before = getattr(instance, '_image_before', None)
+    if not raw and before and before != instance.image.name:
+        release_after_commit(before)
+
+
+@receiver(post_delete, sender=UnknownMushroom)
+@receiver(post_delete, sender=MushroomImage)
+def release_deleted_image(sender, instance, **kwargs):
+    # Also runs under rollups_deferred(): bulk deletes must free files too
+    if instance.image:
+        release_after_commit(instance.image.name)
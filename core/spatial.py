@@ -0,0 +1,189 @@
+"""
+Geohash-based spatial lookups that work on any database.
+
+Each ``UnknownMushroom`` stores the geohash of its coordinates. Points in the
+same geohash cell share a prefix, so a cell is a contiguous range of the
+``(status, geohash)`` index and a bounding box becomes a few index range scans
+over covering cells instead of a full table scan. Exact bbox/radius filtering
+and distance ordering are then done on the small candidate set.
+"""
+
+import math
+from functools import reduce
+from operator import or_
+from typing import List, Optional, Tuple
+
+from django.db.models import Q
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# 9 characters is roughly 5m x 5m, finer than the stored 6 decimal places need
+GEOHASH_PRECISION = 9
+# Upper bound on covering cells per query; fewer, coarser cells scan more rows
+MAX_COVERING_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def encode_geohash(latitude, longitude, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash of a point; accepts floats or Decimals."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    lat, lon = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at ``precision``."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def covering_cells(bbox: BBox, max_cells: int = MAX_COVERING_CELLS) -> List[str]:
+    """Geohash prefixes whose cells together cover ``bbox``.
+
+    Uses the finest precision that needs at most ``max_cells`` cells.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    best = ['']  # the empty prefix matches everything
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = math.floor((max_lat + 90.0) / height) - math.floor((min_lat + 90.0) / height) + 1
+        cols = math.floor((max_lon + 180.0) / width) - math.floor((min_lon + 180.0) / width) + 1
+        if rows * cols > max_cells:
+            break
+        # Sample each cell at its centre, starting from the cell holding the corner
+        start_lat = (math.floor((min_lat + 90.0) / height) + 0.5) * height - 90.0
+        start_lon = (math.floor((min_lon + 180.0) / width) + 0.5) * width - 180.0
+        best = sorted({
+            encode_geohash(min(start_lat + row * height, 90.0), min(start_lon + col * width, 180.0), precision)
+            for row in range(rows)
+            for col in range(cols)
+        })
+    return best
+
+
+def geohash_prefix_q(prefixes: List[str], field: str = 'geohash') -> Q:
+    """Q matching rows whose geohash starts with any of ``prefixes``.
+
+    Written as ranges rather than ``startswith`` so every prefix is an index
+    range scan on SQLite and PostgreSQL alike (LIKE is not).
+    """
+    ranges = []
+    for prefix in prefixes:
+        padding = GEOHASH_PRECISION - len(prefix)
+        ranges.append(Q(**{
+            f'{field}__gte': prefix + GEOHASH_ALPHABET[0] * padding,
+            f'{field}__lte': prefix + GEOHASH_ALPHABET[-1] * padding,
+        }))
+    return reduce(or_, ranges)
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float) -> BBox:
+    """Bounding box enclosing a circle, clipped to valid coordinates."""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(latitude))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(180.0, radius_km / (KM_PER_DEGREE_LAT * cos_lat))
+    return (
+        max(-180.0, longitude - lon_delta),
+        max(-90.0, latitude - lat_delta),
+        min(180.0, longitude + lon_delta),
+        min(90.0, latitude + lat_delta),
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = (math.radians(float(v)) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _statuses_for(queryset, statuses):
+    # Leading the query with status lets it use the (status, geohash) index
+    if statuses is None:
+        statuses = [value for value, _ in queryset.model._meta.get_field('status').choices]
+    return queryset.filter(status__in=list(statuses))
+
+
+def within_bbox(queryset, bbox: BBox, statuses: Optional[List[str]] = None):
+    """Rows of ``queryset`` inside ``bbox``."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return _statuses_for(queryset, statuses).filter(
+        geohash_prefix_q(covering_cells(bbox)),
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius_km: float, statuses: Optional[List[str]] = None):
+    """Rows within ``radius_km`` of a point as a list ordered by distance.
+
+    Each row gets a ``distance_km`` attribute.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    candidates = within_bbox(queryset, radius_bbox(latitude, longitude, radius_km), statuses)
+    results = []
+    for row in candidates:
+        row.distance_km = haversine_km(latitude, longitude, row.latitude, row.longitude)
+        if row.distance_km <= radius_km:
+            results.append(row)
+    results.sort(key=lambda row: row.distance_km)
+    return results
+
+
+def nearest(queryset, latitude, longitude, limit: int = 5, statuses: Optional[List[str]] = None,
+            start_radius_km: float = 1.0, max_radius_km: float = math.pi * EARTH_RADIUS_KM):
+    """The ``limit`` rows closest to a point, searching outward in doubling radii."""
+    radius = start_radius_km
+    while True:
+        found = within_radius(queryset, latitude, longitude, radius, statuses)
+        if len(found) >= limit or radius >= max_radius_km:
+            return found[:limit]
+        radius *= 2
+
+
+def backfill_geohashes(model, batch_size: int = 1000, only_missing: bool = True) -> int:
+    """Store geohashes for rows of ``model`` in batches; returns rows updated."""
+    rows = model.objects.only('id', 'latitude', 'longitude', 'geohash').order_by('id')
+    if only_missing:
+        rows = rows.filter(geohash='')
+    updated = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        geohash = encode_geohash(row.latitude, row.longitude)
+        if geohash != row.geohash:
+            row.geohash = geohash
+            batch.append(row)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['geohash'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['geohash'])
+        updated += len(batch)
+    return updated
@@ -0,0 +1,106 @@
+"""
+Maintenance of the ``SpeciesSummary`` rollup table.
+
+Reports are grouped by their normalized name, ``LOWER(TRIM(name))``. Whenever
+a report is saved or deleted, the summary rows for its old and new names are
+recomputed from that species' reports only (an index range on the
+``unknownmushroom_name_lower`` index) inside one transaction, so counts,
+latest report and bounding box never drift even when the latest or an
+outermost sighting goes away.
+"""
+
+import logging
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Lower, Trim
+
+from .models import PENDING_REPORT_Q, PUBLIC_REPORT_Q, SpeciesSummary, UnknownMushroom
+
+logger = logging.getLogger(__name__)
+
+STATUS_COUNT_FIELDS = {
+    'mapped': 'mapped_count',
+    'edible': 'edible_count',
+    'poisonous': 'poisonous_count',
+    'unknown': 'unknown_count',
+}
+
+
+def species_key(name: Optional[str]) -> str:
+    """Normalized species name; matches ``LOWER(TRIM(name))`` for ASCII names."""
+    return (name or '').strip().lower()
+
+
+def reports_for_species(key: str):
+    """Reports whose normalized name is ``key``."""
+    return UnknownMushroom.objects.alias(name_key=Lower(Trim('name'))).filter(name_key=key)
+
+
+def _summary_values(key: str) -> Optional[dict]:
+    reports = reports_for_species(key)
+    stats = reports.aggregate(
+        public_count=Count('id', filter=PUBLIC_REPORT_Q),
+        pending_count=Count('id', filter=PENDING_REPORT_Q),
+        min_latitude=Min('latitude', filter=PUBLIC_REPORT_Q),
+        max_latitude=Max('latitude', filter=PUBLIC_REPORT_Q),
+        min_longitude=Min('longitude', filter=PUBLIC_REPORT_Q),
+        max_longitude=Max('longitude', filter=PUBLIC_REPORT_Q),
+        **{
+            field: Count('id', filter=PUBLIC_REPORT_Q & Q(status=status))
+            for status, field in STATUS_COUNT_FIELDS.items()
+        },
+    )
+    if not stats['public_count'] and not stats['pending_count']:
+        return None
+
+    candidates = reports.filter(PUBLIC_REPORT_Q) if stats['public_count'] else reports
+    latest = candidates.order_by('-created_at', '-id').only('name', 'image', 'created_at').first()
+    if latest is None:  # removed concurrently
+        return None
+    stats.update(
+        name=latest.name.strip(),
+        latest_report=latest,
+        latest_at=latest.created_at,
+        image=latest.image.name,
+    )
+    return stats
+
+
+def refresh_species(names: Iterable[Optional[str]]):
+    """Recompute the summaries for the species of ``names`` (raw or normalized)."""
+    keys = {species_key(name) for name in names} - {''}
+    if not keys:
+        return
+    with transaction.atomic():
+        for key in sorted(keys):  # fixed order so concurrent refreshes lock rows alike
+            values = _summary_values(key)
+            if values is None:
+                SpeciesSummary.objects.filter(key=key).delete()
+            else:
+                SpeciesSummary.objects.update_or_create(key=key, defaults=values)
+
+
+def rebuild_species_summaries() -> int:
+    """Recompute every summary from the reports table; returns rows written."""
+    keys = set(
+        UnknownMushroom.objects
+        .annotate(name_key=Lower(Trim('name')))
+        .values_list('name_key', flat=True)
+        .distinct()
+    )
+    with transaction.atomic():
+        SpeciesSummary.objects.exclude(key__in=keys).delete()
+        refresh_species(keys)
+    return SpeciesSummary.objects.count()
+
+
+def get_species_summary(name: str) -> Optional[SpeciesSummary]:
+    """Summary row for a species name, with its latest report loaded."""
+    return (
+        SpeciesSummary.objects
+        .select_related('latest_report')
+        .filter(key=species_key(name))
+        .first()
+    )
@@ -0,0 +1,114 @@
+"""
+Storage backends: content-addressed storage for uploaded images, and the
+hashed, precompressed storage for static files.
+
+Files are named after the SHA-256 of their bytes and sharded by its first two
+byte pairs, so ``unknown_mushrooms/abc.jpg`` is stored as
+``unknown_mushrooms/3f/a2/3fa2...e9.jpg``. Saving bytes that are already
+stored returns the existing name without writing anything, which lets
+reports and analysis images of the same photo share one file. Because a name
+always denotes the same bytes, its URL can be cached forever, and a save that
+finds its name taken (even by a concurrent save) reuses it rather than
+picking a suffixed name. Reusing a file renews its modification time, so the
+age guards of ``core.media_refs`` treat it like a fresh upload.
+
+Several rows can point at one file, so deleting a row must not delete its
+file; ``core.media_refs`` counts references and removes unreferenced files.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import threading
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+HASH_SHARD_DEPTH = 2  # directory levels of two hex characters each
+# A content-addressed original or one of its derivatives (core.derivatives)
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\d+w)?\.[a-z0-9]+$')
+
+
+def content_digest(content) -> str:
+    """Hex SHA-256 of a ``File``'s bytes; leaves it rewound."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """Sharded storage name for ``digest``, in ``name``'s directory and with its extension."""
+    directory = posixpath.dirname(name)
+    ext = posixpath.splitext(name)[1].lower()
+    shards = [digest[i * 2:i * 2 + 2] for i in range(HASH_SHARD_DEPTH)]
+    return posixpath.join(directory, *shards, f"{digest}{ext}")
+
+
+def is_content_addressed(name: str) -> bool:
+    """Whether ``name`` was named by its content, so its bytes can never change."""
+    return CONTENT_ADDRESSED_RE.search(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` that names files by content hash; see the module docstring."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = hashed_name(name, content_digest(content))
+        try:
+            return super().save(name, content, max_length=max_length)
+        except FileExistsError:
+            pass
+        # Already stored, possibly by a concurrent save of the same bytes
+        os.utime(self.path(name))
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Also called by _save when its exclusive create fails; raising lets
+        # save() reuse the file instead of writing a suffixed copy
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+
+# Global storage instance
+_content_storage = None
+_content_storage_lock = threading.Lock()
+
+
+def get_content_storage() -> ContentAddressedStorage:
+    """Storage for the image fields; follows MEDIA_ROOT/MEDIA_URL like the default one."""
+    global _content_storage
+    if _content_storage is None:
+        with _content_storage_lock:
+            if _content_storage is None:
+                _content_storage = ContentAddressedStorage()
+    return _content_storage
+
+
+class StaticManifestStorage(CompressedManifestStaticFilesStorage):
+    """Hashed static file names plus Brotli/gzip copies, written by collectstatic.
+
+    Names missing from the manifest (e.g. a Git LFS asset that was never
+    fetched) get the plain name rather than failing the whole page; see
+    ``core.checks`` for the warning. Before collectstatic has ever run, as
+    in tests or a fresh checkout, URLs use the plain names too.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected, so it cannot be hashed either
+            return name
@@ -1,16 +1,41 @@
 from django import template
-from django.conf import settings
+
+from core.derivatives import IMAGE_SIZES, image_srcset, image_url
 
 register = template.Library()
 
+
+def _image_name(image):
+    """Storage name from an image field file or a plain name."""
+    return getattr(image, 'name', image) or ''
+
+
+@register.simple_tag
+def media_url(image_field, size=None):
+    """URL of an uploaded image, or of its derivative for ``size``.
+
+    ``size`` is one of ``thumb``, ``card``, ``detail``, ``large`` or a width in
+    pixels; without it the original is returned.
+    """
+    return image_url(_image_name(image_field), size)
+
+
 @register.simple_tag
-def media_url(image_field):
-    """Generate static URL for media files in production."""
-    if not image_field or not image_field.name:
-        return ''
-    
-    if settings.DEBUG:
-        return image_field.url
-    else:
-        # In production, media files are served as static files
-        return f"/static/{image_field.name}"
+def media_srcset(image_field, ext='jpg'):
+    """``srcset`` of the generated derivatives of an image."""
+    return image_srcset(_image_name(image_field), ext)
+
+
+@register.inclusion_tag('core/responsive_image.html')
+def responsive_image(image_field, size='card', alt='', css_class='', style='', sizes=None):
+    """``<picture>`` with WebP and JPEG ``srcset`` for an uploaded image."""
+    name = _image_name(image_field)
+    return {
+        'src': image_url(name, size),
+        'webp_srcset': image_srcset(name, 'webp'),
+        'jpg_srcset': image_srcset(name, 'jpg'),
+        'sizes': sizes or f"{IMAGE_SIZES.get(size, size)}px",
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+    }
@@ -1,3 +1,1518 @@
-from django.test import TestCase
+import importlib
+import importlib.util
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipIf
+from urllib.parse import urlencode
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .analyzers import AnalyzerBackend, HeuristicAnalyzer, get_analyzer, register_backend
+from .batching import MicroBatcher
+from .checks import check_static_references
+from .warmup import preload, warm_worker
+from .clustering import rebuild_clusters
+from .derivatives import DerivativeGenerator, available_widths, derivative_name, generate_derivatives, image_url
+from .jobs import (
+    JobRunner, QueueFull, claim_next_job, decode_job_image, encode_job_image, enqueue_analysis, process_job,
+    purge_finished_jobs, start_job_runner,
+)
+from .models import (
+    APPROVED_UNKNOWN_COLOR, STATUS_COLOR_MAP, AnalysisJob, MarkerCluster, MushroomImage, SpeciesSummary, UnknownMushroom,
+)
+from .page_cache import get_homepage_version, page_cache
+from .persistence import AnalysisWriter, mushroom_image_from_result
+from .media_refs import release_files
+from .moderation import moderate_reports
+from .model_utils import ANALYSIS_MAX_SIDE, analyze_mushroom_features, estimate_mushroom_type
+from .result_cache import AnalysisResultCache
+from .storage import (
+    ContentAddressedStorage, StaticManifestStorage, get_content_storage, hashed_name, is_content_addressed,
+)
+from .spatial import backfill_geohashes, encode_geohash, nearest, within_bbox, within_radius
+from .species import rebuild_species_summaries, reports_for_species
+from . import derivatives, views
+from .views import ADMIN_REPORT_PAGE_SIZE, validate_image
+
+if importlib.util.find_spec('tensorflow') is not None:
+    from .models import tensorflow_classifier
+else:
+    tensorflow_classifier = None
+
+
+def reference_features(image):
+    """Full-resolution feature extraction as it was before the fused rewrite."""
+    cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    total_pixels = height * width
+    hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    edges = cv2.Canny(gray, 50, 150)
+    return {
+        'image_size': (width, height),
+        'total_pixels': total_pixels,
+        'mean_brightness': np.mean(gray),
+        'brightness_std': np.std(gray),
+        'contrast': np.std(gray) / np.mean(gray) if np.mean(gray) > 0 else 0,
+        'mean_hue': np.mean(h),
+        'mean_saturation': np.mean(s),
+        'mean_value': np.mean(v),
+        'color_variance': np.var(hsv),
+        'edge_density': np.sum(edges > 0) / total_pixels,
+        'texture_variance': cv2.Laplacian(gray, cv2.CV_64F).var(),
+    }
+
+
+def synthetic_mushroom(width, height, seed=0):
+    """Smooth gradients plus a few blobs and noise, so every feature is non-trivial."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    rgb = np.empty((height, width, 3), dtype=np.float64)
+    rgb[..., 0] = 120 + 80 * np.sin(xx / width * np.pi)
+    rgb[..., 1] = 90 + 60 * (yy / height)
+    rgb[..., 2] = 60 + 40 * np.cos(yy / height * np.pi)
+    for _ in range(6):
+        cx, cy = rng.integers(0, width), rng.integers(0, height)
+        radius = rng.integers(min(width, height) // 10, min(width, height) // 4)
+        mask = (xx - cx) ** 2 + (yy - cy) ** 2 < radius ** 2
+        rgb[mask] = rng.integers(0, 255, size=3)
+    rgb += rng.normal(0, 6, size=rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), 'RGB')
+
+
+class AnalyzeMushroomFeaturesTests(SimpleTestCase):
+    def test_matches_reference_at_analysis_resolution(self):
+        image = synthetic_mushroom(480, 360)
+        expected = reference_features(image)
+        features = analyze_mushroom_features(image)
+
+        self.assertEqual(set(features), set(expected))
+        self.assertEqual(features['image_size'], expected['image_size'])
+        self.assertEqual(features['total_pixels'], expected['total_pixels'])
+        for key in expected:
+            if key in ('image_size', 'total_pixels'):
+                continue
+            self.assertAlmostEqual(features[key], float(expected[key]), places=4, msg=key)
+
+    def test_large_image_is_analyzed_at_analysis_resolution(self):
+        image = synthetic_mushroom(ANALYSIS_MAX_SIDE * 3, ANALYSIS_MAX_SIDE * 2, seed=1)
+        target = (ANALYSIS_MAX_SIDE, round(ANALYSIS_MAX_SIDE * 2 / 3))
+        analysis_copy = image.resize(target, Image.Resampling.BOX, reducing_gap=2.0)
+        expected = reference_features(analysis_copy)
+        features = analyze_mushroom_features(image)
+
+        # Size metadata still describes the image passed in, not the analysis copy
+        self.assertEqual(features['image_size'], image.size)
+        self.assertEqual(features['total_pixels'], image.size[0] * image.size[1])
+        for key in expected:
+            if key in ('image_size', 'total_pixels'):
+                continue
+            self.assertAlmostEqual(features[key], float(expected[key]), places=4, msg=key)
+
+    def test_validated_upload_gets_the_features_of_the_full_file(self):
+        sizes = [(ANALYSIS_MAX_SIDE * 4, ANALYSIS_MAX_SIDE * 3), (ANALYSIS_MAX_SIDE * 3, ANALYSIS_MAX_SIDE * 2)]
+        for seed, size in enumerate(sizes):
+            upload = jpeg_upload(synthetic_mushroom(*size, seed=seed))
+            features = analyze_mushroom_features(validate_image(upload))
+            upload.seek(0)
+            with Image.open(upload) as full:
+                expected = analyze_mushroom_features(full)
+
+            # JPEG draft scaling and a box filter differ only in the fine detail
+            for key in ('mean_brightness', 'brightness_std', 'contrast', 'mean_hue', 'mean_saturation', 'mean_value',
+                        'color_variance', 'edge_density'):
+                self.assertAlmostEqual(features[key], expected[key], delta=0.05 * expected[key], msg=key)
+            self.assertAlmostEqual(features['texture_variance'], expected['texture_variance'],
+                                   delta=0.2 * expected['texture_variance'])
+
+            random.seed(0)
+            estimate = estimate_mushroom_type(features)
+            random.seed(0)
+            self.assertEqual(estimate, estimate_mushroom_type(expected))
+
+    def test_non_rgb_modes_are_accepted(self):
+        image = synthetic_mushroom(200, 150).convert('L')
+        features = analyze_mushroom_features(image)
+        self.assertEqual(features['image_size'], (200, 150))
+        self.assertEqual(features['mean_saturation'], 0.0)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def run_concurrently(self, batcher, items):
+        results = {}
+        barrier = threading.Barrier(len(items))
+
+        def worker(item):
+            barrier.wait()
+            try:
+                results[item] = batcher.submit(item, timeout=5)
+            except Exception as e:
+                results[item] = e
+
+        threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_submissions_are_batched_and_fanned_out(self):
+        calls = []
+
+        def batch_fn(items):
+            calls.append(list(items))
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=200)
+        results = self.run_concurrently(batcher, list(range(8)))
+
+        self.assertEqual(results, {item: item * 10 for item in range(8)})
+        self.assertLess(len(calls), 8)
+        self.assertTrue(all(len(call) <= 4 for call in calls))
+
+        stats = batcher.stats()
+        self.assertEqual(stats['items'], 8)
+        self.assertEqual(stats['batches'], len(calls))
+        self.assertEqual(sum(stats['batch_size_histogram'].values()), len(calls))
+
+    def test_batch_errors_reach_every_waiter(self):
+        def batch_fn(items):
+            raise ValueError('model failed')
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=50)
+        results = self.run_concurrently(batcher, [1, 2, 3])
+
+        for result in results.values():
+            self.assertIsInstance(result, ValueError)
+
+    def test_stuck_batch_falls_back_to_single_item(self):
+        release = threading.Event()
+        batched = []
+
+        def batch_fn(items):
+            release.wait(5)
+            batched.extend(items)
+            return list(items)
+
+        batcher = MicroBatcher(batch_fn, max_batch_size=1, max_wait_ms=0, timeout=0.05, fallback_fn=lambda item: -item)
+        try:
+            # The first item holds the dispatcher, so the second never leaves the queue
+            self.assertEqual(batcher.submit(1), -1)
+            self.assertEqual(batcher.submit(2), -2)
+        finally:
+            release.set()
+
+        self.assertEqual(batcher.stats()['timeouts'], 2)
+        batcher._thread.join(0.5)
+        self.assertEqual(batched, [1])
+
+    def test_timeout_without_fallback_raises(self):
+        release = threading.Event()
+        batcher = MicroBatcher(lambda items: release.wait(5) and items, timeout=0.05)
+        try:
+            with self.assertRaises(TimeoutError):
+                batcher.submit(1)
+        finally:
+            release.set()
+
+
+class AnalysisResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def compute(self, image):
+        self.calls += 1
+        return {'is_edible': False, 'image_info': {'size': image.size}}
+
+    def test_repeated_image_is_served_from_memory(self):
+        cache = AnalysisResultCache(max_entries=4)
+        first = cache.get_or_compute(synthetic_mushroom(64, 48), self.compute, 'v1')
+        second = cache.get_or_compute(synthetic_mushroom(64, 48), self.compute, 'v1')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        # Callers get their own copy
+        second['image_info']['size'] = None
+        self.assertEqual(cache.get_or_compute(synthetic_mushroom(64, 48), self.compute, 'v1')['image_info']['size'], (64, 48))
+
+    def test_version_and_eviction(self):
+        cache = AnalysisResultCache(max_entries=1)
+        image_a, image_b = synthetic_mushroom(32, 32, seed=1), synthetic_mushroom(32, 32, seed=2)
+        cache.get_or_compute(image_a, self.compute, 'v1')
+        cache.get_or_compute(image_a, self.compute, 'v2')
+        self.assertEqual(self.calls, 2)
+
+        cache.get_or_compute(image_b, self.compute, 'v1')
+        cache.get_or_compute(image_a, self.compute, 'v2')
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_errors_are_not_cached(self):
+        cache = AnalysisResultCache()
+        image = synthetic_mushroom(32, 32)
+        cache.get_or_compute(image, lambda img: {'error': 'boom'}, 'v1')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_shared_tier_fills_a_cold_process(self):
+        warm = AnalysisResultCache(cache_alias='default')
+        cold = AnalysisResultCache(cache_alias='default')
+        image = synthetic_mushroom(48, 48, seed=3)
+        warm.get_or_compute(image, self.compute, 'v1')
+        cold.get_or_compute(image, self.compute, 'v1')
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cold.stats()['shared_hits'], 1)
+
+
+def jpeg_upload(image, orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    image.save(buffer, 'JPEG', quality=90, exif=exif.tobytes())
+    return SimpleUploadedFile('mushroom.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ValidateImageTests(SimpleTestCase):
+    def test_large_jpeg_is_decoded_at_analysis_resolution(self):
+        upload = jpeg_upload(synthetic_mushroom(ANALYSIS_MAX_SIDE * 4, ANALYSIS_MAX_SIDE * 3))
+        image = validate_image(upload)
+        self.assertEqual(image.size, (ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE * 3 // 4))
+        # Results still describe the upload
+        original = (ANALYSIS_MAX_SIDE * 4, ANALYSIS_MAX_SIDE * 3)
+        self.assertEqual(analyze_mushroom_features(image)['image_size'], original)
+        self.assertEqual(decode_job_image(encode_job_image(image)).info['original_size'], original)
+
+    def test_exif_orientation_is_applied(self):
+        upload = jpeg_upload(synthetic_mushroom(1600, 800), orientation=6)
+        image = validate_image(upload)
+        self.assertEqual(image.size, (ANALYSIS_MAX_SIDE // 2, ANALYSIS_MAX_SIDE))
+        self.assertEqual(image.info['original_size'], (800, 1600))
+
+    @override_settings(MAX_FULL_DECODE_PIXELS=100 * 100)
+    def test_large_images_that_cannot_be_drafted_are_rejected(self):
+        buffer = io.BytesIO()
+        synthetic_mushroom(400, 300).save(buffer, 'PNG')
+        with self.assertRaises(ValidationError):
+            validate_image(SimpleUploadedFile('mushroom.png', buffer.getvalue()))
+        self.assertEqual(validate_image(jpeg_upload(synthetic_mushroom(400, 300))).size, (400, 300))
+
+    @override_settings(MAX_UPLOAD_BYTES=1024)
+    def test_oversized_file_is_rejected_before_decoding(self):
+        upload = jpeg_upload(synthetic_mushroom(400, 300))
+        with self.assertRaises(ValidationError):
+            validate_image(upload)
+
+    @override_settings(MAX_IMAGE_PIXELS=100 * 100)
+    def test_oversized_dimensions_are_rejected(self):
+        upload = jpeg_upload(synthetic_mushroom(400, 300))
+        with self.assertRaises(ValidationError):
+            validate_image(upload)
+
+    def test_garbage_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            validate_image(SimpleUploadedFile('mushroom.jpg', b'not an image'))
+
+
+class AnalyzerRegistryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        @register_backend
+        class ExpensiveAnalyzer(AnalyzerBackend):
+            name = 'test-expensive'
+            cost = 50
+
+            def analyze(self, image):
+                return {'analysis_method': 'test'}
+
+        @register_backend
+        class BrokenAnalyzer(AnalyzerBackend):
+            name = 'test-broken'
+            cost = 5
+
+            def probe(self):
+                raise RuntimeError('no models')
+
+    @override_settings(ANALYZER_BACKENDS=['test-broken', 'test-expensive', 'heuristic'])
+    def test_first_available_backend_wins(self):
+        self.assertEqual(get_analyzer().name, 'test-expensive')
+
+    @override_settings(ANALYZER_BACKENDS=['test-expensive', 'heuristic'])
+    def test_max_cost_routes_to_cheaper_backend(self):
+        self.assertEqual(get_analyzer(max_cost=10).name, HeuristicAnalyzer.name)
+
+    @override_settings(ANALYZER_BACKENDS=['missing', 'test-broken'])
+    def test_falls_back_to_heuristics(self):
+        analyzer = get_analyzer()
+        self.assertEqual(analyzer.name, HeuristicAnalyzer.name)
+        self.assertIn('is_edible', analyzer.analyze(synthetic_mushroom(64, 64)))
+
+
+class StubInterpreter:
+    """Stands in for ``tf.lite.Interpreter``: a float32 image batch in, one score row per image out."""
+
+    def __init__(self, classes):
+        self.classes = classes
+        self.input_shape = (1, 224, 224, 3)
+        self.invoked_shapes = []
+        self.input = None
+        self.output = None
+
+    def allocate_tensors(self):
+        pass
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self.input_shape)}]
+
+    def get_output_details(self):
+        return [{'index': 1}]
+
+    def resize_tensor_input(self, index, shape):
+        self.input_shape = tuple(shape)
+
+    def set_tensor(self, index, value):
+        if value.shape != self.input_shape:
+            raise ValueError(f"Input shape {value.shape} does not match {self.input_shape}")
+        self.input = value.copy()
+
+    def invoke(self):
+        self.invoked_shapes.append(self.input.shape)
+        # Scores follow each image's mean colour, so rows can be told apart
+        means = self.input.mean(axis=(1, 2))
+        scores = np.concatenate([means, 1 - means], axis=1)[:, :self.classes] + 0.01
+        self.output = scores / scores.sum(axis=1, keepdims=True)
+
+    def get_tensor(self, index):
+        return self.output
+
+
+def stub_classifier(**kwargs):
+    """A ``TensorFlowLiteMushroomClassifier`` running on stub interpreters."""
+    model_file = Path(__file__)
+    interpreters = [StubInterpreter(classes=2), StubInterpreter(classes=len(tensorflow_classifier.SPECIES_INFO))]
+    with mock.patch.object(tensorflow_classifier, 'get_model_paths', return_value=(model_file, model_file)), \
+            mock.patch.object(tensorflow_classifier, '_create_interpreter', side_effect=interpreters):
+        return tensorflow_classifier.TensorFlowLiteMushroomClassifier(**kwargs)
+
+
+# One solid colour per species class under StubInterpreter's scoring
+SPECIES_COLOURS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (20, 20, 20)]
+
+
+@skipIf(tensorflow_classifier is None, 'TensorFlow is not installed')
+class TFLiteBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.classifier = stub_classifier()
+        self.images = [Image.new('RGB', (300, 200), colour) for colour in SPECIES_COLOURS]
+
+    def test_batch_is_one_interpreter_call_per_model(self):
+        results = self.classifier.analyze_batch(self.images)
+
+        self.assertEqual(len(results), len(self.images))
+        batch_shape = (len(self.images), 224, 224, 3)
+        self.assertEqual(self.classifier.edibility_interpreter.invoked_shapes, [batch_shape])
+        self.assertEqual(self.classifier.species_interpreter.invoked_shapes, [batch_shape])
+
+    def test_results_follow_input_order(self):
+        names = [tensorflow_classifier.SPECIES_INFO[i]['name'] for i in range(len(SPECIES_COLOURS))]
+
+        results = self.classifier.analyze_batch(self.images)
+        self.assertEqual([result['species'] for result in results], names)
+        results = self.classifier.analyze_batch(self.images[::-1])
+        self.assertEqual([result['species'] for result in results], names[::-1])
+
+    def test_batch_matches_single_image_analysis(self):
+        results = self.classifier.analyze_batch(self.images)
+
+        for image, result in zip(self.images, results):
+            self.assertEqual(result, self.classifier.analyze_mushroom(image))
+
+    def test_large_batches_are_chunked(self):
+        with mock.patch.object(tensorflow_classifier, 'MAX_BATCH_SIZE', 3):
+            results = self.classifier.analyze_batch(self.images)
+
+        self.assertEqual(len(results), len(self.images))
+        self.assertEqual(
+            [shape[0] for shape in self.classifier.species_interpreter.invoked_shapes], [3, 1],
+        )
+
+    def test_preprocess_batch_converts_modes(self):
+        images = [synthetic_mushroom(120, 80).convert('L'), Image.new('RGBA', (64, 64), (10, 20, 30, 0))]
+        batch = self.classifier.preprocess_batch(images)
+
+        self.assertEqual(batch.shape, (2, 224, 224, 3))
+        self.assertEqual(batch.dtype, np.float32)
+        self.assertTrue(0 <= batch.min() and batch.max() <= 1)
+
+
+@skipIf(tensorflow_classifier is None, 'TensorFlow is not installed')
+class ClassifierPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.real_classifier = tensorflow_classifier.TensorFlowLiteMushroomClassifier
+        patcher = mock.patch.object(
+            tensorflow_classifier, 'TensorFlowLiteMushroomClassifier', side_effect=lambda num_threads: mock.Mock(),
+        )
+        self.factory = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_returned_classifiers_are_reused(self):
+        pool = tensorflow_classifier.ClassifierPool(size=2)
+        with pool.checkout() as first:
+            pass
+        with pool.checkout() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.factory.call_count, 1)
+        self.assertEqual(pool.stats(), {'size': 2, 'created': 1, 'idle': 1, 'in_use': 0})
+
+    def test_pool_never_grows_past_its_size(self):
+        pool = tensorflow_classifier.ClassifierPool(size=2, checkout_timeout=0.05)
+        with pool.checkout(), pool.checkout():
+            with self.assertRaises(TimeoutError):
+                with pool.checkout():
+                    pass
+            self.assertEqual(pool.stats()['in_use'], 2)
+        self.assertEqual(self.factory.call_count, 2)
+
+    def test_waiter_gets_the_returned_classifier(self):
+        pool = tensorflow_classifier.ClassifierPool(size=1, checkout_timeout=5)
+        borrowed = []
+
+        def borrow():
+            with pool.checkout() as classifier:
+                borrowed.append(classifier)
+
+        with pool.checkout() as held:
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            thread.join(0.1)
+            self.assertEqual(borrowed, [])
+        thread.join(5)
+
+        self.assertEqual(borrowed, [held])
+        self.assertEqual(self.factory.call_count, 1)
+
+    def test_classifier_that_fails_to_load_is_not_pooled(self):
+        self.factory.side_effect = self.real_classifier
+        pool = tensorflow_classifier.ClassifierPool(size=1)
+        model_file = Path(__file__)
+        with mock.patch.object(tensorflow_classifier, 'get_model_paths', return_value=(model_file, model_file)), \
+                mock.patch.object(tensorflow_classifier, '_create_interpreter', side_effect=RuntimeError('corrupt model')):
+            with self.assertRaises(RuntimeError):
+                with pool.checkout():
+                    pass
+        self.assertEqual(pool.stats()['created'], 0)
+
+        # The slot is free again, so the next caller can load a working one
+        interpreters = [StubInterpreter(classes=2), StubInterpreter(classes=4)]
+        with mock.patch.object(tensorflow_classifier, 'get_model_paths', return_value=(model_file, model_file)), \
+                mock.patch.object(tensorflow_classifier, '_create_interpreter', side_effect=interpreters):
+            with pool.checkout() as classifier:
+                self.assertIs(classifier.species_interpreter, interpreters[1])
+        self.assertEqual(pool.stats()['created'], 1)
+
+
+class WarmupTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.calls = []
+
+        @register_backend
+        class RecordingAnalyzer(AnalyzerBackend):
+            name = 'test-warmup'
+
+            def preload(self):
+                cls.calls.append('preload')
+
+            def analyze(self, image):
+                cls.calls.append(('analyze', image.size))
+                return {}
+
+        @register_backend
+        class FailingAnalyzer(AnalyzerBackend):
+            name = 'test-warmup-failing'
+
+            def preload(self):
+                raise OSError('model file missing')
+
+            def analyze(self, image):
+                raise RuntimeError('interpreter failed')
+
+    def setUp(self):
+        self.calls.clear()
+
+    @override_settings(ANALYZER_BACKENDS=['test-warmup-failing', 'test-warmup'])
+    def test_preload_runs_every_backend_despite_failures(self):
+        preload()
+        self.assertEqual(self.calls, ['preload'])
+
+    @override_settings(ANALYZER_BACKENDS=['test-warmup-failing', 'test-warmup'])
+    def test_warm_worker_runs_one_inference_per_backend(self):
+        warm_worker()
+        self.assertEqual(self.calls, [('analyze', (224, 224))])
+
+
+@skipIf(tensorflow_classifier is None, 'TensorFlow is not installed')
+class ModelPreloadTests(SimpleTestCase):
+    def setUp(self):
+        model_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, model_dir)
+        (model_dir / 'edibility_model.tflite').write_bytes(b'e' * 10)
+        (model_dir / 'species_model.tflite').write_bytes(b's' * 20)
+        self.edibility_path, self.species_path = model_dir / 'edibility_model.tflite', model_dir / 'species_model.tflite'
+
+        settings_override = override_settings(TFLITE_MODEL_DIR=model_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(tensorflow_classifier._model_buffers.clear)
+
+    def test_buffers_are_read_once(self):
+        sizes = tensorflow_classifier.preload_model_buffers()
+        self.assertEqual(sizes, {str(self.edibility_path): 10, str(self.species_path): 20})
+
+        buffer = tensorflow_classifier._model_buffers[str(self.species_path)]
+        self.species_path.write_bytes(b'changed')
+        tensorflow_classifier.preload_model_buffers()
+        self.assertIs(tensorflow_classifier._model_buffers[str(self.species_path)], buffer)
+
+    def test_interpreters_are_built_from_the_preloaded_buffer(self):
+        with mock.patch.object(tensorflow_classifier, 'tf') as tf:
+            tensorflow_classifier._create_interpreter(self.species_path)
+            tf.lite.Interpreter.assert_called_once_with(model_path=str(self.species_path), num_threads=None)
+
+            tf.lite.Interpreter.reset_mock()
+            tensorflow_classifier.preload_model_buffers()
+            tensorflow_classifier._create_interpreter(self.species_path, num_threads=2)
+            tf.lite.Interpreter.assert_called_once_with(model_content=b's' * 20, num_threads=2)
+
+
+@mock.patch('core.jobs.get_job_runner')
+@override_settings(ANALYSIS_PERSIST_ENABLED=False)
+class AnalysisJobTests(TestCase):
+    def test_async_upload_returns_job_and_status_reports_result(self, get_job_runner):
+        response = self.client.post(reverse('core:predict') + '?async=1', {'image': jpeg_upload(synthetic_mushroom(320, 240))})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], AnalysisJob.STATUS_QUEUED)
+        get_job_runner.return_value.notify.assert_called_once()
+
+        job = claim_next_job()
+        self.assertEqual(job.status, AnalysisJob.STATUS_RUNNING)
+        self.assertIsNone(claim_next_job())
+        process_job(job)
+
+        payload = self.client.get(status_url).json()
+        self.assertEqual(payload['status'], AnalysisJob.STATUS_DONE)
+        self.assertIn('is_edible', payload['result'])
+        self.assertEqual(bytes(AnalysisJob.objects.get(id=job.id).image_data), b'')
+
+    @override_settings(ANALYSIS_JOB_MAX_PENDING=1)
+    def test_queue_is_bounded(self, get_job_runner):
+        enqueue_analysis(synthetic_mushroom(32, 32))
+        with self.assertRaises(QueueFull):
+            enqueue_analysis(synthetic_mushroom(32, 32))
+
+    def test_unknown_job_is_404(self, get_job_runner):
+        response = self.client.get(reverse('core:predict_status', args=['00000000-0000-0000-0000-000000000000']))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ANALYSIS_JOB_STALE_SECONDS=60, ANALYSIS_JOB_MAX_ATTEMPTS=2)
+    def test_abandoned_job_is_reclaimed_until_max_attempts(self, get_job_runner):
+        job = enqueue_analysis(synthetic_mushroom(32, 32))
+        long_ago = timezone.now() - timedelta(minutes=5)
+
+        self.assertEqual(claim_next_job().attempts, 1)
+        AnalysisJob.objects.filter(id=job.id).update(started_at=long_ago)
+        self.assertEqual(claim_next_job().attempts, 2)
+        AnalysisJob.objects.filter(id=job.id).update(started_at=long_ago)
+        self.assertIsNone(claim_next_job())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+        self.assertIn('2 attempts', job.error)
+        self.assertEqual(bytes(job.image_data), b'')
+
+    @override_settings(ANALYSIS_JOB_RETENTION_SECONDS=3600)
+    def test_old_finished_jobs_are_purged(self, get_job_runner):
+        now = timezone.now()
+        old = now - timedelta(hours=2)
+        AnalysisJob.objects.create(status=AnalysisJob.STATUS_DONE, finished_at=old)
+        AnalysisJob.objects.create(status=AnalysisJob.STATUS_FAILED, finished_at=old)
+        recent = AnalysisJob.objects.create(status=AnalysisJob.STATUS_DONE, finished_at=now)
+        queued = AnalysisJob.objects.create(status=AnalysisJob.STATUS_QUEUED)
+
+        self.assertEqual(purge_finished_jobs(), 2)
+        self.assertEqual(set(AnalysisJob.objects.values_list('id', flat=True)), {recent.id, queued.id})
+
+    def test_idle_poll_backs_off(self, get_job_runner):
+        runner = JobRunner(poll_seconds=2, max_poll_seconds=10)
+        self.assertEqual(runner.next_poll(2, woken=False), 4)
+        self.assertEqual(runner.next_poll(8, woken=False), 10)
+        self.assertEqual(runner.next_poll(10, woken=True), 2)
+
+
+@override_settings(ANALYSIS_PERSIST_ENABLED=False, ANALYSIS_JOB_STALE_SECONDS=60)
+class JobRunnerStartupTests(TransactionTestCase):
+    def test_worker_start_recovers_jobs_left_by_a_previous_process(self):
+        image_data = encode_job_image(synthetic_mushroom(64, 48))
+        queued = AnalysisJob.objects.create(image_data=image_data)
+        abandoned = AnalysisJob.objects.create(
+            image_data=image_data, status=AnalysisJob.STATUS_RUNNING,
+            started_at=timezone.now() - timedelta(minutes=5), attempts=1,
+        )
+
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', Path(settings.BASE_DIR) / 'gunicorn.conf.py')
+        gunicorn_conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(gunicorn_conf)
+        runner = JobRunner(workers=1, poll_seconds=0.05)
+        self.addCleanup(runner.stop, 5)
+        # No upload reaches this process; starting the worker is enough
+        with mock.patch('core.jobs._job_runner', runner), mock.patch.dict(os.environ, {'MODEL_WARMUP': 'False'}):
+            gunicorn_conf.post_worker_init(None)
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            statuses = set(AnalysisJob.objects.filter(id__in=[queued.id, abandoned.id]).values_list('status', flat=True))
+            if statuses == {AnalysisJob.STATUS_DONE}:
+                break
+            time.sleep(0.05)
+        self.assertEqual(statuses, {AnalysisJob.STATUS_DONE})
+
+    @override_settings(ANALYSIS_JOB_AUTOSTART=False)
+    def test_autostart_can_be_disabled(self):
+        with mock.patch('core.jobs.get_job_runner') as get_job_runner:
+            start_job_runner()
+        get_job_runner.assert_not_called()
+
+
+class AnalysisWriterTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_results_are_buffered_and_deduplicated(self):
+        writer = AnalysisWriter(batch_size=100, flush_seconds=3600)
+        result = {'is_edible': True, 'edibility_confidence': 71.0, 'species': 'Coprinus_comatus', 'species_confidence': 64.0}
+        writer.record(synthetic_mushroom(64, 64, seed=1), result)
+        writer.record(synthetic_mushroom(64, 64, seed=1), result)
+        writer.record(synthetic_mushroom(64, 64, seed=2), {'is_edible': False, 'edibility_confidence': 55.0})
+        writer.record(synthetic_mushroom(64, 64, seed=3), {'error': 'failed'})
+
+        self.assertEqual(MushroomImage.objects.count(), 0)
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(MushroomImage.objects.count(), 2)
+        stored = MushroomImage.objects.get(species='Coprinus_comatus')
+        self.assertRegex(stored.image.name, r'^unknown_mushrooms/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+        # Already stored hashes are skipped on later flushes too
+        writer.record(synthetic_mushroom(64, 64, seed=1), result)
+        self.assertEqual(writer.flush(), 0)
+        self.assertEqual(writer.stats()['duplicates'], 2)
+
+    def test_encoding_happens_on_flush_with_the_given_digest(self):
+        writer = AnalysisWriter(batch_size=100, flush_seconds=3600)
+        with mock.patch('core.persistence.mushroom_image_from_result', wraps=mushroom_image_from_result) as build:
+            writer.record(synthetic_mushroom(64, 64, seed=4), {'is_edible': True}, digest='ab' * 16)
+            build.assert_not_called()
+            self.assertEqual(writer.flush(), 1)
+            build.assert_called_once()
+        self.assertEqual(MushroomImage.objects.get().content_hash, 'ab' * 16)
+
+    def test_callers_may_close_the_image_before_the_flush(self):
+        writer = AnalysisWriter(batch_size=100, flush_seconds=3600)
+        image = synthetic_mushroom(64, 64, seed=5)
+        writer.record(image, {'is_edible': True})
+        image.close()
+        self.assertEqual(writer.flush(), 1)
+
+        # The views close their upload as soon as the analysis returns
+        with mock.patch('core.persistence._analysis_writer', writer):
+            response = self.client.post(reverse('core:predict'), {'image': jpeg_upload(synthetic_mushroom(96, 72, seed=6))})
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(MushroomImage.objects.count(), 2)
+
+    def test_content_hash_is_unique_unless_blank(self):
+        MushroomImage.objects.create(image='unknown_mushrooms/a.jpg', content_hash='cd' * 16)
+        MushroomImage.objects.create(image='unknown_mushrooms/b.jpg')
+        MushroomImage.objects.create(image='unknown_mushrooms/c.jpg')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MushroomImage.objects.create(image='unknown_mushrooms/d.jpg', content_hash='cd' * 16)
+
+
+def make_report(name, status='edible', pin_color='#28a745', **kwargs):
+    kwargs.setdefault('latitude', '11.600000')
+    kwargs.setdefault('longitude', '124.500000')
+    kwargs.setdefault('image', f'unknown_mushrooms/{name}.jpg')
+    return UnknownMushroom.objects.create(name=name, status=status, pin_color=pin_color, **kwargs)
+
+
+@override_settings(PAGE_CACHE_ALIAS='default')
+class LandingPageTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+
+    def test_counts_and_groups_use_constant_queries(self):
+        make_report('Coprinus comatus')
+        latest = make_report(' coprinus COMATUS', status='poisonous', pin_color='#dc3545')
+        make_report('Amanita', status='unknown', pin_color='#ffc107')
+        make_report('Pending one', status='unknown', pin_color='#0d6efd')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('core:landing'))
+
+        counts = response.context['counts']
+        self.assertEqual(counts['total'], 3)
+        self.assertEqual(counts['mapped'], 3)
+        self.assertEqual((counts['edible'], counts['poisonous'], counts['unknown']), (1, 1, 1))
+        self.assertEqual(counts['species'], 3)
+
+        groups = response.context['grouped_mushrooms']
+        self.assertEqual(list(groups), ['amanita', 'coprinus comatus'])
+        self.assertEqual(groups['coprinus comatus'].public_count, 2)
+        self.assertEqual(groups['coprinus comatus'].latest_report_id, latest.id)
+        self.assertNotContains(response, 'Pending one')
+
+    def test_map_section_is_cached_until_a_report_changes(self):
+        report = make_report('Coprinus comatus')
+        self.client.get(reverse('core:landing'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('core:landing'))
+        self.assertContains(response, 'Coprinus comatus')
+
+        report.name = 'Shaggy mane'
+        report.save()
+        response = self.client.get(reverse('core:landing'))
+        self.assertContains(response, 'Shaggy mane')
+
+        report.delete()
+        response = self.client.get(reverse('core:landing'))
+        self.assertNotContains(response, 'Shaggy mane')
+
+
+@override_settings(PAGE_CACHE_ALIAS='default')
+class ReportsGeoJSONTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+        self.inside = [make_report(f'Inside {i}', latitude='11.550000', longitude='124.450000') for i in range(3)]
+        make_report('Outside', latitude='10.000000', longitude='123.000000')
+        make_report('Poisonous inside', status='poisonous', pin_color='#dc3545', latitude='11.560000', longitude='124.460000')
+        make_report('Pending inside', status='unknown', pin_color='#0d6efd', latitude='11.560000', longitude='124.460000')
+        self.url = reverse('core:reports_geojson')
+
+    def test_bbox_status_and_keyset_pagination(self):
+        params = {'bbox': '124.4,11.5,124.5,11.6', 'status': 'edible', 'limit': 2}
+        page = self.client.get(self.url, params).json()
+        self.assertEqual([f['id'] for f in page['features']], [r.id for r in self.inside[:2]])
+        self.assertEqual(page['features'][0]['geometry']['coordinates'], [124.45, 11.55])
+
+        page = self.client.get(page['next']).json()
+        self.assertEqual([f['id'] for f in page['features']], [self.inside[2].id])
+        self.assertIsNone(page['next'])
+
+        names = {f['properties']['name'] for f in self.client.get(self.url, {'bbox': '124.4,11.5,124.5,11.6'}).json()['features']}
+        self.assertEqual(names, {'Inside 0', 'Inside 1', 'Inside 2', 'Poisonous inside'})
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        make_report('New one')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bad_bbox(self):
+        self.assertEqual(self.client.get(self.url, {'bbox': 'nope'}).status_code, 400)
+
+
+class MarkerClusterTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+        self.url = reverse('core:clusters_geojson')
+
+    def cluster_rows(self):
+        return sorted(MarkerCluster.objects.values_list('zoom', 'cell_x', 'cell_y', 'status', 'count', 'lat_sum', 'lon_sum'))
+
+    def test_incremental_updates_match_rebuild(self):
+        make_report('Near 1', latitude='11.550000', longitude='124.450000')
+        moved = make_report('Near 2', latitude='11.551000', longitude='124.451000')
+        pending = make_report('Pending', status='unknown', pin_color='#0d6efd', latitude='11.56', longitude='124.46')
+        make_report('Far', status='poisonous', pin_color='#dc3545', latitude='10.000000', longitude='123.000000').delete()
+
+        moved.latitude = '11.700000'
+        moved.save()
+        pending.pin_color = APPROVED_UNKNOWN_COLOR
+        pending.save()
+
+        incremental = self.cluster_rows()
+        rebuild_clusters()
+        rebuilt = self.cluster_rows()
+        self.assertEqual([row[:5] for row in incremental], [row[:5] for row in rebuilt])
+        for a, b in zip(incremental, rebuilt):
+            self.assertAlmostEqual(a[5], b[5], places=6)
+            self.assertAlmostEqual(a[6], b[6], places=6)
+
+    def test_clusters_api(self):
+        make_report('A', latitude='11.550000', longitude='124.450000')
+        make_report('B', latitude='11.552000', longitude='124.452000')
+        make_report('C', status='poisonous', pin_color='#dc3545', latitude='11.551000', longitude='124.451000')
+        make_report('Outside', latitude='10.000000', longitude='123.000000')
+
+        data = self.client.get(self.url, {'zoom': 8, 'bbox': '124.0,11.0,125.0,12.0'}).json()
+        self.assertEqual(len(data['features']), 1)
+        cluster = data['features'][0]
+        self.assertEqual(cluster['properties'], {'count': 3, 'counts': {'edible': 2, 'poisonous': 1}})
+        lon, lat = cluster['geometry']['coordinates']
+        self.assertAlmostEqual(lat, 11.551, places=6)
+        self.assertAlmostEqual(lon, 124.451, places=6)
+
+        data = self.client.get(self.url, {'zoom': 8, 'status': 'poisonous'}).json()
+        self.assertEqual([f['properties']['count'] for f in data['features']], [1])
+        self.assertEqual(self.client.get(self.url, {'zoom': 'x'}).status_code, 400)
+
+    def test_single_report_cluster_finds_its_report(self):
+        make_report('Lone cap', status='poisonous', pin_color='#dc3545', latitude='11.553217', longitude='124.457391')
+        make_report('Elsewhere', status='poisonous', pin_color='#dc3545', latitude='11.650000', longitude='124.550000')
+        data = self.client.get(self.url, {'zoom': 10, 'bbox': '124.4,11.5,124.5,11.6'}).json()
+        [cluster] = data['features']
+        self.assertEqual(cluster['properties']['count'], 1)
+
+        # The map looks the report up by the cluster's coordinates, as here
+        lon, lat = cluster['geometry']['coordinates']
+        d = 0.00001
+        bbox = ','.join(f'{v:.6f}' for v in (lon - d, lat - d, lon + d, lat + d))
+        reports = self.client.get(reverse('core:reports_geojson'), {'bbox': bbox, 'status': 'poisonous', 'limit': 1}).json()
+        self.assertEqual([f['properties']['name'] for f in reports['features']], ['Lone cap'])
+
+    def test_migration_backfills_existing_reports(self):
+        make_report('A', latitude='11.550000', longitude='124.450000')
+        expected = self.cluster_rows()
+        MarkerCluster.objects.all().delete()
+
+        migration = importlib.import_module('core.migrations.0015_markercluster_and_more')
+        migration.fill_clusters(django_apps, None)
+        self.assertEqual(self.cluster_rows(), expected)
+
+
+class SpatialIndexTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+        self.origin = make_report('Origin', latitude='11.550000', longitude='124.450000')
+        self.close = make_report('Close', latitude='11.555000', longitude='124.450000')      # ~0.56 km
+        self.medium = make_report('Medium', latitude='11.600000', longitude='124.450000')    # ~5.6 km
+        self.far = make_report('Far', latitude='12.550000', longitude='124.450000')          # ~111 km
+        self.pending = make_report('Pending', status='unknown', pin_color='#0d6efd', latitude='11.551000', longitude='124.450000')
+
+    def test_geohash_matches_reference_and_follows_moves(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(self.origin.geohash, encode_geohash(11.55, 124.45))
+
+        self.origin.latitude = '12.000000'
+        self.origin.save(update_fields=['latitude'])
+        self.origin.refresh_from_db()
+        self.assertEqual(self.origin.geohash, encode_geohash(12.0, 124.45))
+
+        UnknownMushroom.objects.filter(pk=self.far.pk).update(geohash='')
+        self.assertEqual(backfill_geohashes(UnknownMushroom), 1)
+        self.far.refresh_from_db()
+        self.assertEqual(self.far.geohash, encode_geohash(12.55, 124.45))
+
+    def test_migration_backfill_matches_live_geohashes(self):
+        expected = dict(UnknownMushroom.objects.values_list('id', 'geohash'))
+        UnknownMushroom.objects.update(geohash='')
+        migration = importlib.import_module('core.migrations.0016_unknownmushroom_geohash')
+        migration.fill_geohashes(django_apps, None)
+        self.assertEqual(dict(UnknownMushroom.objects.values_list('id', 'geohash')), expected)
+
+    def test_bbox_radius_and_nearest(self):
+        reports = UnknownMushroom.objects.all()
+        in_box = within_bbox(reports, (124.4, 11.5, 124.5, 11.62))
+        self.assertEqual(set(in_box), {self.origin, self.close, self.medium, self.pending})
+
+        in_radius = within_radius(reports, 11.55, 124.45, 10, statuses=['edible'])
+        self.assertEqual(in_radius, [self.origin, self.close, self.medium])
+        self.assertAlmostEqual(in_radius[1].distance_km, 0.556, places=2)
+
+        found = nearest(reports.exclude(pk=self.origin.pk), 11.55, 124.45, limit=3, statuses=['edible'])
+        self.assertEqual(found, [self.close, self.medium, self.far])
+
+    def test_detail_page_lists_nearby_public_sightings(self):
+        response = self.client.get(reverse('core:mushroom_detail', args=['Origin']))
+        self.assertEqual([s.name for s in response.context['nearby_sightings']], ['Close', 'Medium'])
+
+    def test_detail_links_work_for_names_with_a_slash(self):
+        make_report('Boletus / porcini', latitude='11.552000', longitude='124.450000')
+        response = self.client.get(reverse('core:mushroom_detail', args=['Origin']))
+        self.assertEqual(response.status_code, 200)
+        url = reverse('core:mushroom_detail', args=['Boletus / porcini'])
+        self.assertContains(response, f'href="{url}"')
+
+        # The map builds the link with encodeURIComponent
+        for link in (url, '/mushroom/Boletus%20%2F%20porcini/'):
+            response = self.client.get(link)
+            self.assertEqual(response.context['primary_mushroom'].name, 'Boletus / porcini')
+
+
+class ReportQueryBenchmarkTests(TestCase):
+    def test_benchmark_rolls_back_its_synthetic_data(self):
+        out = io.StringIO()
+        call_command('benchmark_report_queries', rows=300, users=5, repeat=1, compare=True, stdout=out)
+        self.assertIn('species_lookup', out.getvalue())
+        self.assertFalse(UnknownMushroom.objects.exists())
+        self.assertEqual(reports_for_species('species 1').count(), 0)
+
+
+class SpeciesSummaryTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+
+    def summary(self, key='coprinus comatus'):
+        return SpeciesSummary.objects.get(key=key)
+
+    def test_summary_follows_save_approve_and_delete(self):
+        first = make_report('Coprinus comatus', latitude='11.500000', longitude='124.400000')
+        pending = make_report(' coprinus COMATUS', status='unknown', pin_color='#0d6efd', latitude='11.700000', longitude='124.600000')
+        summary = self.summary()
+        self.assertEqual((summary.public_count, summary.edible_count, summary.pending_count), (1, 1, 1))
+        self.assertEqual(summary.latest_report_id, first.id)
+        self.assertEqual(summary.bbox, (124.4, 11.5, 124.4, 11.5))
+
+        pending.status, pending.pin_color = 'poisonous', '#dc3545'
+        pending.save()
+        summary = self.summary()
+        self.assertEqual((summary.public_count, summary.poisonous_count, summary.pending_count), (2, 1, 0))
+        self.assertEqual(summary.latest_report_id, pending.id)
+        self.assertEqual(summary.bbox, (124.4, 11.5, 124.6, 11.7))
+
+        pending.name = 'Shaggy mane'
+        pending.save()
+        self.assertEqual(self.summary().public_count, 1)
+        self.assertEqual(self.summary('shaggy mane').poisonous_count, 1)
+
+        first.delete()
+        self.assertFalse(SpeciesSummary.objects.filter(key='coprinus comatus').exists())
+
+        SpeciesSummary.objects.all().delete()
+        self.assertEqual(rebuild_species_summaries(), 1)
+        self.assertEqual(self.summary('shaggy mane').latest_report_id, pending.id)
+
+    def test_detail_page_reads_summary(self):
+        make_report('Coprinus comatus')
+        latest = make_report(' coprinus COMATUS', status='poisonous', pin_color='#dc3545')
+        make_report('coprinus comatus', status='unknown', pin_color='#0d6efd')
+
+        response = self.client.get(reverse('core:mushroom_detail', args=['COPRINUS COMATUS']))
+        self.assertEqual(response.context['primary_mushroom'].id, latest.id)
+        self.assertEqual(response.context['locations_count'], 3)
+        self.assertEqual(len(response.context['mushrooms']), 3)
+
+        response = self.client.get(reverse('core:mushroom_detail', args=['Nothing here']))
+        self.assertEqual(response.context['error'], 'Mushroom not found')
+
+    def test_migration_backfills_existing_reports(self):
+        make_report('Coprinus comatus')
+        make_report('Amanita muscaria', status='poisonous', pin_color='#dc3545')
+        expected = sorted(SpeciesSummary.objects.values_list('key', 'public_count', 'latest_report_id'))
+        SpeciesSummary.objects.all().delete()
+
+        migration = importlib.import_module('core.migrations.0018_speciessummary')
+        migration.fill_species_summaries(django_apps, None)
+        self.assertEqual(sorted(SpeciesSummary.objects.values_list('key', 'public_count', 'latest_report_id')), expected)
+
+
+class AdminDashboardPaginationTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('moderator', 'mod@example.com', 'pw', is_staff=True)
+        self.client.force_login(self.staff)
+        self.pending = [
+            make_report(f'Pending {i}', status='unknown', pin_color='#0d6efd', user=self.staff) for i in range(30)
+        ]
+        # Same timestamp for several rows exercises the id tiebreak
+        UnknownMushroom.objects.filter(pk__in=[r.pk for r in self.pending[10:20]]).update(
+            created_at=self.pending[10].created_at
+        )
+        self.confirmed = make_report('Confirmed one')
+
+    def test_first_page_then_keyset_pages(self):
+        response = self.client.get(reverse('core:admin_manage_reports'))
+        self.assertEqual(response.context['pending_count'], 30)
+        self.assertEqual(response.context['confirmed_count'], 1)
+        first_page = response.context['pending_reports']
+        self.assertEqual(len(first_page), ADMIN_REPORT_PAGE_SIZE)
+        self.assertNotContains(response, 'Confirmed one')
+
+        seen = [r.pk for r in first_page]
+        cursor = response.context['pending_next']
+        url = f"{reverse('core:admin_reports_page', args=['pending'])}?{urlencode({'cursor': cursor})}"
+        while url:
+            with self.assertNumQueries(3):  # session, user, page
+                page = self.client.get(url).json()
+            seen.extend(int(pk) for pk in re.findall(r'name="id" value="(\d+)"', page['html'])[::2])
+            url = page['next']
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(set(seen), {r.pk for r in self.pending})
+
+        page = self.client.get(reverse('core:admin_reports_page', args=['confirmed'])).json()
+        self.assertIn('Confirmed one', page['html'])
+        self.assertIsNone(page['next'])
+
+    def test_search_runs_on_the_server_and_keeps_paging(self):
+        url = reverse('core:admin_reports_page', args=['pending'])
+
+        def ids_on(page):
+            return [int(pk) for pk in re.findall(r'name="id" value="(\d+)"', page['html'])[::2]]
+
+        page = self.client.get(url, {'q': 'pending 1'}).json()
+        self.assertEqual(sorted(ids_on(page)), sorted(r.pk for r in [self.pending[1], *self.pending[10:20]]))
+        self.assertIsNone(page['next'])
+
+        # More matches than one page: the next link keeps both search and cursor
+        page = self.client.get(url, {'q': 'PENDING'}).json()
+        seen = ids_on(page)
+        self.assertEqual(len(seen), ADMIN_REPORT_PAGE_SIZE)
+        self.assertIn('q=PENDING', page['next'])
+        seen.extend(ids_on(self.client.get(page['next']).json()))
+        self.assertEqual(sorted(seen), sorted(r.pk for r in self.pending))
+
+        # Reporter email is searchable too; confirmed reports never match the pending list
+        self.assertEqual(len(ids_on(self.client.get(url, {'q': 'mod@example'}).json())), ADMIN_REPORT_PAGE_SIZE)
+        self.assertEqual(ids_on(self.client.get(url, {'q': 'Confirmed'}).json()), [])
+
+    def test_page_endpoint_rejects_bad_input(self):
+        url = reverse('core:admin_reports_page', args=['pending'])
+        self.assertEqual(self.client.get(url, {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:admin_reports_page', args=['other'])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_post_redirects_back_to_dashboard(self):
+        response = self.client.post(reverse('core:admin_manage_reports'), {
+            'action': 'approve', 'id': self.pending[0].pk, 'status': 'edible',
+        })
+        self.assertRedirects(response, reverse('core:admin_manage_reports'))
+        self.pending[0].refresh_from_db()
+        self.assertEqual((self.pending[0].status, self.pending[0].pin_color), ('edible', '#28a745'))
+
+
+@override_settings(PAGE_CACHE_ALIAS='default')
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        page_cache().clear()
+        self.staff = User.objects.create_user('moderator', 'mod@example.com', 'pw', is_staff=True)
+        self.client.force_login(self.staff)
+        self.pending = [
+            make_report('Coprinus', status='unknown', pin_color='#0d6efd', latitude='11.55', longitude='124.45')
+            for _ in range(5)
+        ]
+        self.confirmed = make_report('Amanita', status='poisonous', pin_color='#dc3545')
+        self.url = reverse('core:admin_bulk_moderate')
+
+    def test_bulk_approve_is_set_based_and_updates_rollups(self):
+        ids = [r.pk for r in self.pending] + [999999]
+        version = get_homepage_version()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'action': 'approve', 'status': 'edible', 'ids': ','.join(map(str, ids))})
+        data = response.json()
+        self.assertEqual(data['applied'], 5)
+        self.assertEqual(data['results']['999999'], 'not_found')
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_unknownmushroom"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(
+            set(UnknownMushroom.objects.filter(pk__in=ids).values_list('status', 'pin_color')),
+            {('edible', STATUS_COLOR_MAP['edible'])},
+        )
+        self.assertNotEqual(get_homepage_version(), version)
+        summary = SpeciesSummary.objects.get(key='coprinus')
+        self.assertEqual((summary.edible_count, summary.pending_count), (5, 0))
+        self.assertEqual(
+            sum(MarkerCluster.objects.filter(zoom=0, status='edible').values_list('count', flat=True)), 5
+        )
+
+    def test_reject_and_remove_only_touch_eligible_reports(self):
+        ids = f'{self.pending[0].pk},{self.confirmed.pk}'
+        data = self.client.post(self.url, {'action': 'reject', 'ids': ids}).json()
+        self.assertEqual(data['results'], {str(self.pending[0].pk): 'rejected', str(self.confirmed.pk): 'not_allowed'})
+
+        data = self.client.post(self.url, {'action': 'remove', 'ids': ids}).json()
+        self.assertEqual(data['results'], {str(self.pending[0].pk): 'not_found', str(self.confirmed.pk): 'removed'})
+        self.assertFalse(SpeciesSummary.objects.filter(key='amanita').exists())
+        self.assertEqual(SpeciesSummary.objects.get(key='coprinus').pending_count, 4)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(self.url, {'action': 'approve', 'status': 'unknown', 'ids': '1'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'action': 'explode', 'ids': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url, {'action': 'reject', 'ids': '1'}).status_code, 403)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=[160, 320, 640, 1280])
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(derivatives._available.clear)
+
+    def test_sizes_formats_and_orientation(self):
+        # Orientation 6 means rotate 90 degrees: stored 1000x600 displays as 600x1000
+        name = default_storage.save('unknown_mushrooms/rotated.jpg', jpeg_upload(synthetic_mushroom(1000, 600), orientation=6))
+        self.assertEqual(generate_derivatives(name), 4)  # 160 and 320 in two formats; wider would upscale
+        self.assertEqual(generate_derivatives(name), 0)
+
+        with default_storage.open(derivative_name(name, 320, 'jpg')) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (320, 533))
+        with default_storage.open(derivative_name(name, 160, 'webp')) as f, Image.open(f) as image:
+            self.assertEqual(image.format, 'WEBP')
+        self.assertFalse(default_storage.exists(derivative_name(name, 640, 'jpg')))
+
+        self.assertTrue(image_url(name, 'card').endswith('rotated.320w.jpg'))
+        self.assertTrue(image_url(name, 'detail').endswith('rotated.jpg'))
+        html = Template("{% load media_tags %}{% responsive_image name 'card' alt='Shaggy' %}").render(Context({'name': name}))
+        self.assertIn('rotated.160w.webp 160w', html)
+        self.assertIn('rotated.320w.jpg 320w', html)
+        self.assertIn('sizes="320px"', html)
+
+    def test_only_complete_sets_are_remembered(self):
+        name = default_storage.save('unknown_mushrooms/partial.jpg', jpeg_upload(synthetic_mushroom(800, 600)))
+        # A generator still running has written the smallest width only
+        default_storage.save(derivative_name(name, 160, 'jpg'), ContentFile(b'jpeg'))
+        self.assertEqual(available_widths(name), (160,))
+        self.assertIsNotNone(derivatives._available[name][1])
+
+        generate_derivatives(name)
+        self.assertEqual(available_widths(name), (160, 320, 640))
+        with mock.patch.object(derivatives.time, 'monotonic', return_value=time.monotonic() + 86400), \
+                mock.patch.object(default_storage, 'exists') as exists:
+            self.assertEqual(available_widths(name), (160, 320, 640))
+        exists.assert_not_called()
+
+    def test_incomplete_sets_are_rechecked_after_a_while(self):
+        name = default_storage.save('unknown_mushrooms/pending.jpg', jpeg_upload(synthetic_mushroom(800, 600)))
+        self.assertEqual(available_widths(name), ())
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertEqual(available_widths(name), ())
+        exists.assert_not_called()
+
+        # Written by another process, which cannot clear this one's entry
+        default_storage.save(derivative_name(name, 160, 'jpg'), ContentFile(b'jpeg'))
+        later = time.monotonic() + derivatives.INCOMPLETE_RECHECK_SECONDS + 1
+        with mock.patch.object(derivatives.time, 'monotonic', return_value=later):
+            self.assertEqual(available_widths(name), (160,))
+
+    def test_images_too_small_for_any_width_are_remembered(self):
+        name = default_storage.save('unknown_mushrooms/tiny.jpg', jpeg_upload(synthetic_mushroom(120, 90)))
+        self.assertEqual(generate_derivatives(name), 0)
+        self.assertEqual(available_widths(name), ())
+        self.assertEqual(derivatives._available[name], ((), None))
+
+    def test_missing_original_is_remembered_briefly(self):
+        self.assertEqual(available_widths('unknown_mushrooms/missing.jpg'), ())
+        self.assertIsNotNone(derivatives._available['unknown_mushrooms/missing.jpg'][1])
+
+    def test_nothing_is_looked_up_when_disabled(self):
+        with override_settings(IMAGE_DERIVATIVES_ENABLED=False), \
+                mock.patch.object(default_storage, 'exists') as exists:
+            self.assertEqual(available_widths('unknown_mushrooms/any.jpg'), ())
+        exists.assert_not_called()
+
+    def test_generator_counts_across_threads(self):
+        generator = DerivativeGenerator(workers=4)
+        outcomes = [3, 0, ValueError('broken image')] * 20
+        with mock.patch('core.derivatives.generate_derivatives', side_effect=outcomes):
+            for future in [generator.submit(f'unknown_mushrooms/{i}.jpg') for i in range(len(outcomes))]:
+                future.result()
+        self.assertEqual(generator.stats(), {'generated': 60, 'failed': 20})
+
+    def test_saving_a_report_queues_its_image(self):
+        generator = mock.Mock()
+        with mock.patch('core.derivatives.get_derivative_generator', return_value=generator):
+            with self.captureOnCommitCallbacks(execute=True):
+                report = make_report('Queued')
+            with self.captureOnCommitCallbacks(execute=True):
+                report.status = 'poisonous'
+                report.save()
+        generator.submit.assert_called_once_with('unknown_mushrooms/Queued.jpg')
+
+
+class UploadNormalizationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.originals_root = tempfile.mkdtemp()
+        for path in (self.media_root, self.originals_root):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root, UPLOAD_ORIGINALS_ROOT=self.originals_root,
+            UPLOAD_IMAGE_MAX_EDGE=800, UPLOAD_ARCHIVE_ORIGINALS=True, IMAGE_DERIVATIVES_ENABLED=False,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('reporter', password='pw')
+        self.client.force_login(self.user)
+
+    def test_report_upload_is_oriented_capped_and_stripped(self):
+        upload = jpeg_upload(synthetic_mushroom(2000, 1200), orientation=6)
+        response = self.client.post(reverse('core:report_unknown'), {
+            'name': 'Shaggy ink cap', 'latitude': '11.5', 'longitude': '124.5', 'image': upload,
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+
+        report = UnknownMushroom.objects.get(name='Shaggy ink cap')
+        self.assertTrue(report.image.name.endswith('.jpg'))
+        with report.image.open('rb') as f, Image.open(f) as image:
+            self.assertEqual(image.size, (480, 800))
+            self.assertNotIn(0x0112, image.getexif())
+        self.assertLess(report.image.size, upload.size)
+
+        archived = FileSystemStorage(location=self.originals_root)
+        self.assertEqual(archived.size(report.image.name), upload.size)  # same name, original bytes
+
+    def test_png_with_alpha_becomes_jpeg(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (100, 50), (200, 50, 50, 0)).save(buffer, 'PNG')
+        report = make_report('Transparent', image=SimpleUploadedFile('cap.png', buffer.getvalue()))
+        self.assertTrue(report.image.name.endswith('.jpg'))
+        with report.image.open('rb') as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.getpixel((0, 0))), ('JPEG', (255, 255, 255)))
+
+    @override_settings(MAX_IMAGE_PIXELS=100 * 100)
+    def test_oversized_upload_is_rejected(self):
+        response = self.client.post(reverse('core:report_unknown'), {
+            'name': 'Giant puffball', 'latitude': '11.5', 'longitude': '124.5',
+            'image': jpeg_upload(synthetic_mushroom(200, 150)),
+        }, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.context['form'].errors['image'], ['Image dimensions too large (200x150)'])
+        self.assertFalse(UnknownMushroom.objects.filter(name='Giant puffball').exists())
+
+        # Saved without a form, it is still refused rather than stored raw
+        with self.assertRaises(ValidationError):
+            make_report('Giant puffball', image=jpeg_upload(synthetic_mushroom(200, 150)))
+        self.assertEqual([path for path in Path(self.media_root).rglob('*') if path.is_file()], [])
+
+
+    def test_upload_that_cannot_be_normalized_is_rejected(self):
+        upload = jpeg_upload(synthetic_mushroom(200, 150))
+        with mock.patch('core.uploads.ImageOps.exif_transpose', side_effect=OSError('broken data stream')):
+            with self.assertRaisesMessage(ValidationError, 'Invalid image file: broken data stream'):
+                make_report('Truncated', image=upload)
+        self.assertEqual([path for path in Path(self.media_root).rglob('*') if path.is_file()], [])
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        # Unnormalized, so reports and analysis images store the uploaded bytes
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVES_ENABLED=False, UPLOAD_IMAGE_NORMALIZE=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, seed=0):
+        return jpeg_upload(synthetic_mushroom(120, 90, seed=seed))
+
+    def age(self, name, seconds=2 * 3600):
+        then = time.time() - seconds
+        os.utime(default_storage.path(name), (then, then))
+
+    def test_identical_uploads_share_one_file_until_the_last_reference_goes(self):
+        first = make_report('Twice', image=self.upload())
+        second = make_report('Twice', image=self.upload())
+        analysis = MushroomImage.objects.create(image=self.upload())
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image.name, analysis.image.name)
+        self.assertRegex(first.image.name, r'^unknown_mushrooms/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
+        name = first.image.name
+        derivative = default_storage.save(derivative_name(name, 160, 'jpg'), ContentFile(b'x'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            analysis.delete()
+        self.assertTrue(default_storage.exists(name))
+
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            moderate_reports([second.pk], 'remove')
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(derivative))
+
+    def test_reused_file_is_not_released_under_a_new_upload(self):
+        report = make_report('Again', image=self.upload())
+        name = report.image.name
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            report.delete()
+            # Same bytes saved again before the release runs; its row is not committed yet
+            self.assertEqual(get_content_storage().save('unknown_mushrooms/again.jpg', self.upload()), name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(release_files([name]), [])
+        self.assertEqual(release_files([name], min_age_seconds=0), [name])
+
+    def test_concurrent_save_of_the_same_bytes_reuses_the_name(self):
+        first = get_content_storage().save('unknown_mushrooms/cap.jpg', self.upload())
+        # Another process wrote the file between the existence check and the write
+        with mock.patch.object(ContentAddressedStorage, 'exists', side_effect=[False, True]):
+            second = get_content_storage().save('unknown_mushrooms/cap.jpg', self.upload())
+        self.assertEqual(second, first)
+        self.assertEqual(os.listdir(os.path.dirname(default_storage.path(first))), [os.path.basename(first)])
+
+    def test_gc_deletes_orphans_and_their_derivatives(self):
+        kept = make_report('Kept', image=self.upload(seed=1)).image.name
+        orphan = default_storage.save('unknown_mushrooms/old-upload.jpg', self.upload(seed=2))
+        derivatives = [
+            default_storage.save(derivative_name(kept, 160, 'webp'), ContentFile(b'x')),
+            default_storage.save(derivative_name(orphan, 160, 'webp'), ContentFile(b'x')),
+        ]
+
+        call_command('gc_media', stdout=io.StringIO())  # just written, so too young to collect
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command('gc_media', min_age_hours=0, stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(kept))
+        self.assertTrue(default_storage.exists(derivatives[0]))
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(default_storage.exists(derivatives[1]))
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=[160], UPLOAD_IMAGE_NORMALIZE=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_uploads_are_served_immutably_without_a_restart(self):
+        missing = hashed_name('unknown_mushrooms/cap.jpg', 'ab' * 32)
+        self.assertEqual(self.client.get(default_storage.url(missing)).status_code, 404)
+
+        # Uploaded after the middleware started
+        name = MushroomImage.objects.create(image=jpeg_upload(synthetic_mushroom(400, 300))).image.name
+        response = self.client.get(default_storage.url(name))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(default_storage.url(name), HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, response['Content-Length']), (206, '10'))
+
+    def test_jpeg_derivative_is_negotiated_to_webp(self):
+        name = MushroomImage.objects.create(image=jpeg_upload(synthetic_mushroom(400, 300))).image.name
+        generate_derivatives(name)
+        url = default_storage.url(derivative_name(name, 160, 'jpg'))
+
+        response = self.client.get(url, HTTP_ACCEPT='image/avif,image/webp,*/*')
+        self.assertEqual((response['Content-Type'], response['Vary']), ('image/webp', 'Accept'))
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(url, HTTP_ACCEPT='*/*')
+        self.assertEqual((response['Content-Type'], response['Vary']), ('image/jpeg', 'Accept'))
+
+    def test_rehash_moves_legacy_names(self):
+        legacy = default_storage.save('unknown_mushrooms/legacy.jpg', jpeg_upload(synthetic_mushroom(400, 300)))
+        response = self.client.get(default_storage.url(legacy))
+        self.assertEqual(response['Cache-Control'], f'max-age={settings.MEDIA_MAX_AGE}, public')
+
+        report = make_report('Legacy', image=legacy)
+        call_command('rehash_media', stdout=io.StringIO())
+        report.refresh_from_db()
+        self.assertTrue(is_content_addressed(report.image.name))
+        self.assertEqual(SpeciesSummary.objects.get(key='legacy').image.name, report.image.name)
+        self.assertTrue(default_storage.exists(derivative_name(report.image.name, 160, 'webp')))
+        self.assertFalse(default_storage.exists(legacy))
+
+
+class ServiceWorkerTests(TestCase):
+    def setUp(self):
+        views._service_worker = None
+        self.addCleanup(setattr, views, '_service_worker', None)
+
+    def test_script_carries_precache_manifest_and_is_built_once(self):
+        with mock.patch('core.views._build_service_worker', wraps=views._build_service_worker) as build:
+            response = self.client.get('/sw.js')
+            self.client.get('/sw.js')
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Service-Worker-Allowed'], '/')
+
+        config = json.loads(re.match(r'const SW_CONFIG = (.*);\n', response.content.decode()).group(1))
+        self.assertIn(staticfiles_storage.url('css/base.css'), config['precache'])
+        self.assertIn(staticfiles_storage.url('js/base.js'), config['precache'])
+        self.assertNotIn(staticfiles_storage.url('logo/background.png'), config['precache'])  # too large to precache
+        self.assertFalse(any('sw' in url for url in config['precache']))
+        self.assertEqual(config['mediaUrl'], '/media/')
+
+        response = self.client.get('/sw.js', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class StaticReferenceCheckTests(SimpleTestCase):
+    def test_templates_must_use_resolvable_static_tags(self):
+        template_dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, template_dir, ignore_errors=True)
+        with open(f'{template_dir}/page.html', 'w') as f:
+            f.write(
+                "{% load static %}\n"
+                "<link href=\"{% static 'css/base.css' %}\" rel=\"stylesheet\">\n"
+                "<img src=\"/static/logo/logo.png\">\n"
+                "<script src=\"{% static 'js/missing.js' %}\"></script>\n"
+            )
+        templates = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [template_dir]}]
+        with override_settings(TEMPLATES=templates):
+            messages = check_static_references(None)
+        self.assertEqual(
+            [(message.id, message.obj.rsplit(':', 1)[1]) for message in messages],
+            [('core.E001', '3'), ('core.W001', '4')],
+        )
+
+    def test_missing_manifest_entry_warns_and_links_the_plain_name(self):
+        template_dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, template_dir, ignore_errors=True)
+        with open(f'{template_dir}/page.html', 'w') as f:
+            f.write("{% load static %}\n<video src=\"{% static 'logo/ad.mp4' %}\"></video>\n")
+        templates = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [template_dir]}]
+        manifest = {'css/base.css': 'css/base.0123456789ab.css'}
+        with override_settings(TEMPLATES=templates), mock.patch.object(staticfiles_storage, 'hashed_files', manifest):
+            self.assertEqual([message.id for message in check_static_references(None)], ['core.W002'])
+
+        storage = StaticManifestStorage(location=template_dir)
+        storage.hashed_files = manifest
+        self.assertEqual(storage.url('css/base.css'), '/static/css/base.0123456789ab.css')
+        self.assertEqual(storage.url('logo/ad.mp4'), '/static/logo/ad.mp4')
@@ -0,0 +1,136 @@
+"""
+Normalization of uploaded report images at save time.
+
+``NormalizedImageField`` is an ``ImageField`` whose uploads are re-encoded
+before they reach storage: the EXIF orientation is applied to the pixels, the
+longest edge is capped at ``UPLOAD_IMAGE_MAX_EDGE``, and the result is written
+as a progressive JPEG at ``UPLOAD_IMAGE_QUALITY`` without EXIF/XMP (GPS
+included). Only the ICC profile is kept so colours survive. Files that are
+already stored (e.g. a name assigned directly) are not touched. Uploads of
+more than ``MAX_IMAGE_PIXELS`` pixels are rejected with a ``ValidationError``,
+both by the field's validator and again when saving, as are uploads that
+cannot be re-encoded: an unnormalized upload is never stored.
+
+With ``UPLOAD_ARCHIVE_ORIGINALS`` the untouched upload is also written under
+``UPLOAD_ORIGINALS_ROOT``, which lies outside ``MEDIA_ROOT`` so originals and
+their metadata are never served.
+"""
+
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import ImageField, ImageFieldFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def check_image_pixels(width: int, height: int):
+    """Raise ``ValidationError`` if an image has more than ``MAX_IMAGE_PIXELS`` pixels."""
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise ValidationError(f"Image dimensions too large ({width}x{height})", code='image_too_large')
+
+
+def open_image(content) -> Image.Image:
+    """``Image.open`` that reports Pillow's decompression bomb guard as a ``ValidationError``."""
+    content.seek(0)
+    try:
+        return Image.open(content)
+    except Image.DecompressionBombError as e:
+        raise ValidationError(str(e), code='image_too_large')
+
+
+def validate_image_pixels(value):
+    """Field validator: reject a new upload with too many pixels; stored files are not reopened."""
+    if getattr(value, '_committed', True):
+        return
+    # forms.ImageField leaves the image it verified on the upload
+    image = getattr(value.file, 'image', None)
+    if image is None:
+        with open_image(value.file) as image:
+            pass
+        value.file.seek(0)
+    check_image_pixels(*image.size)
+
+
+def normalize_image(content, name: str):
+    """Re-encoded ``(name, ContentFile)`` for an uploaded image.
+
+    Raises ``ValidationError`` for images over ``MAX_IMAGE_PIXELS`` and
+    whatever Pillow raises for undecodable input.
+    """
+    max_edge = settings.UPLOAD_IMAGE_MAX_EDGE
+    with open_image(content) as original:
+        width, height = original.size
+        check_image_pixels(width, height)
+        # JPEG only: decode at a reduced scale when that still covers max_edge
+        scale = min(1.0, max_edge / max(width, height))
+        original.draft('RGB', (max(1, int(width * scale)), max(1, int(height * scale))))
+        icc_profile = original.info.get('icc_profile')
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white rather than the black JPEG would give
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+    buffer = io.BytesIO()
+    options = {'quality': settings.UPLOAD_IMAGE_QUALITY, 'optimize': True, 'progressive': True}
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(buffer, format='JPEG', **options)
+
+    stem, _ = posixpath.splitext(name)
+    return f"{stem}.jpg", ContentFile(buffer.getvalue())
+
+
+def archive_original(content, name: str):
+    """Keep the untouched upload under ``UPLOAD_ORIGINALS_ROOT`` as ``name``."""
+    storage = FileSystemStorage(location=settings.UPLOAD_ORIGINALS_ROOT)
+    content.seek(0)
+    if not storage.exists(name):
+        storage.save(name, content)
+
+
+class NormalizedImageFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        if not settings.UPLOAD_IMAGE_NORMALIZE:
+            return super().save(name, content, save)
+        original = content
+        try:
+            name, content = normalize_image(original, name)
+        except ValidationError:
+            # Never store an oversized image, even when no form validated it
+            raise
+        except Exception as e:
+            # Storing it as uploaded would publish its EXIF, GPS included
+            logger.error(f"Error normalizing uploaded image {name}: {str(e)}")
+            raise ValidationError(f"Invalid image file: {str(e)}")
+        super().save(name, content, save)
+        if settings.UPLOAD_ARCHIVE_ORIGINALS and content is not original:
+            try:
+                # Named like the stored file, so one leads to the other
+                ext = posixpath.splitext(original.name or '')[1].lower()
+                archive_original(original, posixpath.splitext(self.name)[0] + ext)
+            except Exception as e:
+                logger.error(f"Error archiving original upload {name}: {str(e)}")
+
+
+class NormalizedImageField(ImageField):
+    """``ImageField`` that normalizes new uploads; see the module docstring."""
+
+    attr_class = NormalizedImageFieldFile
+    default_validators = [*ImageField.default_validators, validate_image_pixels]
@@ -17,9 +17,16 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path('analyze/', views.home, name='analyze'),
     path('predict/', views.predict_mushroom, name='predict'),
+    path('predict/status/<uuid:job_id>/', views.predict_status, name='predict_status'),
+    path('predict/stats/', views.predict_stats, name='predict_stats'),
     path('report/', views.report_unknown, name='report_unknown'),
     path('admin-panel/', views.admin_manage_reports, name='admin_manage_reports'),
-    path('mushroom/<str:mushroom_name>/', views.mushroom_detail, name='mushroom_detail'),
+    path('admin-panel/reports/bulk/', views.admin_bulk_moderate, name='admin_bulk_moderate'),
+    path('admin-panel/reports/<str:kind>/', views.admin_reports_page, name='admin_reports_page'),
+    path('api/reports.geojson', views.reports_geojson, name='reports_geojson'),
+    path('api/clusters.geojson', views.clusters_geojson, name='clusters_geojson'),
+    # path: so names containing a slash still resolve
+    path('mushroom/<path:mushroom_name>/', views.mushroom_detail, name='mushroom_detail'),
     path('advertisements/', views.advertisements, name='advertisements'),
     path('robots.txt', views.robots_txt, name='robots_txt'),
     path('sitemap.xml', views.sitemap_xml, name='sitemap_xml'),
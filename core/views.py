@@ -1,21 +1,45 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
+from django.template.loader import render_to_string
+from django.db.models import Count, Q
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.views import LoginView
 from django.contrib import messages
 from django.urls import reverse
 from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.mail import send_mail
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
+from urllib.parse import urlencode
 from .forms import MushroomImageForm, UnknownMushroomForm, UnknownMushroomAdminForm, UserRegistrationForm
-from .models import UnknownMushroom, UserProfile
-from .model_utils import analyze_mushroom
+from .models import PENDING_REPORT_Q, PUBLIC_REPORT_Q, STATUS_COLOR_MAP, AnalysisJob, UnknownMushroom, UserProfile
+from .moderation import ACTION_OUTCOMES, APPROVE, REJECT, REMOVE, moderate_reports
+from .model_utils import ANALYSIS_MAX_SIDE, downscale_for_analysis
+from .analyzers import backend_status, get_analyzer, run_analysis
+from .batching import batcher_stats
+from .clustering import cluster_max_zoom, clusters_in_bbox
+from .derivatives import image_url
+from .spatial import nearest, within_bbox
+from .species import get_species_summary, reports_for_species
+from .jobs import QueueFull, enqueue_analysis, start_job_runner
+from .result_cache import get_analysis_cache
+from .persistence import get_analysis_writer
+from .page_cache import cached_fragment, get_homepage_version, homepage_last_modified
 import logging
-from PIL import Image, UnidentifiedImageError
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
 import io
+import hashlib
+import json
+import threading
 from typing import Optional, Dict, Any
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 
@@ -63,32 +87,181 @@ def setup_admin(request):
         """)
 
 def landing(request):
-    """Render the simple landing page with greeting and analyze button."""
-    APPROVED_UNKNOWN_COLOR = '#ffc107'
-    approved_filter = (~Q(status='unknown')) | Q(status='unknown', pin_color=APPROVED_UNKNOWN_COLOR)
-    approved_reports = UnknownMushroom.objects.filter(approved_filter)
-    counts = {
-        'total': approved_reports.count(),
-        'mapped': approved_reports.count(),
-        'edible': approved_reports.filter(status='edible').count(),
-        'poisonous': approved_reports.filter(status='poisonous').count(),
-        'unknown': approved_reports.filter(status='unknown').count(),
-        'species': approved_reports.values_list('name', flat=True).distinct().count(),
-    }
-    # Group confirmed mushrooms by name (simple grouping)
-    from collections import defaultdict
-    grouped_mushrooms = defaultdict(list)
-    for m in approved_reports.order_by('-created_at'):
-        grouped_mushrooms[m.name.lower().strip()].append(m)
-    grouped_mushrooms = dict(grouped_mushrooms)
-
-    return render(request, 'core/new_homepage.html', { 
-        'reports': approved_reports, 
-        'counts': counts,
-        'grouped_mushrooms': grouped_mushrooms
+    """Render the simple landing page with greeting and analyze button.
+
+    The map/stats/species section is the same for every visitor, so it is
+    rendered once per data version and served from the page cache.
+    """
+    map_section_html = cached_fragment(
+        'map_section',
+        lambda: render_to_string('core/map_section.html', map_section_context()),
+    )
+    return render(request, 'core/new_homepage.html', {
+        'map_section_html': map_section_html,
     })
 
 
+def approved_reports_queryset():
+    """Reports shown publicly: confirmed ones plus approved-as-unknown (yellow pin)."""
+    return UnknownMushroom.objects.filter(PUBLIC_REPORT_Q)
+
+
+def map_section_context():
+    """Query the stat counts and species groups for the public map section."""
+    approved_reports = approved_reports_queryset()
+
+    # All stat cards in one conditional-aggregation query
+    counts = approved_reports.aggregate(
+        total=Count('id'),
+        edible=Count('id', filter=Q(status='edible')),
+        poisonous=Count('id', filter=Q(status='poisonous')),
+        unknown=Count('id', filter=Q(status='unknown')),
+        species=Count('name', distinct=True),
+    )
+    counts['mapped'] = counts['total']
+
+    grouped_mushrooms = UnknownMushroom.get_grouped_by_name()
+
+    # Map markers and clusters are fetched by the browser from the GeoJSON APIs
+    return {
+        'counts': counts,
+        'grouped_mushrooms': grouped_mushrooms,
+        'cluster_max_zoom': cluster_max_zoom(),
+    }
+
+
+GEOJSON_DEFAULT_PAGE_SIZE = 200
+GEOJSON_MAX_PAGE_SIZE = 1000
+
+
+def _parse_bbox(value):
+    """Parse ``minLon,minLat,maxLon,maxLat``; raises ValueError if malformed."""
+    min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError('bbox minimums exceed maximums')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _geojson_etag(request):
+    return f'"reports-{get_homepage_version()}-{request.GET.urlencode()}"'
+
+
+def _geojson_last_modified(request):
+    return homepage_last_modified()
+
+
+@gzip_page
+@condition(etag_func=_geojson_etag, last_modified_func=_geojson_last_modified)
+def reports_geojson(request):
+    """Public map markers inside a bounding box as a GeoJSON FeatureCollection.
+
+    Query parameters: ``bbox=minLon,minLat,maxLon,maxLat`` (optional),
+    ``status`` (comma-separated), ``after`` (keyset cursor from ``next``) and
+    ``limit``. Responses carry an ETag/Last-Modified tied to the report data
+    version, so unchanged viewports revalidate with a 304.
+    """
+    reports = approved_reports_queryset()
+
+    bbox = request.GET.get('bbox')
+    if bbox:
+        try:
+            bbox = _parse_bbox(bbox)
+        except ValueError:
+            return JsonResponse({'error': 'bbox must be minLon,minLat,maxLon,maxLat'}, status=400)
+        reports = within_bbox(reports, bbox)
+
+    statuses = [status for status in request.GET.get('status', '').split(',') if status]
+    if statuses:
+        reports = reports.filter(status__in=statuses)
+
+    try:
+        limit = min(int(request.GET.get('limit', GEOJSON_DEFAULT_PAGE_SIZE)), GEOJSON_MAX_PAGE_SIZE)
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return JsonResponse({'error': 'limit and after must be integers'}, status=400)
+    limit = max(1, limit)
+
+    rows = list(
+        reports.filter(id__gt=after)
+        .order_by('id')
+        .values('id', 'name', 'image', 'latitude', 'longitude', 'status', 'pin_color', 'created_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    features = [
+        {
+            'type': 'Feature',
+            'id': row['id'],
+            'geometry': {'type': 'Point', 'coordinates': [float(row['longitude']), float(row['latitude'])]},
+            'properties': {
+                'name': row['name'],
+                'img': image_url(row['image'], 'card'),
+                'date': row['created_at'].strftime('%Y-%m-%d %H:%M'),
+                'status': row['status'],
+                'color': row['pin_color'] or '#0d6efd',
+            },
+        }
+        for row in rows
+    ]
+
+    next_url = None
+    if has_more:
+        params = request.GET.copy()
+        params['after'] = rows[-1]['id']
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    response = JsonResponse(
+        {'type': 'FeatureCollection', 'features': features, 'next': next_url},
+        json_dumps_params={'separators': (',', ':')},
+    )
+    response['Content-Type'] = 'application/geo+json'
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+@gzip_page
+@condition(etag_func=_geojson_etag, last_modified_func=_geojson_last_modified)
+def clusters_geojson(request):
+    """Pre-aggregated map clusters for a zoom level and bounding box.
+
+    Query parameters: ``zoom`` (required), ``bbox`` and ``status`` as for
+    ``reports_geojson``. Each feature is a cell centroid with its total and
+    per-status counts. Above ``cluster_max_zoom`` the client should load
+    individual markers from ``reports_geojson`` instead.
+    """
+    try:
+        zoom = int(request.GET['zoom'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+
+    bbox = request.GET.get('bbox')
+    if bbox:
+        try:
+            bbox = _parse_bbox(bbox)
+        except ValueError:
+            return JsonResponse({'error': 'bbox must be minLon,minLat,maxLon,maxLat'}, status=400)
+
+    statuses = [status for status in request.GET.get('status', '').split(',') if status]
+    features = [
+        {
+            'type': 'Feature',
+            'id': f"{zoom}/{cluster['cell'][0]}/{cluster['cell'][1]}",
+            'geometry': {'type': 'Point', 'coordinates': [cluster['lon'], cluster['lat']]},
+            'properties': {'count': cluster['count'], 'counts': cluster['counts']},
+        }
+        for cluster in clusters_in_bbox(zoom, bbox or None, statuses)
+    ]
+
+    response = JsonResponse(
+        {'type': 'FeatureCollection', 'features': features, 'cluster_max_zoom': cluster_max_zoom()},
+        json_dumps_params={'separators': (',', ':')},
+    )
+    response['Content-Type'] = 'application/geo+json'
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
 def robots_txt(request):
     """Serve a simple robots.txt that allows all crawling and points to sitemap."""
     sitemap_url = request.build_absolute_uri('/sitemap.xml')
@@ -116,15 +289,76 @@ def sitemap_xml(request):
     return HttpResponse(xml, content_type='application/xml')
 
 
+# Own static files larger than this are left to the HTTP cache
+SERVICE_WORKER_PRECACHE_MAX_BYTES = 256 * 1024
+
+# (script, version) of the built service worker
+_service_worker = None
+_service_worker_lock = threading.Lock()
+
+
+def _precache_assets():
+    """(url, stamp) of the app's own static files for the service worker to precache.
+
+    URLs come from the staticfiles storage, so they are the hashed names once
+    collectstatic has run with a manifest storage.
+    """
+    assets = []
+    for finder in finders.get_finders():
+        if not isinstance(finder, FileSystemFinder):
+            continue  # app and admin static files are not part of the PWA shell
+        for path, storage in finder.list(['sw.js']):
+            size = storage.size(path)
+            if size > SERVICE_WORKER_PRECACHE_MAX_BYTES:
+                continue
+            try:
+                url = staticfiles_storage.url(path)
+            except ValueError:  # missing from the manifest
+                continue
+            assets.append((url, f"{storage.get_modified_time(path).timestamp()}-{size}"))
+    return sorted(assets)
+
+
+def _build_service_worker():
+    with open(settings.BASE_DIR / 'static' / 'sw.js', encoding='utf-8') as f:
+        source = f.read()
+    assets = _precache_assets()
+    version = hashlib.sha256((source + repr(assets)).encode()).hexdigest()[:16]
+    config = {'version': version, 'precache': [url for url, _ in assets], 'mediaUrl': settings.MEDIA_URL}
+    return f"const SW_CONFIG = {json.dumps(config)};\n{source}", version
+
+
+def get_service_worker():
+    """Built service worker script and version; rebuilt per request only in DEBUG."""
+    global _service_worker
+    if settings.DEBUG:
+        return _build_service_worker()
+    if _service_worker is None:
+        with _service_worker_lock:
+            if _service_worker is None:
+                _service_worker = _build_service_worker()
+    return _service_worker
+
+
+def _service_worker_etag(request):
+    try:
+        return f'"sw-{get_service_worker()[1]}"'
+    except FileNotFoundError:
+        return None
+
+
+@condition(etag_func=_service_worker_etag)
 def service_worker(request):
     """Serve the service worker JavaScript at the root path /sw.js."""
-    sw_path = settings.BASE_DIR / 'static' / 'sw.js'
     try:
-        with open(sw_path, 'rb') as f:
-            content = f.read()
+        script, _ = get_service_worker()
     except FileNotFoundError:
         return HttpResponse('// Service worker not found', content_type='application/javascript', status=404)
-    return HttpResponse(content, content_type='application/javascript')
+    response = HttpResponse(script, content_type='application/javascript')
+    # Browsers revalidate the script on every update check; the ETag makes that a 304
+    response['Cache-Control'] = 'no-cache'
+    response['Service-Worker-Allowed'] = '/'
+    return response
 
 
 def advertisements(request):
@@ -179,17 +413,60 @@ class VerifiedLoginView(LoginView):
 
 # about and map merged into new_homepage.html sections
 
-def validate_image(image_file):
-    """Validate and convert uploaded image to PIL Image."""
+def validate_image(image_file, max_side=ANALYSIS_MAX_SIDE):
+    """Validate and convert uploaded image to PIL Image.
+
+    Only the header is parsed before the size checks. JPEGs are decoded
+    straight at (at least) ``max_side`` via ``draft()``; other formats cannot
+    be, so they are held to ``MAX_FULL_DECODE_PIXELS``. The EXIF orientation
+    is applied and the result is downscaled to ``max_side``, the resolution
+    ``model_utils`` analyzes at; ``info['original_size']`` keeps the size of
+    the upload. The upload is read in place, never copied.
+    """
+    file_size = getattr(image_file, 'size', None)
+    if file_size and file_size > settings.MAX_UPLOAD_BYTES:
+        raise ValidationError(
+            f"Image file too large ({file_size // (1024 * 1024)} MB); "
+            f"the limit is {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+        )
+
+    try:
+        image_file.seek(0)
+        # Lazy open: reads the header only
+        image = Image.open(image_file)
+    except Exception as e:
+        logger.error(f"Error validating image: {str(e)}")
+        raise ValidationError(f"Invalid image file: {str(e)}")
+
+    width, height = image.size
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        image.close()
+        raise ValidationError(f"Image dimensions too large ({width}x{height})")
+    # MPO is the multi-picture JPEG many phones write
+    if image.format not in ('JPEG', 'MPO') and width * height > settings.MAX_FULL_DECODE_PIXELS:
+        image.close()
+        raise ValidationError(
+            f"Image dimensions too large for a {image.format} file ({width}x{height}); "
+            f"upload a JPEG or an image of at most {settings.MAX_FULL_DECODE_PIXELS // 1000000} megapixels"
+        )
+
     try:
-        # Read image data
-        image_data = image_file.read()
-        # Convert to PIL Image
-        image = Image.open(io.BytesIO(image_data))
+        if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG only: let the decoder scale by 1/2, 1/4 or 1/8 while decoding,
+        # keeping the longest edge at or above max_side
+        scale = min(1.0, max_side / max(width, height))
+        image.draft('RGB', (max(1, int(width * scale)), max(1, int(height * scale))))
         # Verify it's a valid image
         image.load()
-        return image
+        ImageOps.exif_transpose(image, in_place=True)
+        analysis_image = downscale_for_analysis(image, max_side)
+        if analysis_image is not image:
+            image.close()
+        analysis_image.info['original_size'] = (width, height)
+        return analysis_image
     except Exception as e:
+        image.close()
         logger.error(f"Error validating image: {str(e)}")
         raise ValidationError(f"Invalid image file: {str(e)}")
 
@@ -207,7 +484,7 @@ def home(request):
                 
                 try:
                     # Analyze the mushroom
-                    result = analyze_mushroom(pil_image)
+                    result = run_analysis(pil_image)
                 finally:
                     pil_image.close()
                 
@@ -246,29 +523,40 @@ def report_unknown(request):
         form = UnknownMushroomForm()
     return render(request, 'core/report_unknown.html', { 'form': form })
 
+NEARBY_SIGHTINGS_LIMIT = 5
+NEARBY_SIGHTINGS_MAX_KM = 50
+
+
 def mushroom_detail(request, mushroom_name):
     """Show detailed view of a specific mushroom species with all locations."""
-    # Get all mushrooms with this name (case-insensitive)
-    mushrooms = UnknownMushroom.objects.filter(name__iexact=mushroom_name).order_by('-created_at')
-    
-    if not mushrooms.exists():
+    summary = get_species_summary(mushroom_name)
+    if summary is None:
         # Try to find by ID if name doesn't work
         try:
             mushroom_id = int(mushroom_name)
             single_mushroom = get_object_or_404(UnknownMushroom, id=mushroom_id)
-            mushrooms = UnknownMushroom.objects.filter(name__iexact=single_mushroom.name)
+            summary = get_species_summary(single_mushroom.name)
         except (ValueError, UnknownMushroom.DoesNotExist):
-            return render(request, 'core/mushroom_detail.html', {'error': 'Mushroom not found'})
-    
-    # Prefer approved entries for the primary display, fall back to latest overall
-    approved_for_display = mushrooms.exclude(status='unknown')
-    primary_mushroom = approved_for_display.first() if approved_for_display.exists() else mushrooms.first()
-    locations_count = mushrooms.count()
+            pass
+    if summary is None or summary.latest_report is None:
+        return render(request, 'core/mushroom_detail.html', {'error': 'Mushroom not found'})
+
+    # The summary's latest report prefers approved entries over pending ones
+    primary_mushroom = summary.latest_report
+    mushrooms = reports_for_species(summary.key).order_by('-created_at')
+    locations_count = summary.total_count
+
+    nearby_sightings = nearest(
+        approved_reports_queryset().exclude(pk=primary_mushroom.pk),
+        primary_mushroom.latitude, primary_mushroom.longitude,
+        limit=NEARBY_SIGHTINGS_LIMIT, max_radius_km=NEARBY_SIGHTINGS_MAX_KM,
+    )
 
     return render(request, 'core/mushroom_detail.html', {
         'mushrooms': mushrooms,
         'primary_mushroom': primary_mushroom,
         'locations_count': locations_count,
+        'nearby_sightings': nearby_sightings,
         'mushroom_name': primary_mushroom.name
     })
 
@@ -374,45 +662,20 @@ def admin_manage_reports(request):
     if not request.user.is_authenticated or not request.user.is_staff:
         return redirect('/login/')
 
-    STATUS_COLOR_MAP = {
-        'mapped': '#0d6efd',     # bootstrap blue
-        'edible': '#28a745',     # legend green
-        'poisonous': '#dc3545',  # bootstrap red
-        'unknown': '#ffc107',    # bootstrap yellow
-    }
-
-    # Approve action: set status and auto pin color
-    if request.method == 'POST' and request.POST.get('action') == 'approve':
-        approve_id = request.POST.get('id')
-        new_status = request.POST.get('status')
-        item = UnknownMushroom.objects.filter(id=approve_id).first()
-        if item and new_status in STATUS_COLOR_MAP and new_status != 'unknown':
-            item.status = new_status
-            item.pin_color = STATUS_COLOR_MAP[new_status]
-            item.save()
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'success': True})
-
-    # Reject action: delete a pending item
-    if request.method == 'POST' and request.POST.get('action') == 'reject':
-        reject_id = request.POST.get('id')
-        item = UnknownMushroom.objects.filter(id=reject_id, status='unknown').first()
-        if item:
-            item.delete()
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'success': True})
-
-    # Remove action: delete a confirmed item
-    if request.method == 'POST' and request.POST.get('action') == 'remove':
-        remove_id = request.POST.get('id')
-        item = UnknownMushroom.objects.filter(id=remove_id).exclude(status='unknown').first()
-        if item:
-            item.delete()
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({'success': True})
+    # Approve / reject / remove a single report; same path as the bulk actions
+    action = request.POST.get('action') if request.method == 'POST' else None
+    if action in (APPROVE, REJECT, REMOVE):
+        try:
+            outcome = moderate_reports([request.POST.get('id')], action, request.POST.get('status'))
+        except (TypeError, ValueError):
+            outcome = {}
+        done = any(result == ACTION_OUTCOMES[action] for result in outcome.values())
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': done})
+        return redirect('core:admin_manage_reports')
 
     # Regular create/update via form
-    if request.method == 'POST' and request.POST.get('action') != 'approve':
+    if request.method == 'POST':
         report_id = request.POST.get('id')
         instance = UnknownMushroom.objects.filter(id=report_id).first() if report_id else None
         form = UnknownMushroomAdminForm(request.POST, request.FILES, instance=instance)
@@ -425,22 +688,142 @@ def admin_manage_reports(request):
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'success': True})
 
-    # GET or on invalid POST -> render dashboard
+    # Post/redirect/get, so a handled POST does not rebuild the dashboard
+    if request.method == 'POST':
+        return redirect('core:admin_manage_reports')
+
+    # Only the first pending page is rendered; the rest (and the confirmed tab)
+    # load on demand from admin_reports_page
     form = UnknownMushroomAdminForm()
-    approved_unknown_q = Q(status='unknown', pin_color=STATUS_COLOR_MAP['unknown'])
-    confirmed_filter = (~Q(status='unknown')) | approved_unknown_q
-    pending = UnknownMushroom.objects.filter(status='unknown').exclude(pin_color=STATUS_COLOR_MAP['unknown']).order_by('-created_at')
-    confirmed = UnknownMushroom.objects.filter(confirmed_filter).order_by('-created_at')
+    pending, pending_next = admin_report_page('pending')
     return render(request, 'core/admin_dashboard.html', {
         'form': form,
         'pending_reports': pending,
-        'confirmed_reports': confirmed,
+        'pending_next': pending_next,
+        'pending_count': UnknownMushroom.objects.filter(PENDING_REPORT_Q).count(),
+        'confirmed_count': UnknownMushroom.objects.filter(PUBLIC_REPORT_Q).count(),
         'STATUS_COLOR_MAP': STATUS_COLOR_MAP,
     })
 
+
+def admin_bulk_moderate(request):
+    """Apply one moderation action to many reports (staff only, POST).
+
+    Form fields: ``action`` (approve/reject/remove), ``ids`` (repeated or
+    comma-separated) and, for approve, the target ``status``. Returns the
+    outcome for each id.
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    ids = [part for value in request.POST.getlist('ids') for part in value.split(',') if part.strip()]
+    if len(ids) > ADMIN_BULK_MAX_IDS:
+        return JsonResponse({'error': f'At most {ADMIN_BULK_MAX_IDS} reports per request'}, status=400)
+    try:
+        outcomes = moderate_reports(ids, request.POST.get('action'), request.POST.get('status'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'results': {str(pk): outcome for pk, outcome in outcomes.items()},
+        'applied': sum(outcome in ACTION_OUTCOMES.values() for outcome in outcomes.values()),
+    })
+
+
+ADMIN_BULK_MAX_IDS = 1000
+ADMIN_REPORT_PAGE_SIZE = 25
+ADMIN_REPORT_LISTS = {
+    'pending': (PENDING_REPORT_Q, 'core/admin_pending_rows.html'),
+    'confirmed': (PUBLIC_REPORT_Q, 'core/admin_confirmed_rows.html'),
+}
+# Text columns the dashboard search matches against
+ADMIN_REPORT_SEARCH_FIELDS = ('name', 'scientific_name', 'origin', 'description', 'user__email')
+ADMIN_REPORT_SEARCH_MAX_LENGTH = 100
+# Columns the dashboard rows actually render
+ADMIN_REPORT_FIELDS = (
+    'name', 'scientific_name', 'origin', 'description', 'image', 'latitude', 'longitude',
+    'status', 'pin_color', 'created_at', 'user__email',
+)
+
+
+def _encode_report_cursor(report):
+    return f"{report.created_at.isoformat()}~{report.pk}"
+
+
+def _decode_report_cursor(value):
+    """Parse a cursor from ``_encode_report_cursor``; raises ValueError if malformed."""
+    created_at, pk = value.rsplit('~', 1)
+    created_at = parse_datetime(created_at)
+    if created_at is None:
+        raise ValueError('bad cursor timestamp')
+    return created_at, int(pk)
+
+
+def admin_report_page(kind, cursor=None, query='', page_size=ADMIN_REPORT_PAGE_SIZE):
+    """One page of the ``kind`` moderation list, newest first.
+
+    Pages are keyed on (created_at, id) so each one is an index range scan,
+    however deep. ``query`` keeps only reports whose text columns contain it;
+    the cursor pages through the matches. Returns ``(reports, next_cursor)``;
+    ``next_cursor`` is None on the last page.
+    """
+    condition, _ = ADMIN_REPORT_LISTS[kind]
+    reports = (
+        UnknownMushroom.objects
+        .filter(condition)
+        .select_related('user')
+        .only(*ADMIN_REPORT_FIELDS)
+        .order_by('-created_at', '-id')
+    )
+    query = (query or '').strip()[:ADMIN_REPORT_SEARCH_MAX_LENGTH]
+    if query:
+        matches = Q()
+        for field in ADMIN_REPORT_SEARCH_FIELDS:
+            matches |= Q(**{f'{field}__icontains': query})
+        reports = reports.filter(matches)
+    if cursor:
+        created_at, pk = _decode_report_cursor(cursor)
+        reports = reports.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(reports[:page_size + 1])
+    next_cursor = _encode_report_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def admin_reports_page(request, kind):
+    """Next page of a moderation list as rendered table rows (staff only).
+
+    Takes an optional search term ``q``. Returns ``{'html': rows, 'next':
+    url or null}``; ``next`` carries the cursor and the search term.
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    if kind not in ADMIN_REPORT_LISTS:
+        return JsonResponse({'error': 'Unknown report list'}, status=404)
+    query = request.GET.get('q', '').strip()
+    try:
+        reports, next_cursor = admin_report_page(kind, request.GET.get('cursor'), query)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    _, template = ADMIN_REPORT_LISTS[kind]
+    next_url = None
+    if next_cursor:
+        params = {'q': query, 'cursor': next_cursor} if query else {'cursor': next_cursor}
+        next_url = f"{request.path}?{urlencode(params)}"
+    return JsonResponse({
+        'html': render_to_string(template, {'reports': reports}, request=request),
+        'next': next_url,
+    })
+
 @csrf_exempt
 def predict_mushroom(request):
-    """Handle image upload and return prediction results."""
+    """Handle image upload and return prediction results.
+
+    With ``async=1`` the image is queued as an ``AnalysisJob`` and the response
+    (202) carries a job id to poll at ``/predict/status/<id>/``.
+    """
     if request.method == 'POST' and request.FILES.get('image'):
         try:
             # Get and validate the image
@@ -448,8 +831,23 @@ def predict_mushroom(request):
             pil_image = validate_image(image_file)
             
             try:
+                if request.POST.get('async') == '1' or request.GET.get('async') == '1':
+                    try:
+                        job = enqueue_analysis(pil_image, request.user)
+                    except QueueFull:
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Analysis queue is full, please retry shortly'
+                        }, status=503)
+                    return JsonResponse({
+                        'success': True,
+                        'job_id': str(job.id),
+                        'status': job.status,
+                        'status_url': reverse('core:predict_status', args=[job.id])
+                    }, status=202)
+                
                 # Analyze the mushroom
-                result = analyze_mushroom(pil_image)
+                result = run_analysis(pil_image)
                 
                 return JsonResponse({
                     'success': True,
@@ -471,6 +869,40 @@ def predict_mushroom(request):
         'error': 'No image provided'
     })
 
+def predict_status(request, job_id):
+    """Return the state, and once finished the result, of an analysis job."""
+    job = AnalysisJob.objects.filter(id=job_id).defer('image_data').first()
+    if job is None or (job.user_id and job.user_id != request.user.id):
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    
+    if job.status in (AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING):
+        # Someone is waiting on it; make sure this process works the queue
+        start_job_runner()
+
+    response = {
+        'success': job.status != AnalysisJob.STATUS_FAILED,
+        'job_id': str(job.id),
+        'status': job.status,
+    }
+    if job.status == AnalysisJob.STATUS_DONE:
+        response['result'] = job.result
+    elif job.status == AnalysisJob.STATUS_FAILED:
+        response['error'] = job.error
+    return JsonResponse(response)
+
+def predict_stats(request):
+    """Return analyzer, micro-batching and result-cache counters (staff only)."""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse({
+        'analyzer': get_analyzer().name,
+        'backends': backend_status(),
+        'batching_enabled': settings.PREDICT_BATCHING_ENABLED,
+        'batchers': batcher_stats(),
+        'result_cache': get_analysis_cache().stats(),
+        'persistence': get_analysis_writer().stats(),
+    })
+
 @csrf_exempt
 def analyze_mushroom_view(request):
     """Handle image upload and analysis."""
@@ -483,12 +915,17 @@ def analyze_mushroom_view(request):
         if not image_file:
             return JsonResponse({'error': 'No image provided'}, status=400)
         
-        # Read and process the image
-        image_data = image_file.read()
-        image = Image.open(io.BytesIO(image_data))
+        # Validate and decode the image
+        try:
+            image = validate_image(image_file)
+        except ValidationError as e:
+            return JsonResponse({'error': ' '.join(e.messages)}, status=400)
         
-        # Analyze the mushroom
-        result = analyze_mushroom(image)
+        try:
+            # Analyze the mushroom
+            result = run_analysis(image)
+        finally:
+            image.close()
         
         if 'error' in result:
             return JsonResponse({'error': result['error']}, status=500)
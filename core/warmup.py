@@ -0,0 +1,46 @@
+"""
+Model preloading and per-worker warm-up for gunicorn.
+
+``preload()`` runs once in the gunicorn master (``preload_app``) so model
+bytes are read before forking and shared copy-on-write by every worker.
+``warm_worker()`` runs in each worker right after fork, before it accepts
+traffic, and pushes one small image through every available analyzer so the
+first real request does not pay for lazy imports, interpreter creation and
+tensor allocation.
+"""
+
+import logging
+import time
+
+from PIL import Image
+
+from .analyzers import available_backends
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    """Load shared, read-only model data in the master process."""
+    started = time.monotonic()
+
+    for backend in available_backends():
+        try:
+            backend.preload()
+        except Exception as e:
+            logger.error(f"Error preloading analyzer backend {backend.name}: {str(e)}")
+
+    logger.info(f"Model preload finished in {time.monotonic() - started:.2f}s")
+
+
+def warm_worker():
+    """Run one warm-up inference per available analyzer in the current process."""
+    started = time.monotonic()
+    image = Image.new('RGB', (224, 224), (128, 96, 64))
+
+    for backend in available_backends():
+        try:
+            backend.analyze(image)
+        except Exception as e:
+            logger.error(f"Error warming analyzer backend {backend.name}: {str(e)}")
+
+    logger.info(f"Worker warm-up finished in {time.monotonic() - started:.2f}s")
@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration, picked up automatically from the working directory.
+
+The app (and the model bytes) are loaded once in the master and shared with
+the workers copy-on-write; each worker then runs a warm-up inference before
+it starts accepting requests, and starts its analysis job runner.
+"""
+
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+
+def when_ready(server):
+    """Master process: Django is loaded (preload_app), workers not yet forked."""
+    if not preload_app:
+        return
+    from core.warmup import preload
+    preload()
+
+
+def post_worker_init(worker):
+    """Worker process: app is loaded, accept loop not yet started."""
+    if os.getenv('MODEL_WARMUP', 'True').lower() == 'true':
+        from core.warmup import warm_worker
+        warm_worker()
+    # Pick up jobs left queued or running before this worker started
+    from core.jobs import start_job_runner
+    start_job_runner()
@@ -4,6 +4,7 @@ Django settings for myproject project.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.media_serving.MediaFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -107,22 +109,121 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# collectstatic writes content-hashed copies plus .br/.gz variants, which
+# WhiteNoise serves from STATIC_ROOT with far-future caching
+STATICFILES_STORAGE = 'core.storage.StaticManifestStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# In production, serve media files through WhiteNoise
-if not DEBUG:
-    WHITENOISE_USE_FINDERS = True
-    WHITENOISE_SERVE_FILES_AT_ROOT = False
-    # Serve static files from static/ directory
-    WHITENOISE_ROOT = BASE_DIR / 'static'
-    # Also serve media files from media/ directory  
-    WHITENOISE_MEDIA_ROOT = BASE_DIR / 'media'
+# Uploaded media is served by core.media_serving.MediaFilesMiddleware, which
+# picks up new uploads without a restart. Content-addressed files are cached
+# forever; MEDIA_MAX_AGE (seconds) applies to files stored under older names.
+# Set MEDIA_SERVE=False when a CDN or the web server serves MEDIA_ROOT.
+MEDIA_SERVE = os.getenv('MEDIA_SERVE', 'True').lower() == 'true'
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', '3600'))
+# A file whose last row goes is deleted right away only if it was stored (or
+# re-uploaded) longer ago than this; younger ones are left to gc_media
+MEDIA_RELEASE_MIN_AGE_SECONDS = int(os.getenv('MEDIA_RELEASE_MIN_AGE_SECONDS', '3600'))
+
+# Production serves only what collectstatic indexed; no finder lookups per request
+WHITENOISE_USE_FINDERS = DEBUG
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Caches: 'default' is per-process memory; 'pages' is file-based so homepage
+# fragments and their invalidation version are shared by all workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('PAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mushguard-page-cache')),
+    },
+}
+PAGE_CACHE_ALIAS = 'pages'
+# Safety net for changes that bypass model signals (e.g. queryset.update())
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '900'))
+
+# Highest zoom level with precomputed marker clusters; beyond it the map shows
+# individual markers. Changing it requires `manage.py rebuild_clusters`.
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', '14'))
+
+# Resized WebP/JPEG copies of uploaded images (see core/derivatives.py),
+# generated in the background after each upload
+IMAGE_DERIVATIVES_ENABLED = os.getenv('IMAGE_DERIVATIVES_ENABLED', 'True').lower() == 'true'
+IMAGE_DERIVATIVE_WIDTHS = [
+    int(width) for width in os.getenv('IMAGE_DERIVATIVE_WIDTHS', '160,320,640,1280').split(',') if width.strip()
+]
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv('IMAGE_DERIVATIVE_WORKERS', '2'))
+
+# Report photos are re-encoded on upload (see core/uploads.py): EXIF orientation
+# applied, metadata stripped, longest edge capped, saved as JPEG at this quality.
+# Originals can be kept outside MEDIA_ROOT, where they are never served.
+UPLOAD_IMAGE_NORMALIZE = os.getenv('UPLOAD_IMAGE_NORMALIZE', 'True').lower() == 'true'
+UPLOAD_IMAGE_MAX_EDGE = int(os.getenv('UPLOAD_IMAGE_MAX_EDGE', '2048'))
+UPLOAD_IMAGE_QUALITY = int(os.getenv('UPLOAD_IMAGE_QUALITY', '82'))
+UPLOAD_ARCHIVE_ORIGINALS = os.getenv('UPLOAD_ARCHIVE_ORIGINALS', 'False').lower() == 'true'
+UPLOAD_ORIGINALS_ROOT = os.getenv('UPLOAD_ORIGINALS_ROOT', str(BASE_DIR / 'originals'))
+
+# Analyzer backends in fallback order; the first available one is used.
+# Known: 'tflite', 'keras', 'heuristic' (see core/analyzers.py)
+ANALYZER_BACKENDS = [name.strip() for name in os.getenv('ANALYZER_BACKENDS', 'tflite,heuristic').split(',') if name.strip()]
+
+# Upload limits for images sent for analysis; checked before decoding
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(15 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', '50000000'))
+# Only JPEGs can be decoded at a reduced size; other formats are decoded whole
+# (4 bytes a pixel), so they get a lower limit
+MAX_FULL_DECODE_PIXELS = int(os.getenv('MAX_FULL_DECODE_PIXELS', '16000000'))
+
+# Micro-batching for /predict/: concurrent requests in one process are held for
+# up to PREDICT_BATCH_MAX_WAIT_MS and analyzed together (needs gunicorn --threads).
+# A request whose batch takes longer than PREDICT_BATCH_TIMEOUT_SECONDS is
+# analyzed on its own instead.
+PREDICT_BATCHING_ENABLED = os.getenv('PREDICT_BATCHING_ENABLED', 'False').lower() == 'true'
+PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', '8'))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', '5'))
+PREDICT_BATCH_TIMEOUT_SECONDS = float(os.getenv('PREDICT_BATCH_TIMEOUT_SECONDS', '30'))
+
+# Background analysis jobs (/predict/?async=1): worker threads per process,
+# queue bound, idle poll interval (backing off to the max while the queue is
+# empty), when a running job counts as abandoned, how many times one is
+# claimed before it is failed, and how long finished jobs are kept
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', '2'))
+# Start job workers when a process starts (gunicorn post_worker_init) or first
+# serves a job status, not only on the next async upload
+ANALYSIS_JOB_AUTOSTART = os.getenv('ANALYSIS_JOB_AUTOSTART', 'True').lower() == 'true'
+ANALYSIS_JOB_MAX_PENDING = int(os.getenv('ANALYSIS_JOB_MAX_PENDING', '100'))
+ANALYSIS_JOB_POLL_SECONDS = float(os.getenv('ANALYSIS_JOB_POLL_SECONDS', '2'))
+ANALYSIS_JOB_MAX_POLL_SECONDS = float(os.getenv('ANALYSIS_JOB_MAX_POLL_SECONDS', '30'))
+ANALYSIS_JOB_STALE_SECONDS = int(os.getenv('ANALYSIS_JOB_STALE_SECONDS', '300'))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+ANALYSIS_JOB_RETENTION_SECONDS = int(os.getenv('ANALYSIS_JOB_RETENTION_SECONDS', str(24 * 3600)))
+
+# Store analysis results in MushroomImage, written in bulk every
+# ANALYSIS_PERSIST_BATCH_SIZE results or ANALYSIS_PERSIST_FLUSH_SECONDS
+ANALYSIS_PERSIST_ENABLED = os.getenv('ANALYSIS_PERSIST_ENABLED', 'True').lower() == 'true'
+ANALYSIS_PERSIST_BATCH_SIZE = int(os.getenv('ANALYSIS_PERSIST_BATCH_SIZE', '50'))
+ANALYSIS_PERSIST_FLUSH_SECONDS = float(os.getenv('ANALYSIS_PERSIST_FLUSH_SECONDS', '5'))
+
+# Analysis result cache: per-process LRU, plus an optional Django cache alias
+# shared between workers. It must name a shared backend, such as the
+# file-based 'pages' cache (one host) or a Redis or database cache added to
+# CACHES; 'default' is a per-process LocMemCache and would only duplicate the LRU.
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', '256'))
+ANALYSIS_CACHE_ALIAS = os.getenv('ANALYSIS_CACHE_ALIAS', '') or None
+ANALYSIS_CACHE_TIMEOUT = int(os.getenv('ANALYSIS_CACHE_TIMEOUT', '86400'))
+
+# TensorFlow Lite interpreter pool: one pair of interpreters per concurrent
+# inference. Match TFLITE_POOL_SIZE to gunicorn --threads.
+TFLITE_MODEL_DIR = BASE_DIR / 'core' / 'models' / 'keras_models'
+TFLITE_POOL_SIZE = int(os.getenv('TFLITE_POOL_SIZE', '1'))
+TFLITE_NUM_THREADS = int(os.getenv('TFLITE_NUM_THREADS', '1'))
+TFLITE_CHECKOUT_TIMEOUT = float(os.getenv('TFLITE_CHECKOUT_TIMEOUT', '30'))
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
@@ -25,9 +25,7 @@ urlpatterns = [
     path('', include('core.urls')),
 ]
 
-# Serve media files in development
-if settings.DEBUG:
+# Media files are served by core.media_serving.MediaFilesMiddleware; this
+# route only covers development setups that switch it off
+if settings.DEBUG and not settings.MEDIA_SERVE:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-else:
-    # In production, media files are served through WhiteNoise as static files
-    pass
@@ -514,4 +514,29 @@ document.addEventListener('DOMContentLoaded', function() {
             installButton.style.display = 'none';
         }
     });
-});
\ No newline at end of file
+});
+// Offline uploads queued by the service worker (static/sw.js)
+if ('serviceWorker' in navigator) {
+    // Browsers without background sync replay the queue when a page sees the network return
+    window.addEventListener('online', () => {
+        if (navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage('replay-uploads');
+        }
+    });
+
+    navigator.serviceWorker.addEventListener('message', (event) => {
+        const data = event.data || {};
+        if (data.type !== 'upload-replayed') {
+            return;
+        }
+        if (!data.ok) {
+            alert('An upload saved while you were offline could not be sent. Please sign in and try again.');
+        } else if (data.url === '/report/') {
+            alert('Your mushroom report saved while offline has been submitted.');
+        } else if (data.url === '/predict/' && data.body && data.body.result) {
+            const result = data.body.result;
+            const label = result.is_edible ? 'EDIBLE' : 'POISONOUS';
+            alert(`Analysis of the photo saved while offline: ${label}${result.species ? ' - ' + result.species : ''}`);
+        }
+    });
+}
@@ -1,15 +1,213 @@
-// Basic Service Worker for MushGuard PWA
+// MushGuard service worker
+//
+// Served by views.service_worker at /sw.js, which prepends SW_CONFIG:
+//   version  - changes whenever the script or a precached asset changes
+//   precache - URLs of the app's own static assets (hashed after collectstatic)
+//   mediaUrl - MEDIA_URL prefix of uploaded images
+//
+// Strategies:
+//   precached static assets     cache-first
+//   map data API, species pages stale-while-revalidate
+//   media (sighting images)     cache-first, bounded
+//   POST /report/, /predict/    queued in IndexedDB while offline and replayed
+//                               by background sync (or when a page asks)
+
+const PRECACHE = `precache-${SW_CONFIG.version}`;
+const DATA_CACHE = 'data-v1';
+const MEDIA_CACHE = 'media-v1';
+const KNOWN_CACHES = [PRECACHE, DATA_CACHE, MEDIA_CACHE];
+
+const DATA_MAX_ENTRIES = 100;
+const MEDIA_MAX_ENTRIES = 300;
+
+const DATA_PATHS = [/^\/api\/reports\.geojson$/, /^\/api\/clusters\.geojson$/, /^\/mushroom\/[^/]+\/$/];
+const QUEUED_UPLOAD_PATHS = ['/report/', '/predict/'];
+// Pages after which cached pages of the previous user must not be shown
+const SIGN_OUT_PATHS = ['/logout/', '/login/'];
+const SYNC_TAG = 'upload-queue';
 
 self.addEventListener('install', (event) => {
-  console.log('Service Worker: Installed');
-  self.skipWaiting();
+  event.waitUntil(
+    caches.open(PRECACHE)
+      // Bypass the HTTP cache so a new version never precaches stale files
+      .then((cache) => cache.addAll(SW_CONFIG.precache.map((url) => new Request(url, { cache: 'reload' }))))
+      .then(() => self.skipWaiting())
+  );
 });
 
 self.addEventListener('activate', (event) => {
-  console.log('Service Worker: Activated');
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(
+        names.filter((name) => !KNOWN_CACHES.includes(name)).map((name) => caches.delete(name))
+      ))
+      .then(() => self.clients.claim())
+      .then(() => replayUploads().catch(() => undefined))
+  );
 });
 
-// For now, just pass-through network requests
 self.addEventListener('fetch', (event) => {
-  event.respondWith(fetch(event.request));
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (request.method === 'POST' && QUEUED_UPLOAD_PATHS.includes(url.pathname)) {
+    event.respondWith(sendOrQueue(request));
+    return;
+  }
+  if (request.method !== 'GET' || request.headers.has('Range')) {
+    return;
+  }
+
+  if (request.mode === 'navigate' && SIGN_OUT_PATHS.includes(url.pathname)) {
+    event.waitUntil(caches.delete(DATA_CACHE));
+    return;
+  }
+  if (SW_CONFIG.precache.includes(url.pathname)) {
+    event.respondWith(cacheFirst(request, PRECACHE));
+  } else if (DATA_PATHS.some((pattern) => pattern.test(url.pathname))) {
+    event.respondWith(staleWhileRevalidate(event, DATA_CACHE, DATA_MAX_ENTRIES));
+  } else if (url.pathname.startsWith(SW_CONFIG.mediaUrl)) {
+    event.respondWith(cacheFirst(request, MEDIA_CACHE, MEDIA_MAX_ENTRIES));
+  }
 });
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(replayUploads());
+  }
+});
+
+// Pages post 'replay-uploads' when they come back online, for browsers
+// without background sync
+self.addEventListener('message', (event) => {
+  if (event.data === 'replay-uploads') {
+    event.waitUntil(replayUploads());
+  }
+});
+
+// ---- Caching strategies ----
+
+async function cacheFirst(request, cacheName, maxEntries) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.status === 200) {
+    await cache.put(request, response.clone());
+    if (maxEntries) {
+      await trimCache(cache, maxEntries);
+    }
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, cacheName, maxEntries) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(event.request);
+  const refresh = fetch(event.request).then(async (response) => {
+    if (response.status === 200) {
+      await cache.put(event.request, response.clone());
+      await trimCache(cache, maxEntries);
+    }
+    return response;
+  });
+  if (cached) {
+    // Keep the worker alive until the cache is refreshed; failures just keep the old copy
+    event.waitUntil(refresh.catch(() => undefined));
+    return cached;
+  }
+  return refresh;
+}
+
+async function trimCache(cache, maxEntries) {
+  // Keys come back in insertion order, so the oldest entries go first
+  const keys = await cache.keys();
+  for (let i = 0; i < keys.length - maxEntries; i++) {
+    await cache.delete(keys[i]);
+  }
+}
+
+// ---- Offline upload queue ----
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open('mushguard-uploads', 1);
+    open.onupgradeneeded = () => open.result.createObjectStore('uploads', { keyPath: 'id', autoIncrement: true });
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+function queueTransaction(mode, work) {
+  return openQueue().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction('uploads', mode);
+    const result = work(tx.objectStore('uploads'));
+    tx.oncomplete = () => resolve(result.result);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+async function sendOrQueue(request) {
+  const queued = request.clone();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    // Offline: keep the exact body (multipart boundary included) and replay it later
+    const entry = {
+      url: queued.url,
+      headers: [...queued.headers.entries()],
+      body: await queued.blob(),
+      queuedAt: Date.now(),
+    };
+    await queueTransaction('readwrite', (store) => store.add(entry));
+    if (self.registration.sync) {
+      await self.registration.sync.register(SYNC_TAG).catch(() => undefined);
+    }
+    const body = new URL(queued.url).pathname === '/predict/'
+      ? { success: false, queued: true, error: 'You are offline. The photo was saved and will be analyzed when you are back online.' }
+      : { success: true, queued: true, message: 'You are offline. Your report was saved and will be sent when you are back online.' };
+    return new Response(JSON.stringify(body), { status: 202, headers: { 'Content-Type': 'application/json' } });
+  }
+}
+
+let replaying = null;
+
+// Sync events and page messages can overlap; one replay at a time avoids double posts
+function replayUploads() {
+  if (!replaying) {
+    replaying = replayQueue().finally(() => { replaying = null; });
+  }
+  return replaying;
+}
+
+async function replayQueue() {
+  const entries = await queueTransaction('readonly', (store) => store.getAll());
+  for (const entry of entries) {
+    // Throws while still offline; background sync retries the rest later
+    const response = await fetch(entry.url, {
+      method: 'POST',
+      body: entry.body,
+      headers: entry.headers,
+      credentials: 'same-origin',
+    });
+    if (response.status >= 500) {
+      throw new Error(`Upload replay failed with ${response.status}`);
+    }
+    // Sent, or rejected for good (e.g. an expired session redirecting to the
+    // login page): drop it either way and tell any open page
+    await queueTransaction('readwrite', (store) => store.delete(entry.id));
+    const body = await response.json().catch(() => null);
+    const clients = await self.clients.matchAll({ includeUncontrolled: true });
+    clients.forEach((client) => client.postMessage({
+      type: 'upload-replayed',
+      url: new URL(entry.url).pathname,
+      ok: response.ok && !response.redirected,
+      body,
+    }));
+  }
+}